@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from typing import Iterable
+
+from .config import DB_PATH, DB_SHARDS
+from .receipt_processor import from_json_to_receipt, generate_id, calculate_points
+
+# Offline NDJSON import/export for the SQLite store, one receipt per line.
+# Import streams the file in chunks, so memory stays flat however large it
+# is. Each chunk is scored and written in one INSERT OR IGNORE transaction,
+# then the byte offset after it is saved to <file>.checkpoint. After a crash
+# the next run picks up from that offset; re-inserting a chunk that did
+# commit is harmless. Running servers keep their own cache and dedup set, so
+# load while they are stopped or restart them afterwards.
+
+
+def checkpoint_path(path: str) -> str:
+    return path + ".checkpoint"
+
+
+def read_checkpoint(path: str) -> dict:
+    try:
+        with open(checkpoint_path(path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"offset": 0, "rows": 0, "invalid": 0}
+
+
+def write_checkpoint(path: str, state: dict):
+    # write then rename, so a crash mid write leaves the previous checkpoint
+    tmp = checkpoint_path(path) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, checkpoint_path(path))
+
+
+def _score_chunk(lines):
+    rows = []
+    invalid = 0
+    for line in lines:
+        try:
+            receipt = from_json_to_receipt(line)
+            rows.append((str(generate_id(receipt)), calculate_points(receipt), receipt))
+        except ValueError:
+            invalid += 1
+    return rows, invalid
+
+
+def import_file(path: str, db_path: str = DB_PATH, chunk_size: int = 10000, resume: bool = True,
+                shards: int = DB_SHARDS) -> dict:
+    # Returns {"offset", "rows", "invalid", "loaded", "seconds"}. rows and invalid
+    # include earlier runs resumed from the checkpoint, loaded is this run only.
+    from .sharded_store import open_store
+
+    state = read_checkpoint(path) if resume else {"offset": 0, "rows": 0, "invalid": 0}
+    if state["offset"]:
+        logging.info("Resuming %s from byte %d (%d rows already loaded)", path, state["offset"], state["rows"])
+
+    resumed_rows = state["rows"]
+    store = open_store(db_path, shards, pool_size=1)
+    start = time.perf_counter()
+    try:
+        # indexes are built once at the end rather than updated on every insert
+        store.drop_secondary_indexes()
+        with open(path, "rb") as f:
+            f.seek(state["offset"])
+            offset = state["offset"]
+            while True:
+                lines = []
+                for line in f:
+                    offset += len(line)
+                    if line.strip():
+                        lines.append(line)
+                        if len(lines) == chunk_size:
+                            break
+                if not lines:
+                    break
+                rows, invalid = _score_chunk(lines)
+                if rows and not store.store_receipts(rows):
+                    raise RuntimeError(f"Failed to write the chunk ending at byte {offset}")
+                state = {"offset": offset, "rows": state["rows"] + len(rows), "invalid": state["invalid"] + invalid}
+                write_checkpoint(path, state)
+                logging.info("Loaded %d rows (%.0f rows/s)", state["rows"],
+                             (state["rows"] - resumed_rows) / (time.perf_counter() - start))
+        store.create_secondary_indexes()
+    finally:
+        store.close()
+
+    if os.path.exists(checkpoint_path(path)):
+        os.remove(checkpoint_path(path))
+    return dict(state, seconds=time.perf_counter() - start, loaded=state["rows"] - resumed_rows)
+
+
+def export_rows(db_path: str = DB_PATH, batch_size: int = 10000, shards: int = DB_SHARDS) -> Iterable[dict]:
+    # receipts in id order (per shard when sharded), in the request format plus their id and points
+    from .sharded_store import open_store
+
+    store = open_store(db_path, shards, pool_size=1)
+    try:
+        yield from store.iter_receipts(batch_size)
+    finally:
+        store.close()
+
+
+def export_file(path: str, db_path: str = DB_PATH, batch_size: int = 10000, shards: int = DB_SHARDS) -> int:
+    count = 0
+    with open(path, "w") as f:
+        for row in export_rows(db_path, batch_size, shards):
+            f.write(json.dumps(row, separators=(",", ":")))
+            f.write("\n")
+            count += 1
+    return count
+
+
+def main(argv: Iterable[str] = None):
+    parser = argparse.ArgumentParser(description="Bulk import or export receipts as NDJSON.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="load receipts from an NDJSON file")
+    import_parser.add_argument("file", help="NDJSON file, one receipt per line")
+    import_parser.add_argument("--db", default=DB_PATH, help="SQLite database file")
+    import_parser.add_argument("--chunk-size", type=int, default=10000, help="receipts per transaction")
+    import_parser.add_argument("--restart", action="store_true", help="ignore any checkpoint and start from the top")
+    import_parser.add_argument("--shards", type=int, default=DB_SHARDS, help="SQLite files the store is split across")
+
+    export_parser = commands.add_parser("export", help="write every stored receipt to an NDJSON file")
+    export_parser.add_argument("file", help="output NDJSON file")
+    export_parser.add_argument("--db", default=DB_PATH, help="SQLite database file")
+    export_parser.add_argument("--batch-size", type=int, default=10000, help="rows read per query")
+    export_parser.add_argument("--shards", type=int, default=DB_SHARDS, help="SQLite files the store is split across")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        result = import_file(args.file, args.db, args.chunk_size, resume=not args.restart, shards=args.shards)
+        logging.info("Imported %d receipts (%d invalid) in %.2fs (%.0f rows/s)", result["rows"], result["invalid"],
+                     result["seconds"], result["loaded"] / max(result["seconds"], 1e-9))
+    else:
+        start = time.perf_counter()
+        count = export_file(args.file, args.db, args.batch_size, args.shards)
+        elapsed = time.perf_counter() - start
+        logging.info("Exported %d receipts in %.2fs (%.0f rows/s)", count, elapsed, count / max(elapsed, 1e-9))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main(sys.argv[1:])
@@ -0,0 +1,82 @@
+import time
+import threading
+from functools import lru_cache
+from collections import OrderedDict
+
+from .config import POINTS_CACHE_SIZE, POINTS_CACHE_NEGATIVE_TTL_SECONDS
+
+# Returned by PointsCache.get when the id has to be looked up in the store
+MISS = object()
+
+
+@lru_cache(maxsize=4096)
+def encoded_points(points: int) -> bytes:
+    # the points response body, encoded once per distinct value rather than
+    # once per request (or once per receipt, most receipts share a few values)
+    return b'{"points":%d}' % points
+
+
+class PointsCache:
+    # Bounded LRU of receipt id -> points. Receipt ids are content hashes, so a
+    # cached value never goes stale. Unknown ids are remembered for a short TTL
+    # so repeated polls for a bad id don't reach the store.
+
+    def __init__(self, max_entries: int = POINTS_CACHE_SIZE,
+                 negative_ttl_seconds: float = POINTS_CACHE_NEGATIVE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._lock = threading.Lock()
+        self._points = OrderedDict()
+        self._missing = OrderedDict()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def get(self, receipt_id: str):
+        # points, None for a known unknown id, or MISS
+        with self._lock:
+            points = self._points.get(receipt_id)
+            if points is not None:
+                self._points.move_to_end(receipt_id)
+                self.hits += 1
+                return points
+            expires_at = self._missing.get(receipt_id)
+            if expires_at is not None:
+                if expires_at > time.monotonic():
+                    self.negative_hits += 1
+                    return None
+                del self._missing[receipt_id]
+            self.misses += 1
+            return MISS
+
+    def put(self, receipt_id: str, points: int):
+        with self._lock:
+            self._missing.pop(receipt_id, None)
+            self._points[receipt_id] = points
+            self._points.move_to_end(receipt_id)
+            if len(self._points) > self.max_entries:
+                self._points.popitem(last=False)
+
+    def discard(self, receipt_id: str):
+        # for a receipt that turned out not to be stored after all
+        with self._lock:
+            self._points.pop(receipt_id, None)
+
+    def put_missing(self, receipt_id: str):
+        with self._lock:
+            if receipt_id in self._points:
+                return
+            self._missing[receipt_id] = time.monotonic() + self.negative_ttl_seconds
+            self._missing.move_to_end(receipt_id)
+            if len(self._missing) > self.max_entries:
+                self._missing.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._points),
+                "negative_entries": len(self._missing),
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,169 @@
+import re
+import sys
+import json
+import math
+import struct
+from array import array
+from datetime import date
+
+from .money import to_cents
+
+# Compact encodings for the retail_receipts columns:
+#   purchase_date  INTEGER yyyymmdd
+#   purchase_time  INTEGER hhmm, for "HH:MM" times
+#   total_cents    INTEGER, rounded when the exact total is in extras
+#   items          BLOB of description codes and prices, see pack_items
+#   extras         TEXT, NULL unless a value has no exact compact form
+# A total that isn't a whole number of cents, or a purchase time in another
+# format, is kept as is in extras (JSON), so every row decodes back exactly.
+
+ITEMS_FORMAT_VERSION = 1
+
+# version, code typecode, price typecode, item count; the two arrays follow, little endian
+ITEMS_HEADER = struct.Struct("<BccI")
+
+# signed integer typecodes for cents by exclusive bound, "d" holds raw floats
+_CENT_TYPES = (("h", 2 ** 15), ("i", 2 ** 31), ("q", 2 ** 63))
+
+_HHMM = re.compile(r"[0-9]{2}:[0-9]{2}")
+
+
+def date_to_db(value: date) -> int:
+    return value.year * 10000 + value.month * 100 + value.day
+
+
+def date_from_db(value: int) -> date:
+    return date(value // 10000, value // 100 % 100, value % 100)
+
+
+def time_to_db(value: str):
+    return int(value[:2]) * 100 + int(value[3:]) if _HHMM.fullmatch(value) else None
+
+
+def time_from_db(value: int) -> str:
+    return f"{value // 100:02d}:{value % 100:02d}"
+
+
+def _cents(amount):
+    # Receipt amounts are already cents; floats are dollars from legacy rows
+    return amount if type(amount) is int else to_cents(amount)
+
+
+def encode_fields(purchase_date: date, purchase_time: str, total):
+    # -> (purchase_date, purchase_time, total_cents, extras) column values
+    extras = {}
+    hhmm = time_to_db(purchase_time)
+    if hhmm is None:
+        extras["purchaseTime"] = purchase_time
+    cents = _cents(total)
+    if cents is None:
+        extras["total"] = total
+        # still give SQL aggregates a usable value
+        cents = round(total * 100) if math.isfinite(total) and abs(total) < 1e13 else None
+    return date_to_db(purchase_date), hhmm, cents, json.dumps(extras) if extras else None
+
+
+def decode_fields(purchase_date: int, purchase_time, total_cents, extras):
+    # -> (purchaseDate, purchaseTime, total in dollars)
+    extras = json.loads(extras) if extras else {}
+    purchase_time = extras["purchaseTime"] if "purchaseTime" in extras else time_from_db(purchase_time)
+    total = extras["total"] if "total" in extras else total_cents / 100
+    return date_from_db(purchase_date), purchase_time, total
+
+
+def _ordered(values: array) -> array:
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def pack_items(codes, prices) -> bytes:
+    # Description codes and prices as two fixed width arrays, each in the
+    # narrowest type that holds them. Prices are integer cents unless one of
+    # them isn't a whole number of cents (legacy float dollars), then all are
+    # stored as doubles in dollars.
+    cents = [_cents(price) for price in prices]
+    if None in cents:
+        price_type, price_values = "d", [p / 100 if type(p) is int else p for p in prices]
+    else:
+        bound = max((abs(c) for c in cents), default=0)
+        price_type = next(typecode for typecode, limit in _CENT_TYPES if bound < limit)
+        price_values = cents
+    code_type = "H" if max(codes, default=0) < 2 ** 16 else "I"
+    return b"".join((
+        ITEMS_HEADER.pack(ITEMS_FORMAT_VERSION, code_type.encode(), price_type.encode(), len(codes)),
+        _ordered(array(code_type, codes)).tobytes(),
+        _ordered(array(price_type, price_values)).tobytes()))
+
+
+def items_layout(blob: bytes):
+    # -> (code typecode, price typecode, item count, offset of the codes, offset of the prices)
+    version, code_type, price_type, count = ITEMS_HEADER.unpack_from(blob)
+    if version != ITEMS_FORMAT_VERSION:
+        raise ValueError(f"Unknown items format version: {version}")
+    code_type, price_type = code_type.decode(), price_type.decode()
+    prices_offset = ITEMS_HEADER.size + count * array(code_type).itemsize
+    return code_type, price_type, count, ITEMS_HEADER.size, prices_offset
+
+
+def unpack_items(blob: bytes):
+    # -> (codes, prices in dollars)
+    code_type, price_type, count, codes_offset, prices_offset = items_layout(blob)
+    codes = array(code_type)
+    codes.frombytes(blob[codes_offset:prices_offset])
+    prices = array(price_type)
+    prices.frombytes(blob[prices_offset:prices_offset + count * prices.itemsize])
+    _ordered(codes)
+    _ordered(prices)
+    if price_type == "d":
+        return codes.tolist(), prices.tolist()
+    return codes.tolist(), [c / 100 for c in prices]
+
+
+class ItemDictionary:
+    # (retailer, description) <-> integer code, backed by the item_descriptions table.
+    # Codes are allocated inside the caller's write transaction and only cached
+    # after it commits (learn), so a rolled back insert can't leave a cached
+    # code that points at nothing, or later at another description.
+
+    def __init__(self):
+        self._codes = {}
+        self._descriptions = {}
+
+    def encode(self, conn, retailer: str, descriptions, pending: dict) -> list:
+        codes = []
+        for description in descriptions:
+            key = (retailer, description)
+            code = self._codes.get(key)
+            if code is None:
+                code = pending.get(key)
+                if code is None:
+                    code = pending[key] = self._allocate(conn, key)
+            codes.append(code)
+        return codes
+
+    @staticmethod
+    def _allocate(conn, key) -> int:
+        cursor = conn.execute("INSERT OR IGNORE INTO item_descriptions (retailer, description) VALUES (?, ?)", key)
+        if cursor.rowcount == 1:
+            return cursor.lastrowid
+        return conn.execute("SELECT code FROM item_descriptions WHERE retailer=? AND description=?", key).fetchone()[0]
+
+    def learn(self, pending: dict):
+        # call once the transaction that allocated the pending codes has committed
+        for key, code in pending.items():
+            self._codes[key] = code
+            self._descriptions[code] = key[1]
+
+    def decode(self, conn, codes) -> list:
+        missing = list({code for code in codes if code not in self._descriptions})
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            rows = conn.execute(
+                f"SELECT code, retailer, description FROM item_descriptions WHERE code IN ({','.join('?' * len(chunk))})",
+                chunk).fetchall()
+            self.learn({(retailer, description): code for code, retailer, description in rows})
+        return [self._descriptions[code] for code in codes]
+
+    def __len__(self):
+        return len(self._codes)
@@ -1 +1,55 @@
-IS_LLM_GENERATED = False
\ No newline at end of file
+import os
+
+IS_LLM_GENERATED = False
+
+# Comma separated scoring rule names to switch off, e.g. "receipt_datetime"
+DISABLED_RULES = [name.strip() for name in os.getenv("DISABLED_RULES", "").split(",") if name.strip()]
+
+# SQLite storage
+DB_PATH = os.getenv("DB_PATH", "retail_receipt.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+# Split the SQLite store across this many files by receipt id, see sharded_store.py
+DB_SHARDS = int(os.getenv("DB_SHARDS", "1"))
+
+# Largest body and receipt count POST /receipts/process/batch accepts, larger batches get a 413
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(16 * 1024 * 1024)))
+BATCH_MAX_RECEIPTS = int(os.getenv("BATCH_MAX_RECEIPTS", "5000"))
+
+# Receipt store backend: "sqlite" or "memory"
+RECEIPT_STORE = os.getenv("RECEIPT_STORE", "sqlite")
+
+# In-memory store
+MEMORY_STORE_SHARDS = int(os.getenv("MEMORY_STORE_SHARDS", "16"))
+MEMORY_STORE_MAX_MB = float(os.getenv("MEMORY_STORE_MAX_MB", "256"))
+MEMORY_STORE_EVICTION = os.getenv("MEMORY_STORE_EVICTION", "lru")  # "lru" or "ttl"
+MEMORY_STORE_TTL_SECONDS = float(os.getenv("MEMORY_STORE_TTL_SECONDS", "86400"))
+
+# Read-through cache in front of points lookups, 0 disables it
+POINTS_CACHE_SIZE = int(os.getenv("POINTS_CACHE_SIZE", "100000"))
+POINTS_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("POINTS_CACHE_NEGATIVE_TTL_SECONDS", "5"))
+# Cache-Control of points responses, which only change when the rules do. Not
+# immutable, so clients revalidate and pick up a new ETag after a rescore.
+POINTS_CACHE_CONTROL = os.getenv("POINTS_CACHE_CONTROL", "public, max-age=3600")
+
+# Logging
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Log the full points breakdown for one receipt in N, 0 disables it
+SCORING_LOG_SAMPLE_RATE = int(os.getenv("SCORING_LOG_SAMPLE_RATE", "0"))
+
+# Request, stage and storage metrics served on /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Write-behind: return ids right away and group commit receipts in the background
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() in ("1", "true", "yes")
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500"))
+WRITE_BEHIND_FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "10"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+WRITE_BEHIND_PUT_TIMEOUT_SECONDS = float(os.getenv("WRITE_BEHIND_PUT_TIMEOUT_SECONDS", "1"))
+
+# Answer resubmitted receipts from an in-memory id set before scoring them
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Score receipts with at least SCORING_POOL_MIN_ITEMS items in a process pool, 0 workers disables it
+SCORING_POOL_WORKERS = int(os.getenv("SCORING_POOL_WORKERS", "0"))
+SCORING_POOL_MIN_ITEMS = int(os.getenv("SCORING_POOL_MIN_ITEMS", "1000"))
@@ -1,71 +1,618 @@
 import sqlite3
 # from models import Receipt, Item
 import json
+import queue
+import asyncio
 import logging
+import threading
+from datetime import date
+from contextlib import contextmanager, ExitStack
+from concurrent.futures import ThreadPoolExecutor
 
-conn = None
+from .cache import PointsCache, MISS, encoded_points
+from .codec import ItemDictionary, encode_fields, decode_fields, pack_items, unpack_items
+from .models import Receipt
+from .receipt_processor import RULES_FINGERPRINT
+from .reports import ROLLUP_SCHEMA, rebuild_rollups, query_retailers, query_daily, query_hourly
+from .metrics import registry, sample_lines, db_commit_latency, duplicate_receipts
+from .dedup import SeenReceipts
+from .config import (DB_PATH, DB_POOL_SIZE, DB_BUSY_TIMEOUT_MS, RECEIPT_STORE, POINTS_CACHE_SIZE, WRITE_BEHIND_ENABLED,
+                     DEDUP_ENABLED)
 
-db = None
+store = None
 
-def init_db():
-    global conn, db
-    conn = sqlite3.connect('retail_receipt.db')
-    db = conn.cursor()
+executor = None
 
-    db.execute('''
-        CREATE TABLE IF NOT EXISTS retail_receipts (
-            id TEXT PRIMARY KEY,
-            retailer TEXT,
-            purchase_date DATE,
-            purchase_time TIME,
-            items TEXT,
-            total DOUBLE,
-            points INTEGER
-        )
-    ''')
-    conn.commit()
+cache = None
 
+write_behind = None
 
+seen = None
 
+# the dedup_enabled init_db was given, non-blocking stores have no seen set
+dedup = False
 
-def store_receipt(receipt_id: str, points: int, receipt):
-    # convert to receipt
-    # store to db
-    if conn is None:
-        init_db()  # Ensure the database is initialized
-    
-    try:
-        with conn:
-            receipt_items = json.dumps(receipt["items"])
-            sql = "INSERT INTO retail_receipts (id, retailer, purchase_date, purchase_time, items, total, points) VALUES (?, ?, ?, ?, ?, ?, ?)"
-            args = (
-              receipt_id,
-              receipt["retailer"],
-              receipt["purchaseDate"],
-              receipt["purchaseTime"],
-              receipt_items,
-              float(receipt["total"]),
-              points)
-            db.execute(sql, args)
+_init_lock = threading.Lock()
+
+
+class ReceiptStore:
+    # Interface every receipt storage backend implements.
+    # get_receipt_points returns a (points,) row or None when the id is unknown.
+
+    # True when calls block on I/O and async callers should use the executor
+    blocking = True
+
+    # worker threads the async variants may use
+    concurrency = 1
+
+    def store_receipt(self, receipt_id: str, points: int, receipt):
+        raise NotImplementedError
+
+    def store_receipts(self, receipts):
+        raise NotImplementedError
+
+    def get_receipt_points(self, receipt_id: str):
+        raise NotImplementedError
+
+    def iter_receipt_ids(self):
+        raise NotImplementedError
+
+    # Reports from the rollups in reports.py, dates are inclusive and None is unbounded
+
+    def retailer_report(self, start: date = None, end: date = None) -> list:
+        raise NotImplementedError
+
+    def daily_report(self, start: date = None, end: date = None, retailer: str = None) -> list:
+        raise NotImplementedError
+
+    def hourly_report(self, start: date = None, end: date = None) -> list:
+        raise NotImplementedError
+
+    def warm_up(self):
+        # called once at startup, before the server reports ready
+        pass
+
+    def rules_fingerprint(self):
+        # rules.rules_fingerprint of the rules the stored points were scored
+        # with, None when unknown. Stores that aren't rescored score every
+        # receipt with the running rules.
+        return RULES_FINGERPRINT
+
+    def stats(self) -> dict:
+        return {}
+
+    def close(self):
+        pass
+
+
+class ConnectionPool:
+    # Fixed size pool of sqlite3 connections shared across threads.
+    # A connection is only ever used by one thread at a time.
+
+    def __init__(self, path: str, size: int, busy_timeout_ms: int):
+        self.path = path
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self._idle = queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            self._idle.put(self._connect())
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        # WAL lets readers run alongside the single writer, and NORMAL only
+        # fsyncs at checkpoints which is safe in WAL mode
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        for _ in range(self.size):
+            self._idle.get().close()
+
+
+# 1: compact receipt format (codec.py)
+# 2: reporting rollups (reports.py)
+# 3: rollups follow deletes
+# 4: fingerprint of the rules the stored points were scored with
+SCHEMA_VERSION = 4
+
+_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS retail_receipts (
+        id TEXT PRIMARY KEY,
+        retailer TEXT,
+        purchase_date INTEGER,
+        purchase_time INTEGER,
+        items BLOB,
+        total_cents INTEGER,
+        extras TEXT,
+        points INTEGER
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS item_descriptions (
+        code INTEGER PRIMARY KEY,
+        retailer TEXT NOT NULL,
+        description TEXT NOT NULL,
+        UNIQUE (retailer, description)
+    )
+    ''',
+    # a single row, written when the database is created and by each rescore
+    '''
+    CREATE TABLE IF NOT EXISTS scoring_rules (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        fingerprint TEXT
+    )
+    ''',
+) + ROLLUP_SCHEMA
+
+RECEIPT_COLUMNS = "id, retailer, purchase_date, purchase_time, items, total_cents, extras, points"
+
+_SELECT_POINTS = "SELECT points FROM retail_receipts WHERE id=?"
+
+_INSERT_RECEIPT = f"INSERT INTO retail_receipts ({RECEIPT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+
+# Secondary indexes on retail_receipts as (name, DDL). Bulk loads drop them
+# and build each one once at the end instead of updating it per row.
+SECONDARY_INDEXES = (
+    # covers the per retailer and day aggregates, including the rollup rebuild
+    ("retail_receipts_retailer_date",
+     "CREATE INDEX IF NOT EXISTS retail_receipts_retailer_date "
+     "ON retail_receipts (retailer, purchase_date, points, total_cents)"),
+)
+
+
+def is_legacy(conn) -> bool:
+    # before version 1 retail_receipts held the JSON layout. A migration in
+    # progress has renamed it to retail_receipts_legacy.
+    if conn.execute("PRAGMA user_version").fetchone()[0] != 0:
+        return False
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' "
+                        "AND name IN ('retail_receipts', 'retail_receipts_legacy')").fetchone() is not None
+
+
+def set_rules_fingerprint(conn, fingerprint: str):
+    # record the rules the stored points are now scored with, in the caller's transaction
+    conn.execute("INSERT OR REPLACE INTO scoring_rules VALUES (0, ?)", (fingerprint,))
+
+
+def encode_row(dictionary: ItemDictionary, conn, pending, receipt_id, points, retailer, purchase_date, purchase_time,
+               descriptions, prices, total) -> tuple:
+    # one retail_receipts row, description codes allocated in conn's transaction
+    codes = dictionary.encode(conn, retailer, descriptions, pending)
+    purchase_date, purchase_time, total_cents, extras = encode_fields(purchase_date, purchase_time, total)
+    return (receipt_id, retailer, purchase_date, purchase_time, pack_items(codes, prices), total_cents, extras, points)
+
+
+class SqliteReceiptStore(ReceiptStore):
+    # Receipts are stored in the compact format described in codec.py, item
+    # descriptions as codes into the per retailer item_descriptions table.
+
+    def __init__(self, path: str = DB_PATH, pool_size: int = DB_POOL_SIZE,
+                 busy_timeout_ms: int = DB_BUSY_TIMEOUT_MS):
+        self.pool = ConnectionPool(path, pool_size, busy_timeout_ms)
+        self.concurrency = pool_size
+        self.dictionary = ItemDictionary()
+
+        try:
+            with self.pool.connection() as conn:
+                self._ensure_schema(conn)
+        except BaseException:
+            self.pool.close()
+            raise
+        self.create_secondary_indexes()
+
+    def _ensure_schema(self, conn):
+        # IMMEDIATE so two processes opening a new database don't both create it
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version > SCHEMA_VERSION:
+                raise ValueError(f"Database schema version {version} is newer than this code ({SCHEMA_VERSION})")
+            if version < SCHEMA_VERSION:
+                if is_legacy(conn):
+                    # migrated in batches by app.migrate, never while the server starts
+                    raise ValueError(f"{self.pool.path} holds receipts in the legacy JSON layout, "
+                                     f"migrate it first with: python -m app.migrate --db {self.pool.path}")
+                for ddl in _SCHEMA:
+                    conn.execute(ddl)
+                # points in an existing database may come from other rules
+                conn.execute("INSERT OR IGNORE INTO scoring_rules VALUES (0, ?)",
+                             (RULES_FINGERPRINT if version == 0 else None,))
+                if version == 1:
+                    # rows written before the rollup triggers existed
+                    rebuild_rollups(conn)
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            row = conn.execute("SELECT fingerprint FROM scoring_rules").fetchone()
+            self._rules_fingerprint = row[0] if row else None
             conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def rules_fingerprint(self):
+        # as of when the store was opened, a rescore only takes effect on restart
+        return self._rules_fingerprint
+
+    def _encode_row(self, conn, pending, receipt_id, points, retailer, purchase_date, purchase_time, descriptions,
+                    prices, total):
+        return encode_row(self.dictionary, conn, pending, receipt_id, points, retailer, purchase_date, purchase_time,
+                          descriptions, prices, total)
+
+    def _receipt_row(self, conn, pending, receipt_id: str, points: int, receipt):
+        # flatten a validated Receipt (or a scoring_pool.PooledReceipt) into a retail_receipts row
+        items = receipt.items
+        return self._encode_row(
+            conn, pending, receipt_id, points, receipt.retailer, receipt.purchaseDate, receipt.purchaseTime,
+            [item.shortDescription for item in items], [item.price for item in items], receipt.total)
+
+    def _decode_row(self, conn, row) -> dict:
+        # retail_receipts row -> receipt in the request format, plus its id and points
+        receipt_id, retailer, purchase_date, purchase_time, items, total_cents, extras, points = row
+        codes, prices = unpack_items(items)
+        descriptions = self.dictionary.decode(conn, codes)
+        purchase_date, purchase_time, total = decode_fields(purchase_date, purchase_time, total_cents, extras)
+        return {
+            "id": receipt_id,
+            "retailer": retailer,
+            "purchaseDate": purchase_date.isoformat(),
+            "purchaseTime": purchase_time,
+            "items": [{"shortDescription": d, "price": p} for d, p in zip(descriptions, prices)],
+            "total": total,
+            "points": points,
+        }
+
+    def create_secondary_indexes(self):
+        with self.pool.connection() as conn, conn:
+            for _, ddl in SECONDARY_INDEXES:
+                conn.execute(ddl)
+
+    def drop_secondary_indexes(self):
+        with self.pool.connection() as conn, conn:
+            for name, _ in SECONDARY_INDEXES:
+                conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+    def store_receipt(self, receipt_id: str, points: int, receipt):
+        # convert to receipt
+        # store to db
+        try:
+            pending = {}
+            with self.pool.connection() as conn, conn:
+                conn.execute(_INSERT_RECEIPT, self._receipt_row(conn, pending, receipt_id, points, receipt))
+                with db_commit_latency.time("store_receipt"):
+                    conn.commit()
+            self.dictionary.learn(pending)
             return True
-    except sqlite3.IntegrityError as e:
-        logging.info(f"Unique constraint failed for existing receipt: {receipt_id}")
-        return True
-    except Exception as e:
-        logging.error(f"An unexpected error occurred: {e}")
-        logging.exception(e) 
+        except sqlite3.IntegrityError as e:
+            logging.info("Unique constraint failed for existing receipt: %s", receipt_id)
+            duplicate_receipts.inc()
+            return True
+        except Exception as e:
+            logging.error("An unexpected error occurred: %s", e)
+            logging.exception(e)
+
+    def store_receipts(self, receipts):
+        # store a batch of (receipt_id, points, receipt) in a single transaction
+        try:
+            pending = {}
+            with self.pool.connection() as conn, conn:
+                # duplicates are not an error, same as store_receipt
+                sql = _INSERT_RECEIPT.replace("INSERT", "INSERT OR IGNORE", 1)
+                rows = [self._receipt_row(conn, pending, *r) for r in receipts]
+                # rowcount leaves out the rollup trigger writes, total_changes doesn't
+                inserted = conn.executemany(sql, rows).rowcount
+                duplicates = len(rows) - inserted
+                with db_commit_latency.time("store_receipts"):
+                    conn.commit()
+            self.dictionary.learn(pending)
+            if duplicates:
+                duplicate_receipts.inc(amount=duplicates)
+            return True
+        except Exception as e:
+            logging.error("An unexpected error occurred: %s", e)
+            logging.exception(e)
+
+    def store_decoded(self, rows):
+        # insert _decode_row dicts (iter_receipts output) exactly as they were,
+        # ids that are already stored are skipped
+        pending = {}
+        with self.pool.connection() as conn, conn:
+            encoded = [self._encode_row(
+                conn, pending, row["id"], row["points"], row["retailer"], date.fromisoformat(row["purchaseDate"]),
+                row["purchaseTime"], [item["shortDescription"] for item in row["items"]],
+                [item["price"] for item in row["items"]], row["total"]) for row in rows]
+            conn.executemany(_INSERT_RECEIPT.replace("INSERT", "INSERT OR IGNORE", 1), encoded)
+        self.dictionary.learn(pending)
+
+    def delete_receipts(self, receipt_ids):
+        with self.pool.connection() as conn, conn:
+            conn.executemany("DELETE FROM retail_receipts WHERE id=?", [(receipt_id,) for receipt_id in receipt_ids])
+
+    def get_receipt_points(self, receipt_id: str):
+        try:
+            with self.pool.connection() as conn:
+                return conn.execute(_SELECT_POINTS, (receipt_id,)).fetchone()
+        except Exception as e:
+            logging.error("An unexpected error occurred: %s", e)
+            logging.exception(e)
+
+    def get_receipt(self, receipt_id: str):
+        # the stored receipt as a Receipt, or None
+        with self.pool.connection() as conn:
+            row = conn.execute(f"SELECT {RECEIPT_COLUMNS} FROM retail_receipts WHERE id=?", (receipt_id,)).fetchone()
+            return Receipt.model_validate(self._decode_row(conn, row)) if row else None
+
+    def iter_receipts(self, batch_size: int = 10000):
+        # every stored receipt in id order, as _decode_row dicts
+        last_id = ""
+        with self.pool.connection() as conn:
+            while True:
+                rows = conn.execute(f"SELECT {RECEIPT_COLUMNS} FROM retail_receipts WHERE id > ? ORDER BY id LIMIT ?",
+                                    (last_id, batch_size)).fetchall()
+                if not rows:
+                    return
+                for row in rows:
+                    yield self._decode_row(conn, row)
+                last_id = rows[-1][0]
+
+    def iter_receipt_ids(self, batch_size: int = 10000):
+        last_id = ""
+        with self.pool.connection() as conn:
+            while True:
+                rows = conn.execute("SELECT id FROM retail_receipts WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)).fetchall()
+                if not rows:
+                    return
+                for (receipt_id,) in rows:
+                    yield receipt_id
+                last_id = rows[-1][0]
+
+    def warm_up(self):
+        # every pooled connection loads the schema and caches the points
+        # lookup now, not on its first request. Nothing is written, so
+        # replicas starting together don't queue on the write lock.
+        with ExitStack() as stack:
+            for _ in range(self.pool.size):
+                conn = stack.enter_context(self.pool.connection())
+                conn.execute(_SELECT_POINTS, ("",)).fetchone()
+
+    def retailer_report(self, start: date = None, end: date = None) -> list:
+        with self.pool.connection() as conn:
+            return query_retailers(conn, start, end)
+
+    def daily_report(self, start: date = None, end: date = None, retailer: str = None) -> list:
+        with self.pool.connection() as conn:
+            return query_daily(conn, start, end, retailer)
+
+    def hourly_report(self, start: date = None, end: date = None) -> list:
+        with self.pool.connection() as conn:
+            return query_hourly(conn, start, end)
+
+    def close(self):
+        self.pool.close()
+
+
+def create_store(backend: str = RECEIPT_STORE) -> ReceiptStore:
+    if backend == "sqlite":
+        from .sharded_store import open_store
+        return open_store()
+    if backend == "memory":
+        from .memory_store import InMemoryReceiptStore
+        memory_store = InMemoryReceiptStore()
+        logging.info("In-memory receipt store: %s", memory_store.stats())
+        return memory_store
+    raise ValueError(f"Unknown receipt store backend: {backend}")
+
+
+def init_db(receipt_store: ReceiptStore = None, write_behind_enabled: bool = WRITE_BEHIND_ENABLED,
+            dedup_enabled: bool = DEDUP_ENABLED):
+    global store, executor, cache, write_behind, seen, dedup
+    store = receipt_store if receipt_store is not None else create_store()
+    dedup = dedup_enabled
+    if store.blocking:
+        # non-blocking stores answer membership themselves
+        if dedup_enabled:
+            seen = SeenReceipts.from_store(store)
+        # one thread per connection so async callers never wait on the pool
+        executor = ThreadPoolExecutor(max_workers=store.concurrency, thread_name_prefix="receipt-db")
+        # non-blocking stores are already as fast as the cache
+        if POINTS_CACHE_SIZE > 0:
+            cache = PointsCache()
+        if write_behind_enabled:
+            from .write_behind import WriteBehindQueue
+            write_behind = WriteBehindQueue(store, on_dropped=_forget).start()
+
+
+def close_db():
+    global store, executor, cache, write_behind, seen, dedup
+    with _init_lock:
+        seen = None
+        dedup = False
+        if write_behind is not None:
+            # drain queued receipts before the connections go away
+            write_behind.stop()
+            write_behind = None
+        cache = None
+        if executor is not None:
+            executor.shutdown(wait=True)
+            executor = None
+        if store is not None:
+            store.close()
+            store = None
+
+
+def get_store() -> ReceiptStore:
+    if store is None:
+        with _init_lock:
+            if store is None:
+                init_db()  # Ensure the database is initialized
+    return store
+
+
+def warm_up():
+    # open the store and get it ready to serve, see ReceiptStore.warm_up
+    get_store().warm_up()
+    if executor is not None:
+        # start the executor threads now, each one blocks until all have started
+        barrier = threading.Barrier(store.concurrency)
+        for future in [executor.submit(barrier.wait) for _ in range(store.concurrency)]:
+            future.result()
+
+
+def store_receipt(receipt_id: str, points: int, receipt):
+    receipt_store = get_store()
+    if write_behind is not None:
+        stored = write_behind.submit(receipt_id, points, receipt)
+    else:
+        stored = receipt_store.store_receipt(receipt_id, points, receipt)
+    if stored:
+        _remember(receipt_id, points)
+    return stored
+
+
+def store_receipts(receipts):
+    stored = get_store().store_receipts(receipts)
+    if stored:
+        for receipt_id, points, _ in receipts:
+            _remember(receipt_id, points)
+    return stored
+
+
+def scored_with_running_rules() -> bool:
+    # whether the stored points come from the rules this process runs, False
+    # between deploying new rules and restarting after the rescore
+    return get_store().rules_fingerprint() == RULES_FINGERPRINT
+
+
+def _remember(receipt_id: str, points: int):
+    # encoded now, so the first poll for the receipt already finds its response body
+    encoded_points(points)
+    if cache is not None:
+        cache.put(receipt_id, points)
+    if seen is not None:
+        seen.add(receipt_id)
+
+
+def _forget(receipt_ids):
+    # undo _remember for receipts the write-behind queue failed to write
+    for receipt_id in receipt_ids:
+        if cache is not None:
+            cache.discard(receipt_id)
+        if seen is not None:
+            seen.discard(receipt_id)
+
+
+def is_known_receipt(receipt_id) -> bool:
+    # cheap membership check done before scoring, never opens the store
+    if seen is not None:
+        return receipt_id in seen
+    if store is not None and not store.blocking and dedup:
+        return store.get_receipt_points(str(receipt_id)) is not None
+    return False
+
+
+def _get_receipt_points_uncached(receipt_id: str):
+    receipt_store = get_store()
+    if write_behind is not None:
+        # queued receipts are committed before they leave the pending map
+        points = write_behind.get_pending(receipt_id)
+        if points is not None:
+            return (points,)
+    result = receipt_store.get_receipt_points(receipt_id)
+    if cache is not None:
+        if result is None:
+            cache.put_missing(receipt_id)
+        else:
+            cache.put(receipt_id, result[0])
+    return result
+
 
 def get_receipt_points(receipt_id: str):
-    if conn is None:
-        init_db()  # Ensure the database is initialized
-    
-    try:
-        with conn:
-            sql = "SELECT points FROM retail_receipts WHERE id=?"
-            db.execute(sql, (receipt_id,))
-            result = db.fetchone()
-            return result
-    except Exception as e:
-        logging.error(f"An unexpected error occurred: {e}")
-        logging.exception(e) 
\ No newline at end of file
+    if cache is not None:
+        points = cache.get(receipt_id)
+        if points is not MISS:
+            return None if points is None else (points,)
+    return _get_receipt_points_uncached(receipt_id)
+
+
+def cache_stats() -> dict:
+    return cache.stats() if cache is not None else {}
+
+
+@registry.register_collector
+def _collect_store_metrics():
+    lines = []
+    stats = cache_stats()
+    if stats:
+        lookups = stats["hits"] + stats["negative_hits"] + stats["misses"]
+        lines += sample_lines("receipt_points_cache_hits_total", "Points cache hits.", stats["hits"], "counter")
+        lines += sample_lines("receipt_points_cache_negative_hits_total", "Points cache hits on unknown ids.", stats["negative_hits"], "counter")
+        lines += sample_lines("receipt_points_cache_misses_total", "Points cache misses.", stats["misses"], "counter")
+        lines += sample_lines("receipt_points_cache_hit_ratio", "Share of points lookups answered by the cache.",
+                              (stats["hits"] + stats["negative_hits"]) / lookups if lookups else 0)
+        lines += sample_lines("receipt_points_cache_entries", "Receipts in the points cache.", stats["entries"])
+    if write_behind is not None:
+        lines += write_behind.metric_lines()
+    if seen is not None:
+        lines += sample_lines("receipt_dedup_ids", "Receipt ids held for duplicate detection.", len(seen))
+    stats = store.stats() if store is not None else {}
+    if "receipts" in stats:
+        lines += sample_lines("receipt_store_receipts", "Receipts held by the store.", stats["receipts"])
+    if "approx_bytes" in stats:
+        lines += sample_lines("receipt_store_bytes", "Approximate memory used by the store.", stats["approx_bytes"])
+        lines += sample_lines("receipt_store_evictions_total", "Receipts evicted from the store.", stats["evictions"], "counter")
+    return lines
+
+
+# Async variants run the blocking calls on the store's executor so async
+# handlers don't stall the event loop. Non-blocking stores answer inline.
+
+async def _run(fn, *args):
+    if not get_store().blocking:
+        return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+
+async def store_receipt_async(receipt_id: str, points: int, receipt):
+    get_store()
+    if write_behind is not None:
+        # queueing is instant unless the queue is full, then wait for room off the loop
+        if write_behind.submit(receipt_id, points, receipt, block=False):
+            _remember(receipt_id, points)
+            return True
+    return await _run(store_receipt, receipt_id, points, receipt)
+
+
+async def store_receipts_async(receipts):
+    return await _run(store_receipts, receipts)
+
+
+async def retailer_report_async(start: date = None, end: date = None) -> list:
+    return await _run(get_store().retailer_report, start, end)
+
+
+async def daily_report_async(start: date = None, end: date = None, retailer: str = None) -> list:
+    return await _run(get_store().daily_report, start, end, retailer)
+
+
+async def hourly_report_async(start: date = None, end: date = None) -> list:
+    return await _run(get_store().hourly_report, start, end)
+
+
+async def get_receipt_points_async(receipt_id: str):
+    # cache hits are answered on the event loop without a thread hop
+    get_store()
+    if cache is not None:
+        points = cache.get(receipt_id)
+        if points is not MISS:
+            return None if points is None else (points,)
+    return await _run(_get_receipt_points_uncached, receipt_id)
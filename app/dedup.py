@@ -0,0 +1,44 @@
+import uuid
+import logging
+
+# Exact set of stored receipt ids, as 128-bit ints, checked right after the id
+# is derived so resubmitted receipts skip scoring and the write. A set rather
+# than a Bloom filter: a false positive would silently drop a new receipt.
+
+
+def receipt_key(receipt_id):
+    if isinstance(receipt_id, uuid.UUID):
+        return receipt_id.int
+    try:
+        return uuid.UUID(receipt_id).int
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+class SeenReceipts:
+
+    def __init__(self, receipt_ids=()):
+        self._keys = set()
+        for receipt_id in receipt_ids:
+            self.add(receipt_id)
+
+    @classmethod
+    def from_store(cls, store):
+        seen = cls(store.iter_receipt_ids())
+        logging.info("Loaded %s stored receipt ids for duplicate detection", len(seen))
+        return seen
+
+    def add(self, receipt_id):
+        key = receipt_key(receipt_id)
+        if key is not None:
+            # set.add is atomic under the GIL
+            self._keys.add(key)
+
+    def discard(self, receipt_id):
+        self._keys.discard(receipt_key(receipt_id))
+
+    def __contains__(self, receipt_id):
+        return receipt_key(receipt_id) in self._keys
+
+    def __len__(self):
+        return len(self._keys)
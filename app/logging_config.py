@@ -0,0 +1,76 @@
+import json
+import queue
+import atexit
+import logging
+import itertools
+from logging.handlers import QueueHandler, QueueListener
+
+from .config import LOG_LEVEL, SCORING_LOG_SAMPLE_RATE
+
+# Request threads only put records on a queue, a background listener thread
+# does the formatting and the blocking write to stderr.
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+scoring_logger = logging.getLogger("app.scoring")
+
+listener = None
+
+_sample_counter = itertools.count()
+
+
+class DeferredQueueHandler(QueueHandler):
+    # QueueHandler.prepare formats the message and any traceback on the calling
+    # thread, so it can be pickled. Our queue never leaves the process, so the
+    # record is queued as is and the listener's handler formats it. Arguments
+    # are formatted when the listener gets to them, don't mutate them after
+    # logging.
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(level: str = LOG_LEVEL, sample_rate: int = SCORING_LOG_SAMPLE_RATE):
+    global listener, SCORING_LOG_SAMPLE_RATE
+    if listener is not None:
+        return listener
+
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.handlers = [DeferredQueueHandler(log_queue)]
+    root.setLevel(level)
+
+    SCORING_LOG_SAMPLE_RATE = sample_rate
+    if sample_rate > 0:
+        scoring_logger.setLevel(logging.DEBUG)
+
+    listener.start()
+    # flush whatever is still queued when the process exits
+    atexit.register(stop_logging)
+    return listener
+
+
+def stop_logging():
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+
+def log_breakdown_sample(receipt_id, receipt, points: int):
+    # Structured debug record with the per rule points for one receipt in N
+    if SCORING_LOG_SAMPLE_RATE <= 0 or next(_sample_counter) % SCORING_LOG_SAMPLE_RATE:
+        return
+    if not scoring_logger.isEnabledFor(logging.DEBUG):
+        return
+    from .receipt_processor import calculate_points_breakdown
+    scoring_logger.debug("%s", json.dumps({
+        "event": "points_breakdown",
+        "id": str(receipt_id),
+        "points": points,
+        "rules": calculate_points_breakdown(receipt),
+    }))
@@ -1,21 +1,47 @@
 
+import time
 import logging
-import sys
 import json
-import uvicorn
-from fastapi import FastAPI, HTTPException, status, Body
-from typing import Union, Any
+from fastapi import FastAPI, HTTPException, status, Body, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from typing import Any, Optional
+from datetime import date
+from contextlib import asynccontextmanager
 from pydantic import ValidationError
 
-from .receipt_processor import generate_id, calculate_points
-from .db import store_receipt, get_receipt_points
-from .config import IS_LLM_GENERATED
+from .receipt_processor import parse_receipt, generate_id, calculate_points, warm_up as warm_up_scoring, RULES_FINGERPRINT
+from .db import warm_up as warm_up_store, close_db, store_receipt_async, store_receipts, get_receipt_points, get_receipt_points_async, is_known_receipt
+from .db import retailer_report_async, daily_report_async, hourly_report_async, scored_with_running_rules
+from .config import IS_LLM_GENERATED, METRICS_ENABLED, POINTS_CACHE_CONTROL, BATCH_MAX_BYTES, BATCH_MAX_RECEIPTS
+from .cache import encoded_points
+from .logging_config import setup_logging, log_breakdown_sample
+from .metrics import registry, stage, duplicate_receipts, MetricsMiddleware
+from .scoring_pool import start_pool, shutdown_pool, should_offload, parse_in_pool, score_in_pool
 
-# Set up logging to record errors
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Set up logging to record errors, written out by a background thread
+setup_logging()
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # open and warm the store (and start the write-behind thread), score one
+    # receipt and start the scoring pool before reporting ready
+    start = time.perf_counter()
+    warm_up_store()
+    warm_up_scoring()
+    start_pool()
+    app.state.ready = True
+    logging.info("Ready in %.0f ms", (time.perf_counter() - start) * 1000)
+    yield
+    # stop taking new traffic while the queue drains
+    app.state.ready = False
+    shutdown_pool()
+    # drains the write-behind queue before closing the connections
+    close_db()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/health")
@@ -23,40 +49,226 @@ def read_root():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+def readiness():
+    # unlike /health, only succeeds once startup warm-up has finished
+    if not getattr(app.state, "ready", False):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Not ready.")
+    return {"status": "ready"}
+
+
+@app.get("/metrics")
+def metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled.")
+    return Response(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/receipts/process")
-def submit_receipt(
+async def submit_receipt(
     payload: Any = Body(None)
 ):
     try:
-        payload_json = json.dumps(payload)
-        receipt_id = generate_id(payload_json)
-        receipt_points = calculate_points(payload_json)
-        check = store_receipt(str(receipt_id), receipt_points, payload)
+        # large receipts are parsed and scored in a worker process off the event loop
+        pooled = should_offload(payload)
+        if pooled:
+            with stage("parse_pool"):
+                receipt_id, receipt = await parse_in_pool(payload)
+        else:
+            with stage("parse"):
+                receipt = parse_receipt(payload)
+            with stage("generate_id"):
+                receipt_id = generate_id(receipt)
+        if is_known_receipt(receipt_id):
+            # resubmitted receipt, nothing to score or write
+            duplicate_receipts.inc()
+            return {"id": receipt_id}
+        if pooled:
+            with stage("score_pool"):
+                receipt_points = await score_in_pool(receipt)
+        else:
+            with stage("calculate_points"):
+                receipt_points = calculate_points(receipt)
+        log_breakdown_sample(receipt_id, receipt, receipt_points)
+        with stage("store"):
+            check = await store_receipt_async(str(receipt_id), receipt_points, receipt)
         if (check):
             return {"id": receipt_id}
         else:
             raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
     except HTTPException as http_error:
-        logging.error(f"HTTP error occurred: {http_error.detail}")
+        logging.error("HTTP error occurred: %s", http_error.detail)
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Error processing receipt.")
     except (json.JSONDecodeError, ValueError) or ValidationError as e:
         # Handle specific errors related to payload
         if (IS_LLM_GENERATED):
-            logging.error(f"Please verify input. JSON or ValueError occurred: {e}")
+            logging.error("Please verify input. JSON or ValueError occurred: %s", e)
         else:
-            logging.error(f"JSON or ValueError occurred: {e}")
+            logging.error("JSON or ValueError occurred: %s", e)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The receipt is invalid.")
     except Exception as e:
         # Catch any unexpected errors
-        logging.error(f"An unexpected error occurred: {e}")
+        logging.error("An unexpected error occurred: %s", e)
         logging.exception(e)  # Logs stack trace as well
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred.")
 
 
+# Stands in for an NDJSON line that isn't JSON, so it gets an error at its position
+_INVALID_LINE = object()
+
+
+def parse_ndjson_line(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        logging.error("JSON or ValueError occurred: %s", e)
+        return _INVALID_LINE
+
+
+def parse_batch(body: bytes, content_type: str):
+    # a batch is either a JSON array or NDJSON, one receipt per line
+    if "ndjson" in content_type:
+        return [parse_ndjson_line(line) for line in body.splitlines() if line.strip()]
+    payloads = json.loads(body)
+    if not isinstance(payloads, list):
+        raise ValueError("Batch body must be a JSON array of receipts.")
+    return payloads
+
+
+def process_batch(payloads):
+    results = []
+    rows = []
+    for payload in payloads:
+        if payload is _INVALID_LINE:
+            results.append({"error": "The receipt is invalid."})
+            continue
+        try:
+            with stage("parse"):
+                receipt = parse_receipt(payload)
+            with stage("generate_id"):
+                receipt_id = str(generate_id(receipt))
+            if is_known_receipt(receipt_id):
+                known = get_receipt_points(receipt_id)
+                if known is not None:
+                    duplicate_receipts.inc()
+                    results.append({"id": receipt_id, "points": known[0]})
+                    continue
+            with stage("calculate_points"):
+                receipt_points = calculate_points(receipt)
+            log_breakdown_sample(receipt_id, receipt, receipt_points)
+        except (json.JSONDecodeError, ValueError) as e:
+            logging.error("JSON or ValueError occurred: %s", e)
+            results.append({"error": "The receipt is invalid."})
+            continue
+        except Exception:
+            # one receipt that can't be scored doesn't fail the rest of the batch
+            logging.exception("An unexpected error occurred scoring a batch receipt")
+            results.append({"error": "An unexpected error occurred."})
+            continue
+        rows.append((receipt_id, receipt_points, receipt))
+        results.append({"id": receipt_id, "points": receipt_points})
+
+    with stage("store_batch"):
+        stored = not rows or store_receipts(rows)
+    if not stored:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Error processing receipts.")
+    return {"receipts": results}
+
+
+async def read_batch_body(request: Request) -> bytes:
+    # the body, refused with a 413 as soon as it grows past BATCH_MAX_BYTES
+    too_large = HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="The batch is too large.")
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > BATCH_MAX_BYTES:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > BATCH_MAX_BYTES:
+            raise too_large
+    return bytes(body)
+
+
+@app.post("/receipts/process/batch")
+async def submit_receipts_batch(request: Request):
+    body = await read_batch_body(request)
+    try:
+        payloads = parse_batch(body, request.headers.get("content-type", ""))
+    except (json.JSONDecodeError, ValueError) as e:
+        logging.error("JSON or ValueError occurred: %s", e)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The batch is invalid.")
+    if len(payloads) > BATCH_MAX_RECEIPTS:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="The batch is too large.")
+    # scoring and the sqlite write are blocking, keep them off the event loop
+    return await run_in_threadpool(process_batch, payloads)
+
+
+def points_etag(receipt_id: str) -> str:
+    # Receipt ids are content hashes, so the points only change when the rules do
+    return f'"{receipt_id}.{RULES_FINGERPRINT}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # weak comparison, as If-None-Match requires. "*" is left to the caller,
+    # it only matches a receipt that exists.
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == etag:
+            return True
+    return False
+
+
 @app.get("/receipts/{receipt_id}/points")
-def get_points(receipt_id: str):
-    receipt_pts = get_receipt_points(receipt_id)
+async def get_points(receipt_id: str, request: Request):
+    if scored_with_running_rules():
+        headers = {"ETag": points_etag(receipt_id), "Cache-Control": POINTS_CACHE_CONTROL}
+        if_none_match = request.headers.get("if-none-match")
+    else:
+        # the stored points may still be from the previous rules, don't let
+        # anyone keep them under this ETag
+        headers = {"Cache-Control": "no-cache"}
+        if_none_match = None
+    if if_none_match and etag_matches(if_none_match, headers["ETag"]):
+        # the client already has this response, no need to look the receipt up
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    receipt_pts = await get_receipt_points_async(receipt_id)
     if (receipt_pts is not None):
-        return {"points": receipt_pts[0]}
+        if if_none_match and if_none_match.strip() == "*":
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        # pre-encoded body, skips FastAPI's serialization
+        return Response(encoded_points(receipt_pts[0]), media_type="application/json", headers=headers)
     else:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No receipt found for that ID.")
+
+
+# Reports are served from the rollups in reports.py, never a scan of the receipts.
+# from and to are inclusive purchase dates, either may be left out.
+
+def report_range(start: Optional[date], end: Optional[date]) -> dict:
+    if start and end and start > end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="from is after to.")
+    return {"from": start, "to": end}
+
+
+@app.get("/reports/retailers")
+async def report_retailers(start: Optional[date] = Query(None, alias="from"),
+                           end: Optional[date] = Query(None, alias="to")):
+    # receipts, points and total per retailer
+    return {**report_range(start, end), "retailers": await retailer_report_async(start, end)}
+
+
+@app.get("/reports/retailers/daily")
+async def report_retailers_daily(start: Optional[date] = Query(None, alias="from"),
+                                 end: Optional[date] = Query(None, alias="to"),
+                                 retailer: Optional[str] = None):
+    # receipts, points and total per retailer per day
+    return {**report_range(start, end), "days": await daily_report_async(start, end, retailer)}
+
+
+@app.get("/reports/hourly")
+async def report_hourly(start: Optional[date] = Query(None, alias="from"),
+                        end: Optional[date] = Query(None, alias="to")):
+    # receipts and points per purchase hour
+    return {**report_range(start, end), "hours": await hourly_report_async(start, end)}
@@ -0,0 +1,152 @@
+import time
+import uuid
+import random
+import threading
+import tracemalloc
+from collections import OrderedDict
+
+from .db import ReceiptStore
+from .dedup import receipt_key
+from .metrics import duplicate_receipts
+from .reports import MemoryRollups
+from .config import MEMORY_STORE_SHARDS, MEMORY_STORE_MAX_MB, MEMORY_STORE_EVICTION, MEMORY_STORE_TTL_SECONDS
+
+# Receipts are kept as compact records keyed by the integer value of their UUID:
+#   lru: points
+#   ttl: (points, expires_at)
+# Only the points survive, the receipt body itself is not kept. Reports come
+# from rollups updated as receipts are stored (see reports.MemoryRollups).
+
+
+def measure_record_bytes(eviction: str = MEMORY_STORE_EVICTION, sample: int = 10000) -> float:
+    # Measure the average heap cost of one stored receipt (key, record and dict slot)
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        rng = random.Random(0)
+        before = tracemalloc.get_traced_memory()[0]
+        records = OrderedDict()
+        for i in range(sample):
+            points = 100 + i % 1000
+            records[rng.getrandbits(128)] = points if eviction == "lru" else (points, time.monotonic())
+        after = tracemalloc.get_traced_memory()[0]
+        return (after - before) / sample
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+
+class _Shard:
+
+    __slots__ = ("lock", "records", "evictions")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records = OrderedDict()
+        self.evictions = 0
+
+
+class InMemoryReceiptStore(ReceiptStore):
+    # Lock-striped, sharded dict of compact receipt records with a memory cap.
+    # Lookups never touch I/O, so async callers run them inline.
+
+    blocking = False
+
+    def __init__(self, shards: int = MEMORY_STORE_SHARDS, max_mb: float = MEMORY_STORE_MAX_MB,
+                 eviction: str = MEMORY_STORE_EVICTION, ttl_seconds: float = MEMORY_STORE_TTL_SECONDS):
+        if eviction not in ("lru", "ttl"):
+            raise ValueError(f"Unknown eviction policy: {eviction}")
+        self.eviction = eviction
+        self.ttl_seconds = ttl_seconds
+        self._shards = [_Shard() for _ in range(shards)]
+        self.bytes_per_receipt = measure_record_bytes(eviction)
+        self.max_receipts = int(max_mb * 1024 * 1024 / self.bytes_per_receipt)
+        self._shard_cap = max(1, -(-self.max_receipts // shards))
+        self.rollups = MemoryRollups()
+
+    def _shard(self, key: int) -> _Shard:
+        return self._shards[key % len(self._shards)]
+
+    def _put(self, shard: _Shard, key: int, points: int) -> bool:
+        # caller holds shard.lock, False for a receipt that is already stored
+        records = shard.records
+        if key in records:
+            duplicate_receipts.inc()
+            return False
+        if self.eviction == "lru":
+            records[key] = points
+        else:
+            records[key] = (points, time.monotonic() + self.ttl_seconds)
+        # both policies evict from the front: least recently used, or oldest insert
+        while len(records) > self._shard_cap:
+            records.popitem(last=False)
+            shard.evictions += 1
+        return True
+
+    def store_receipt(self, receipt_id: str, points: int, receipt):
+        key = receipt_key(receipt_id)
+        if key is None:
+            return None
+        shard = self._shard(key)
+        with shard.lock:
+            added = self._put(shard, key, points)
+        # points only callers (receipt None) don't show up in reports
+        if added and receipt is not None:
+            self.rollups.add(points, receipt)
+        return True
+
+    def store_receipts(self, receipts):
+        for receipt_id, points, receipt in receipts:
+            if not self.store_receipt(receipt_id, points, receipt):
+                return None
+        return True
+
+    def get_receipt_points(self, receipt_id: str):
+        key = receipt_key(receipt_id)
+        if key is None:
+            return None
+        shard = self._shard(key)
+        with shard.lock:
+            record = shard.records.get(key)
+            if record is None:
+                return None
+            if self.eviction == "lru":
+                shard.records.move_to_end(key)
+                return (record,)
+            points, expires_at = record
+            if expires_at <= time.monotonic():
+                del shard.records[key]
+                shard.evictions += 1
+                return None
+            return (points,)
+
+    def retailer_report(self, start=None, end=None) -> list:
+        return self.rollups.retailers(start, end)
+
+    def daily_report(self, start=None, end=None, retailer: str = None) -> list:
+        return self.rollups.daily(start, end, retailer)
+
+    def hourly_report(self, start=None, end=None) -> list:
+        return self.rollups.hourly(start, end)
+
+    def iter_receipt_ids(self):
+        for shard in self._shards:
+            with shard.lock:
+                keys = list(shard.records)
+            for key in keys:
+                yield str(uuid.UUID(int=key))
+
+    def __len__(self):
+        return sum(len(shard.records) for shard in self._shards)
+
+    def stats(self) -> dict:
+        receipts = len(self)
+        return {
+            "backend": "memory",
+            "receipts": receipts,
+            "max_receipts": self.max_receipts,
+            "bytes_per_receipt": round(self.bytes_per_receipt, 1),
+            "approx_bytes": int(receipts * self.bytes_per_receipt),
+            "evictions": sum(shard.evictions for shard in self._shards),
+        }
@@ -0,0 +1,107 @@
+import sys
+import json
+import time
+import argparse
+import logging
+from datetime import date
+from typing import Iterable
+
+from .config import DB_PATH, DB_BUSY_TIMEOUT_MS
+from .codec import ItemDictionary
+from .db import ConnectionPool, SCHEMA_VERSION, _SCHEMA, _INSERT_RECEIPT, is_legacy, encode_row
+
+# Moves a database written before the compact format (version 0: ISO date and
+# time text, items as JSON text, total as a double) to the current schema.
+# The server refuses to open such a database, so run this first:
+#   python -m app.migrate --db retail_receipt.db
+# Every batch is its own short transaction that inserts the compact rows and
+# deletes them from retail_receipts_legacy, so other processes are never
+# locked out for long and an interrupted run picks up where it stopped.
+
+
+def _start(conn) -> bool:
+    # rename the legacy table and create the current schema next to it,
+    # False when there is nothing to migrate
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if not is_legacy(conn):
+            conn.commit()
+            return False
+        renamed = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='retail_receipts_legacy'").fetchone()
+        if not renamed:
+            conn.execute("ALTER TABLE retail_receipts RENAME TO retail_receipts_legacy")
+        for ddl in _SCHEMA:
+            conn.execute(ddl)
+        conn.commit()
+        return True
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def _migrate_batch(conn, dictionary: ItemDictionary, batch_size: int) -> int:
+    # move the batch_size lowest ids, 0 once the legacy table is empty and dropped
+    conn.execute("BEGIN IMMEDIATE")
+    pending = {}
+    try:
+        rows = conn.execute(
+            "SELECT id, retailer, purchase_date, purchase_time, items, total, points FROM retail_receipts_legacy "
+            "ORDER BY id LIMIT ?", (batch_size,)).fetchall()
+        if not rows:
+            conn.execute("DROP TABLE retail_receipts_legacy")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.commit()
+            return 0
+        encoded = []
+        for receipt_id, retailer, purchase_date, purchase_time, items, total, points in rows:
+            items = json.loads(items)
+            encoded.append(encode_row(
+                dictionary, conn, pending, receipt_id, points, retailer, date.fromisoformat(purchase_date),
+                purchase_time, [item["shortDescription"] for item in items], [float(item["price"]) for item in items],
+                float(total)))
+        conn.executemany(_INSERT_RECEIPT, encoded)
+        conn.execute("DELETE FROM retail_receipts_legacy WHERE id <= ?", (rows[-1][0],))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    # only cached once the codes are committed
+    dictionary.learn(pending)
+    return len(rows)
+
+
+def migrate_db(path: str = DB_PATH, batch_size: int = 10000) -> int:
+    # -> receipts migrated by this run
+    pool = ConnectionPool(path, 1, DB_BUSY_TIMEOUT_MS)
+    migrated = 0
+    try:
+        with pool.connection() as conn:
+            if not _start(conn):
+                logging.info("%s is not in the legacy layout, nothing to migrate", path)
+                return 0
+            dictionary = ItemDictionary()
+            while True:
+                count = _migrate_batch(conn, dictionary, batch_size)
+                if not count:
+                    break
+                migrated += count
+                logging.info("Migrated %d receipts so far", migrated)
+    finally:
+        pool.close()
+    return migrated
+
+
+def main(argv: Iterable[str] = None):
+    parser = argparse.ArgumentParser(description="Migrate a legacy JSON layout database to the compact format.")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database file")
+    parser.add_argument("--batch-size", type=int, default=10000, help="receipts moved per transaction")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    migrated = migrate_db(args.db, args.batch_size)
+    logging.info("Migrated %d receipts in %.2fs", migrated, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main(sys.argv[1:])
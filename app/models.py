@@ -3,15 +3,17 @@ import time
 from datetime import date
 from typing import List
 
+from .money import Cents
+
 class Item(BaseModel):
     shortDescription: str
-    price: float
+    price: Cents  # integer cents
 
 class Receipt(BaseModel):
     retailer: str
     purchaseDate: date
     purchaseTime: str 
     items: List[Item]
-    total: float
+    total: Cents  # integer cents
 
 
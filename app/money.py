@@ -0,0 +1,93 @@
+import re
+import math
+from typing_extensions import Annotated
+from decimal import Decimal, DecimalException, InvalidOperation, localcontext
+
+from pydantic import BeforeValidator, PlainSerializer
+
+# Money is held as integer cents, so the scoring rules are exact integer
+# arithmetic. Amounts are parsed straight from the request strings ("6.49")
+# and anything that isn't a whole number of cents is rejected. Serialized
+# back as dollars, so the canonical form (and every receipt id) is the same
+# as when amounts were floats.
+
+_DOLLARS = re.compile(r"(-?)([0-9]+)(?:\.([0-9]{1,2}))?")
+
+# keeps every amount well inside SQLite's 64 bit integers
+MAX_CENTS = 10 ** 15
+
+_CENT = Decimal("0.01")
+
+
+def to_cents(amount: float):
+    # exact integer cents of a float, or None when it isn't a whole number of cents
+    if math.isfinite(amount) and abs(amount) < 1e13:
+        cents = round(amount * 100)
+        if cents / 100 == amount:
+            return cents
+    return None
+
+
+def _parse(value) -> int:
+    if type(value) is str:
+        # fast path for the documented "6.49" format, this runs for every item
+        if value[-3:-2] == "." and len(value) < 20:
+            digits = value[:-3] + value[-2:]
+            if digits.isascii() and digits.isdigit():
+                return int(digits)
+        match = _DOLLARS.fullmatch(value)
+        if match:
+            sign, whole, fraction = match.groups()
+            if len(whole.lstrip("0")) > 13:
+                raise ValueError(f"Amount out of range: {value!r}")
+            cents = int(whole) * 100 + (int(fraction.ljust(2, "0")) if fraction else 0)
+            return -cents if sign else cents
+        # any other spelling of an exact amount, e.g. "6.490" or "1e2"
+        return _parse_decimal(value)
+    if type(value) is int:
+        return value * 100
+    if type(value) is float:
+        cents = to_cents(value)
+        if cents is None:
+            raise ValueError(f"Amount is not a whole number of cents: {value!r}")
+        return cents
+    raise ValueError(f"Invalid amount: {value!r}")
+
+
+def _parse_decimal(value: str) -> int:
+    # the range is checked before any arithmetic: "1e999999" would overflow
+    # and "1e500000" would spend seconds building a huge int
+    try:
+        if "_" in value:
+            raise InvalidOperation
+        dollars = Decimal(value.strip())
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {value!r}") from None
+    if not dollars.is_finite():
+        raise ValueError(f"Invalid amount: {value!r}")
+    if abs(dollars) >= MAX_CENTS // 100:
+        raise ValueError(f"Amount out of range: {value!r}")
+    try:
+        with localcontext() as ctx:
+            ctx.prec = 28
+            cents = dollars.quantize(_CENT)
+    except DecimalException:
+        raise ValueError(f"Invalid amount: {value!r}") from None
+    if cents != dollars:
+        raise ValueError(f"Amount is not a whole number of cents: {value!r}")
+    return int(cents.scaleb(2))
+
+
+def parse_cents(value) -> int:
+    cents = _parse(value)
+    if abs(cents) >= MAX_CENTS:
+        raise ValueError(f"Amount out of range: {value!r}")
+    return cents
+
+
+def cents_to_dollars(cents: int) -> float:
+    return cents / 100
+
+
+# Pydantic field type: integer cents in, dollars out
+Cents = Annotated[int, BeforeValidator(parse_cents), PlainSerializer(cents_to_dollars, return_type=float)]
@@ -1,11 +1,10 @@
 import uuid
 import time
-import math
-import logging
 from datetime import datetime
 
 from .models import Receipt, Item
 from .config import IS_LLM_GENERATED
+from .rules import register_rule, active_rules, compile_rules, compile_breakdown, rules_fingerprint
 
 # These rules collectively define how many points should be awarded to a receipt.
 
@@ -18,10 +17,23 @@ from .config import IS_LLM_GENERATED
 # 6 points if the day in the purchase date is odd.
 # 10 points if the time of purchase is after 2:00pm and before 4:00pm.
 
+# Totals and prices are integer cents (see money.py), so every rule is exact integer arithmetic.
 
-def generate_id(receipt: str):
-    # Generate UUID based on MD5 hash of the string
-    return uuid.uuid3(uuid.NAMESPACE_DNS, receipt)
+
+def canonical_form(receipt: Receipt) -> str:
+    # Fields are serialized in model declaration order, so the payload's key order,
+    # whitespace and number formatting ("1.25" vs 1.25) don't change the result
+    return receipt.model_dump_json()
+
+
+def generate_id(receipt: Receipt):
+    # Generate UUID based on MD5 hash of the canonical receipt
+    return uuid.uuid3(uuid.NAMESPACE_DNS, canonical_form(receipt))
+
+
+def parse_receipt(payload) -> Receipt:
+    # Validate an already decoded request body, this is the only parse on the ingest path
+    return Receipt.model_validate(payload)
 
 
 def from_json_to_receipt(receipt: str) -> Receipt:
@@ -30,40 +42,39 @@ def from_json_to_receipt(receipt: str) -> Receipt:
 
 
 
-def calculate_points(json_receipt: str):
-    receipt = from_json_to_receipt(json_receipt)
-    return sum([count_rule_retailer_name(receipt),
-        count_rule_receipt_total(receipt)]+
-        [count_rule_receipt_items(receipt),
-        count_rule_receipt_datetime(receipt)])
-
+@register_rule("retailer_name", fields=("retailer",))
 def count_rule_retailer_name(rec: Receipt):
     points = sum(c.isalnum() for c in rec.retailer)
-    logging.info(f"Retailer name pts: {points}")
     return points
 
+@register_rule("receipt_total", fields=("total",))
 def count_rule_receipt_total(rec: Receipt):
     points = 0
-    if rec.total.is_integer() is True:
+    if rec.total % 100 == 0:
         points+=50
-    if rec.total % 0.25 == 0:
+    if rec.total % 25 == 0:
         points+=25
-    if IS_LLM_GENERATED and rec.total > 10.0:
-        points+=5
-    logging.info(f"Receipt total pts: {points}")
     return points
 
+# Only registered as active when the program is LLM generated
+@register_rule("llm_total", fields=("total",), enabled=IS_LLM_GENERATED)
+def count_rule_llm_total(rec: Receipt):
+    points = 5 if rec.total > 1000 else 0
+    return points
+
+@register_rule("receipt_items", fields=("items",))
 def count_rule_receipt_items(rec: Receipt):
     points = 0
     item_count_points = (len(rec.items)//2)*5
     points+=item_count_points
     for item in rec.items:
         if (len(item.shortDescription.strip())%3 == 0):
-            points+=math.ceil(item.price*0.2)
-    logging.info(f"Receipt items pts: {points}")
+            # ceil(price * 0.2) in dollars, ceil(cents / 500) as an integer division
+            points+=-(-item.price // 500)
     return points
 
 
+@register_rule("receipt_datetime", fields=("purchaseDate", "purchaseTime"))
 def count_rule_receipt_datetime(rec: Receipt):
     points = 0
     purchase_time = int(rec.purchaseTime.replace(":", ""))
@@ -71,6 +82,41 @@ def count_rule_receipt_datetime(rec: Receipt):
         points+=6
     if (purchase_time > 1400 and purchase_time <1600):
         points+=10
-    logging.info(f"Receipt date/time pts: {points}")
     return points
 
+
+# Compiled once at import with the rules active for this process
+ACTIVE_RULES = active_rules()
+_evaluate = compile_rules(ACTIVE_RULES)
+# part of the points ETag, so cached responses are revalidated once the rules change
+RULES_FINGERPRINT = rules_fingerprint(ACTIVE_RULES)
+_breakdown = None
+
+
+def calculate_points(receipt: Receipt):
+    return _evaluate(receipt)
+
+
+# Scored once by warm_up so the first real request doesn't pay for pydantic's
+# and json's lazy setup
+_WARM_UP_RECEIPT = {
+    "retailer": "Target",
+    "purchaseDate": "2022-01-02",
+    "purchaseTime": "13:13",
+    "items": [{"shortDescription": "Pepsi - 12-oz", "price": "1.25"}],
+    "total": "1.25",
+}
+
+
+def warm_up() -> int:
+    receipt = parse_receipt(_WARM_UP_RECEIPT)
+    generate_id(receipt)
+    return calculate_points(receipt)
+
+
+def calculate_points_breakdown(receipt: Receipt):
+    # per rule points, compiled on first use so plain scoring never pays for it
+    global _breakdown
+    if _breakdown is None:
+        _breakdown = compile_breakdown(ACTIVE_RULES)
+    return _breakdown(receipt)
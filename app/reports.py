@@ -0,0 +1,255 @@
+import sys
+import time
+import argparse
+import logging
+import threading
+from datetime import date
+from typing import Iterable
+
+from .config import DB_PATH, DB_SHARDS
+from .codec import date_to_db, date_from_db, time_to_db
+from .money import cents_to_dollars
+
+# Reporting rollups, so dashboards never scan retail_receipts:
+#   retailer_daily   receipts, points and total per (purchase_date, retailer)
+#   receipts_hourly  receipts and points per (purchase_date, purchase hour)
+# In SQLite they are kept up to date by triggers, in the same transaction as
+# the receipt insert (and a rescore's points update, or a delete). A report
+# reads at most one row per day and retailer, however many receipts are stored.
+# Receipts whose purchase time isn't "HH:MM" are left out of the hourly
+# rollup. `python -m app.reports rebuild` recomputes both from scratch.
+
+ROLLUP_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS retailer_daily (
+        purchase_date INTEGER NOT NULL,
+        retailer TEXT NOT NULL,
+        receipts INTEGER NOT NULL,
+        points INTEGER NOT NULL,
+        total_cents INTEGER NOT NULL,
+        PRIMARY KEY (purchase_date, retailer)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS receipts_hourly (
+        purchase_date INTEGER NOT NULL,
+        hour INTEGER NOT NULL,
+        receipts INTEGER NOT NULL,
+        points INTEGER NOT NULL,
+        PRIMARY KEY (purchase_date, hour)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS retailer_daily_insert AFTER INSERT ON retail_receipts
+    BEGIN
+        INSERT INTO retailer_daily VALUES (NEW.purchase_date, NEW.retailer, 1, NEW.points, COALESCE(NEW.total_cents, 0))
+        ON CONFLICT DO UPDATE SET receipts = receipts + 1, points = points + excluded.points,
+                                  total_cents = total_cents + excluded.total_cents;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS receipts_hourly_insert AFTER INSERT ON retail_receipts
+    WHEN NEW.purchase_time IS NOT NULL
+    BEGIN
+        INSERT INTO receipts_hourly VALUES (NEW.purchase_date, NEW.purchase_time / 100, 1, NEW.points)
+        ON CONFLICT DO UPDATE SET receipts = receipts + 1, points = points + excluded.points;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS rollup_points_update AFTER UPDATE OF points ON retail_receipts
+    BEGIN
+        UPDATE retailer_daily SET points = points + NEW.points - OLD.points
+        WHERE purchase_date = NEW.purchase_date AND retailer = NEW.retailer;
+        UPDATE receipts_hourly SET points = points + NEW.points - OLD.points
+        WHERE purchase_date = NEW.purchase_date AND hour = NEW.purchase_time / 100;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS rollup_receipt_delete AFTER DELETE ON retail_receipts
+    BEGIN
+        UPDATE retailer_daily SET receipts = receipts - 1, points = points - OLD.points,
+                                  total_cents = total_cents - COALESCE(OLD.total_cents, 0)
+        WHERE purchase_date = OLD.purchase_date AND retailer = OLD.retailer;
+        DELETE FROM retailer_daily WHERE purchase_date = OLD.purchase_date AND retailer = OLD.retailer AND receipts = 0;
+        UPDATE receipts_hourly SET receipts = receipts - 1, points = points - OLD.points
+        WHERE purchase_date = OLD.purchase_date AND hour = OLD.purchase_time / 100;
+        DELETE FROM receipts_hourly WHERE purchase_date = OLD.purchase_date AND hour = OLD.purchase_time / 100
+                                      AND receipts = 0;
+    END
+    ''',
+)
+
+# bounds used when a report has no from or to date
+_FIRST_DAY = 0
+_LAST_DAY = 99991231
+
+
+def date_range(start: date = None, end: date = None):
+    # -> (first, last) purchase_date column values, both inclusive
+    return (date_to_db(start) if start else _FIRST_DAY), (date_to_db(end) if end else _LAST_DAY)
+
+
+def retailer_rows(rows) -> list:
+    # (retailer, receipts, points, total_cents) -> report entries
+    return [{"retailer": retailer, "receipts": receipts, "points": points, "total": cents_to_dollars(cents)}
+            for retailer, receipts, points, cents in rows]
+
+
+def daily_rows(rows) -> list:
+    # (purchase_date, retailer, receipts, points, total_cents) -> report entries
+    return [{"date": date_from_db(day).isoformat(), "retailer": retailer, "receipts": receipts, "points": points,
+             "total": cents_to_dollars(cents)}
+            for day, retailer, receipts, points, cents in rows]
+
+
+def hourly_rows(rows) -> list:
+    # (hour, receipts, points) -> report entries
+    return [{"hour": hour, "receipts": receipts, "points": points} for hour, receipts, points in rows]
+
+
+# The *_sums queries return the raw rows the *_rows functions format, so
+# rows from several databases can be combined with merge_sums first.
+
+def retailer_sums(conn, start: date = None, end: date = None) -> list:
+    sql = ("SELECT retailer, SUM(receipts), SUM(points), SUM(total_cents) FROM retailer_daily "
+           "WHERE purchase_date BETWEEN ? AND ? GROUP BY retailer ORDER BY retailer")
+    return conn.execute(sql, date_range(start, end)).fetchall()
+
+
+def daily_sums(conn, start: date = None, end: date = None, retailer: str = None) -> list:
+    sql = ("SELECT purchase_date, retailer, receipts, points, total_cents FROM retailer_daily "
+           "WHERE purchase_date BETWEEN ? AND ?")
+    params = date_range(start, end)
+    if retailer is not None:
+        sql += " AND retailer = ?"
+        params += (retailer,)
+    return conn.execute(sql + " ORDER BY purchase_date, retailer", params).fetchall()
+
+
+def hourly_sums(conn, start: date = None, end: date = None) -> list:
+    sql = ("SELECT hour, SUM(receipts), SUM(points) FROM receipts_hourly "
+           "WHERE purchase_date BETWEEN ? AND ? GROUP BY hour ORDER BY hour")
+    return conn.execute(sql, date_range(start, end)).fetchall()
+
+
+def merge_sums(row_sets, key_columns: int) -> list:
+    # add up the value columns of rows that share their first key_columns, in key order
+    sums = {}
+    for rows in row_sets:
+        for row in rows:
+            key = row[:key_columns]
+            totals = sums.get(key)
+            sums[key] = row[key_columns:] if totals is None else tuple(map(sum, zip(totals, row[key_columns:])))
+    return [key + totals for key, totals in sorted(sums.items())]
+
+
+def query_retailers(conn, start: date = None, end: date = None) -> list:
+    return retailer_rows(retailer_sums(conn, start, end))
+
+
+def query_daily(conn, start: date = None, end: date = None, retailer: str = None) -> list:
+    return daily_rows(daily_sums(conn, start, end, retailer))
+
+
+def query_hourly(conn, start: date = None, end: date = None) -> list:
+    return hourly_rows(hourly_sums(conn, start, end))
+
+
+def rebuild_rollups(conn):
+    # recompute both rollups from retail_receipts, in the caller's transaction
+    conn.execute("DELETE FROM retailer_daily")
+    conn.execute(
+        "INSERT INTO retailer_daily SELECT purchase_date, retailer, COUNT(*), SUM(points), SUM(COALESCE(total_cents, 0)) "
+        "FROM retail_receipts GROUP BY retailer, purchase_date")
+    conn.execute("DELETE FROM receipts_hourly")
+    conn.execute(
+        "INSERT INTO receipts_hourly SELECT purchase_date, purchase_time / 100, COUNT(*), SUM(points) "
+        "FROM retail_receipts WHERE purchase_time IS NOT NULL GROUP BY purchase_date, purchase_time / 100")
+
+
+class MemoryRollups:
+    # The same rollups for the in-memory store. Receipts are counted when
+    # they are stored and stay counted after the store evicts them.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (purchase_date, retailer): [receipts, points, total_cents]
+        self._daily = {}
+        # (purchase_date, hour): [receipts, points]
+        self._hourly = {}
+
+    def add(self, points: int, receipt):
+        day = date_to_db(receipt.purchaseDate)
+        hhmm = time_to_db(receipt.purchaseTime)
+        with self._lock:
+            totals = self._daily.setdefault((day, receipt.retailer), [0, 0, 0])
+            totals[0] += 1
+            totals[1] += points
+            totals[2] += receipt.total
+            if hhmm is not None:
+                totals = self._hourly.setdefault((day, hhmm // 100), [0, 0])
+                totals[0] += 1
+                totals[1] += points
+
+    def retailers(self, start: date = None, end: date = None) -> list:
+        first, last = date_range(start, end)
+        sums = {}
+        with self._lock:
+            for (day, retailer), (receipts, points, cents) in self._daily.items():
+                if first <= day <= last:
+                    totals = sums.setdefault(retailer, [0, 0, 0])
+                    totals[0] += receipts
+                    totals[1] += points
+                    totals[2] += cents
+        return retailer_rows((retailer, *totals) for retailer, totals in sorted(sums.items()))
+
+    def daily(self, start: date = None, end: date = None, retailer: str = None) -> list:
+        first, last = date_range(start, end)
+        with self._lock:
+            rows = [(day, name, *totals) for (day, name), totals in self._daily.items()
+                    if first <= day <= last and (retailer is None or name == retailer)]
+        return daily_rows(sorted(rows))
+
+    def hourly(self, start: date = None, end: date = None) -> list:
+        first, last = date_range(start, end)
+        sums = {}
+        with self._lock:
+            for (day, hour), (receipts, points) in self._hourly.items():
+                if first <= day <= last:
+                    totals = sums.setdefault(hour, [0, 0])
+                    totals[0] += receipts
+                    totals[1] += points
+        return hourly_rows((hour, *totals) for hour, totals in sorted(sums.items()))
+
+
+def rebuild_db(path: str = DB_PATH):
+    from .db import SqliteReceiptStore
+
+    store = SqliteReceiptStore(path, pool_size=1)
+    try:
+        with store.pool.connection() as conn, conn:
+            rebuild_rollups(conn)
+            return conn.execute("SELECT COUNT(*) FROM retailer_daily").fetchone()[0]
+    finally:
+        store.close()
+
+
+def main(argv: Iterable[str] = None):
+    parser = argparse.ArgumentParser(description="Maintain the reporting rollups of the SQLite store.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild_parser = commands.add_parser("rebuild", help="recompute the rollups from retail_receipts")
+    rebuild_parser.add_argument("--db", default=DB_PATH, help="SQLite database file")
+    rebuild_parser.add_argument("--shards", type=int, default=DB_SHARDS, help="SQLite files the store is split across")
+
+    args = parser.parse_args(argv)
+    from .sharded_store import shard_paths
+
+    start = time.perf_counter()
+    rows = sum(rebuild_db(path) for path in shard_paths(args.db, args.shards))
+    logging.info("Rebuilt rollups (%d retailer days) in %.2fs", rows, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main(sys.argv[1:])
@@ -0,0 +1,244 @@
+import sys
+import time
+import argparse
+import logging
+from typing import Iterable, List, NamedTuple
+
+import numpy as np
+
+from .config import DB_PATH, DB_SHARDS
+from .codec import items_layout, decode_fields
+from .models import Receipt
+from .receipt_processor import ACTIVE_RULES
+from .rules import RULES, rules_fingerprint
+
+# Columnar version of the registered scoring rules, for rescoring stored
+# receipts in bulk after the rules change. Every rule is one array operation
+# over a whole batch and must give exactly the same points as its scalar
+# count_rule_* function. Totals and prices are integer cents, as in Receipt.
+
+
+class ReceiptColumns(NamedTuple):
+    # one entry per receipt
+    retailer_alnum: np.ndarray
+    total: np.ndarray
+    day: np.ndarray
+    hhmm: np.ndarray
+    item_count: np.ndarray
+    # one entry per item, receipts' items are stored back to back
+    item_desc_len: np.ndarray
+    item_price: np.ndarray
+
+
+def _build_columns(retailers, totals, days, hhmms, items_per_receipt) -> ReceiptColumns:
+    desc_lens = []
+    prices = []
+    counts = []
+    for items in items_per_receipt:
+        counts.append(len(items))
+        for desc_len, price in items:
+            desc_lens.append(desc_len)
+            prices.append(price)
+    return ReceiptColumns(
+        retailer_alnum=np.fromiter((sum(c.isalnum() for c in r) for r in retailers), dtype=np.int64, count=len(retailers)),
+        total=np.asarray(totals, dtype=np.int64),
+        day=np.asarray(days, dtype=np.int64),
+        hhmm=np.asarray(hhmms, dtype=np.int64),
+        item_count=np.asarray(counts, dtype=np.int64),
+        item_desc_len=np.asarray(desc_lens, dtype=np.int64),
+        item_price=np.asarray(prices, dtype=np.int64))
+
+
+def columns_from_receipts(receipts: List[Receipt]) -> ReceiptColumns:
+    return _build_columns(
+        [r.retailer for r in receipts],
+        [r.total for r in receipts],
+        [r.purchaseDate.day for r in receipts],
+        [int(r.purchaseTime.replace(":", "")) for r in receipts],
+        [[(len(i.shortDescription.strip()), i.price) for i in r.items] for r in receipts])
+
+
+# numpy dtypes of the codec.pack_items array typecodes
+_ITEM_DTYPES = {"H": "<u2", "I": "<u4", "h": "<i2", "i": "<i4", "q": "<i8", "d": "<f8"}
+
+
+def description_lengths(conn) -> np.ndarray:
+    # trimmed description length by item code, for the items rule
+    rows = conn.execute("SELECT code, description FROM item_descriptions").fetchall()
+    lengths = np.zeros(max((code for code, _ in rows), default=0) + 1, dtype=np.int64)
+    for code, description in rows:
+        lengths[code] = len(description.strip())
+    return lengths
+
+
+# retail_receipts columns behind each Receipt field a rule declares, with
+# the constant selected in their place when no rule being rescored reads it
+_FIELD_COLUMNS = {
+    "retailer": (("retailer", "''"),),
+    "purchaseDate": (("purchase_date", "0"),),
+    "purchaseTime": (("purchase_time", "0"), ("extras", "NULL")),
+    "items": (("items", "NULL"),),
+    "total": (("total_cents", "0"),),
+}
+
+
+def select_columns(rules: Iterable[str]) -> str:
+    # the select list columns_from_rows takes, reading only the fields the rules declare
+    unknown = [name for name in rules if name not in RULES]
+    if unknown:
+        raise ValueError(f"Unknown scoring rules: {', '.join(unknown)}")
+    fields = {field for name in rules for field in RULES[name].fields}
+    columns = {column: column if field in fields else placeholder
+               for field, pairs in _FIELD_COLUMNS.items() for column, placeholder in pairs}
+    return ", ".join(columns[c] for c in ("retailer", "purchase_date", "purchase_time", "items", "total_cents", "extras"))
+
+
+def columns_from_rows(rows, desc_lengths: np.ndarray) -> ReceiptColumns:
+    # rows of (retailer, purchase_date, purchase_time, items, total_cents, extras) from retail_receipts,
+    # as picked by select_columns.
+    # Item codes and prices are read straight out of the packed blobs. Rows
+    # stored before amounts had to be whole cents score on the nearest cent.
+    retailers, totals, days, hhmms, counts, codes, prices = [], [], [], [], [], [], []
+    for retailer, purchase_date, purchase_time, items, total_cents, extras in rows:
+        retailers.append(retailer)
+        # NULL only for a legacy non-finite total
+        totals.append(total_cents or 0)
+        days.append(purchase_date % 100)
+        if extras:
+            _, purchase_time, _ = decode_fields(purchase_date, purchase_time, total_cents, extras)
+            hhmm = int(purchase_time.replace(":", ""))
+        else:
+            hhmm = purchase_time
+        hhmms.append(hhmm)
+        if items is None:
+            # not selected, no rule being rescored reads the items
+            counts.append(0)
+            continue
+        code_type, price_type, count, codes_offset, prices_offset = items_layout(items)
+        counts.append(count)
+        codes.append(np.frombuffer(items, _ITEM_DTYPES[code_type], count, codes_offset))
+        item_prices = np.frombuffer(items, _ITEM_DTYPES[price_type], count, prices_offset)
+        prices.append(np.round(item_prices * 100).astype(np.int64) if price_type == "d" else item_prices.astype(np.int64))
+    codes = np.concatenate(codes) if codes else np.zeros(0, dtype=np.int64)
+    return ReceiptColumns(
+        retailer_alnum=np.fromiter((sum(c.isalnum() for c in r) for r in retailers), dtype=np.int64, count=len(retailers)),
+        total=np.asarray(totals, dtype=np.int64),
+        day=np.asarray(days, dtype=np.int64),
+        hhmm=np.asarray(hhmms, dtype=np.int64),
+        item_count=np.asarray(counts, dtype=np.int64),
+        item_desc_len=desc_lengths[codes],
+        item_price=np.concatenate(prices) if prices else np.zeros(0, dtype=np.int64))
+
+
+def _retailer_name(cols: ReceiptColumns):
+    return cols.retailer_alnum
+
+
+def _receipt_total(cols: ReceiptColumns):
+    return np.where(cols.total % 100 == 0, 50, 0) + np.where(cols.total % 25 == 0, 25, 0)
+
+
+def _llm_total(cols: ReceiptColumns):
+    return np.where(cols.total > 1000, 5, 0)
+
+
+def _receipt_items(cols: ReceiptColumns):
+    item_points = np.where(cols.item_desc_len % 3 == 0, -(-cols.item_price // 500), 0)
+    # per receipt sums over the back to back item runs
+    ends = np.cumsum(cols.item_count)
+    running = np.concatenate(([0], np.cumsum(item_points)))
+    return (cols.item_count // 2) * 5 + running[ends] - running[ends - cols.item_count]
+
+
+def _receipt_datetime(cols: ReceiptColumns):
+    return (np.where(cols.day % 2 != 0, 6, 0)
+            + np.where((cols.hhmm > 1400) & (cols.hhmm < 1600), 10, 0))
+
+
+# Array version of every rule in the registry, by rule name
+VECTORIZED_RULES = {
+    "retailer_name": _retailer_name,
+    "receipt_total": _receipt_total,
+    "llm_total": _llm_total,
+    "receipt_items": _receipt_items,
+    "receipt_datetime": _receipt_datetime,
+}
+
+
+def score_columns(cols: ReceiptColumns, rules: Iterable[str] = None) -> np.ndarray:
+    rules = ACTIVE_RULES if rules is None else list(rules)
+    missing = [name for name in rules if name not in VECTORIZED_RULES]
+    if missing:
+        raise ValueError(f"No vectorized implementation for rules: {', '.join(missing)}")
+    points = np.zeros(len(cols.total), dtype=np.int64)
+    for name in rules:
+        points += VECTORIZED_RULES[name](cols)
+    return points
+
+
+def score_receipts(receipts: List[Receipt], rules: Iterable[str] = None) -> np.ndarray:
+    return score_columns(columns_from_receipts(receipts), rules)
+
+
+def rescore_db(path: str = DB_PATH, batch_size: int = 50000, rules: Iterable[str] = None):
+    # Rescore every stored receipt and write back the points that changed,
+    # then record the rules' fingerprint so servers running them send ETags.
+    # Running servers keep serving cached points until they restart.
+    from .db import SqliteReceiptStore, set_rules_fingerprint
+
+    rules = ACTIVE_RULES if rules is None else list(rules)
+    columns = select_columns(rules)
+    store = SqliteReceiptStore(path, pool_size=1)
+    scanned = updated = 0
+    last_id = ""
+    try:
+        with store.pool.connection() as conn:
+            desc_lengths = description_lengths(conn)
+            while True:
+                rows = conn.execute(
+                    f"SELECT id, {columns}, points FROM retail_receipts "
+                    "WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)).fetchall()
+                if not rows:
+                    break
+                try:
+                    cols = columns_from_rows((r[1:7] for r in rows), desc_lengths)
+                except IndexError:
+                    # codes for descriptions added since the scan started
+                    desc_lengths = description_lengths(conn)
+                    cols = columns_from_rows((r[1:7] for r in rows), desc_lengths)
+                new_points = score_columns(cols, rules)
+                changed = [(int(p), r[0]) for r, p in zip(rows, new_points) if r[7] != p]
+                with conn:
+                    conn.executemany("UPDATE retail_receipts SET points=? WHERE id=?", changed)
+                scanned += len(rows)
+                updated += len(changed)
+                last_id = rows[-1][0]
+            with conn:
+                set_rules_fingerprint(conn, rules_fingerprint(rules))
+    finally:
+        store.close()
+    return scanned, updated
+
+
+def main(argv: Iterable[str] = None):
+    parser = argparse.ArgumentParser(description="Rescore every receipt in the retail_receipts table.")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database file")
+    parser.add_argument("--batch-size", type=int, default=50000, help="receipts scored per batch")
+    parser.add_argument("--shards", type=int, default=DB_SHARDS, help="SQLite files the store is split across")
+    args = parser.parse_args(argv)
+    from .sharded_store import shard_paths
+
+    start = time.perf_counter()
+    scanned = updated = 0
+    for path in shard_paths(args.db, args.shards):
+        shard_scanned, shard_updated = rescore_db(path, args.batch_size)
+        scanned += shard_scanned
+        updated += shard_updated
+    elapsed = time.perf_counter() - start
+    logging.info("Rescored %d receipts, %d changed, in %.2fs (%.0f receipts/s)",
+                 scanned, updated, elapsed, scanned / max(elapsed, 1e-9))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main(sys.argv[1:])
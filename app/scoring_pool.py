@@ -0,0 +1,97 @@
+import asyncio
+from datetime import date
+from typing import NamedTuple, Tuple
+
+from .config import SCORING_POOL_WORKERS, SCORING_POOL_MIN_ITEMS
+from .receipt_processor import parse_receipt, generate_id, calculate_points, warm_up
+
+# Optional process pool for receipts with many items. Validating, hashing and
+# scoring one of those holds the GIL for milliseconds and stalls every other
+# request on the event loop. Workers are sent the decoded JSON body and send
+# back the id, the points and the receipt as plain tuples. Pydantic models
+# never cross the process boundary: pickling one is slow, and rebuilding one
+# on this side costs more than validating it did.
+# Parsing and scoring are separate round trips, so a resubmitted receipt is
+# recognised by its id before anyone pays for scoring it.
+
+
+class PooledItem(NamedTuple):
+    shortDescription: str
+    price: int  # cents
+
+
+class PooledReceipt(NamedTuple):
+    # read-only stand-in for a Receipt scored in a worker, with the same field names
+    retailer: str
+    purchaseDate: date
+    purchaseTime: str
+    items: Tuple[PooledItem, ...]
+    total: int  # cents
+
+
+pool = None
+min_items = SCORING_POOL_MIN_ITEMS
+
+
+def item_count(payload) -> int:
+    items = payload.get("items") if isinstance(payload, dict) else None
+    return len(items) if isinstance(items, list) else 0
+
+
+def parse_payload(payload):
+    # runs in a worker: payload -> (id, compact receipt)
+    try:
+        receipt = parse_receipt(payload)
+    except ValueError as e:
+        # pydantic's ValidationError doesn't survive pickling, send back the message
+        raise ValueError(str(e)) from None
+    items = tuple((item.shortDescription, item.price) for item in receipt.items)
+    compact = (receipt.retailer, receipt.purchaseDate, receipt.purchaseTime, items, receipt.total)
+    return str(generate_id(receipt)), compact
+
+
+def from_compact(compact) -> PooledReceipt:
+    retailer, purchase_date, purchase_time, items, total = compact
+    return PooledReceipt(retailer, purchase_date, purchase_time, tuple(map(PooledItem._make, items)), total)
+
+
+def _warm_up():
+    # imports the scoring modules in the worker and scores one receipt
+    return warm_up()
+
+
+def start_pool(workers: int = SCORING_POOL_WORKERS, threshold: int = SCORING_POOL_MIN_ITEMS):
+    global pool, min_items
+    if pool is not None or workers <= 0:
+        return pool
+    # imported here, most deployments never start the pool
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    # spawn rather than fork, the parent already runs logging and database threads
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    min_items = threshold
+    # start every worker now instead of on the first large receipt
+    for future in [pool.submit(_warm_up) for _ in range(workers)]:
+        future.result()
+    return pool
+
+
+def shutdown_pool():
+    global pool
+    if pool is not None:
+        pool.shutdown()
+        pool = None
+
+
+def should_offload(payload) -> bool:
+    return pool is not None and item_count(payload) >= min_items
+
+
+async def parse_in_pool(payload):
+    receipt_id, compact = await asyncio.get_running_loop().run_in_executor(pool, parse_payload, payload)
+    return receipt_id, from_compact(compact)
+
+
+async def score_in_pool(receipt: PooledReceipt) -> int:
+    return await asyncio.get_running_loop().run_in_executor(pool, calculate_points, receipt)
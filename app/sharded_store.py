@@ -0,0 +1,258 @@
+import os
+import sys
+import time
+import argparse
+import logging
+import itertools
+from typing import Iterable
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import DB_PATH, DB_SHARDS, DB_POOL_SIZE, DB_BUSY_TIMEOUT_MS
+from .db import ReceiptStore, SqliteReceiptStore, set_rules_fingerprint
+from .dedup import receipt_key
+from .reports import retailer_sums, daily_sums, hourly_sums, merge_sums, retailer_rows, daily_rows, hourly_rows
+
+# Receipts split across N SQLite files by id, each file a SqliteReceiptStore
+# with its own connection pool and writer. Ids are uniformly distributed
+# UUIDs (generate_id), so the first 32 bits modulo N spread them evenly.
+# Point lookups and writes go to the owning shard only; reports, exports and
+# index maintenance run on every shard in parallel and are merged.
+#
+# Files are named after DB_PATH: retail_receipt.db becomes retail_receipt.0.db
+# ... retail_receipt.<N-1>.db. With one shard DB_PATH itself is used. After
+# changing the shard count, move the rows with
+#   python -m app.sharded_store rebalance --from 4 --to 8
+
+
+def shard_paths(path: str = DB_PATH, shards: int = DB_SHARDS) -> list:
+    if shards <= 1:
+        return [path]
+    stem, ext = os.path.splitext(path)
+    return [f"{stem}.{i}{ext}" for i in range(shards)]
+
+
+def shard_of(receipt_id: str, shards: int):
+    # index of the shard that owns receipt_id, None when it isn't a UUID
+    key = receipt_key(receipt_id)
+    return None if key is None else (key >> 96) % shards
+
+
+class ShardedReceiptStore(ReceiptStore):
+
+    def __init__(self, path: str = DB_PATH, shards: int = DB_SHARDS, pool_size: int = DB_POOL_SIZE,
+                 busy_timeout_ms: int = DB_BUSY_TIMEOUT_MS):
+        self.shards = []
+        try:
+            for shard_path in shard_paths(path, shards):
+                self.shards.append(SqliteReceiptStore(shard_path, pool_size, busy_timeout_ms))
+        except BaseException:
+            self.close()
+            raise
+        # pool_size connections per shard
+        self.concurrency = pool_size * len(self.shards)
+        self._fan_out = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix="receipt-shard")
+
+    def _shard(self, receipt_id: str):
+        index = shard_of(receipt_id, len(self.shards))
+        return None if index is None else self.shards[index]
+
+    def _each(self, fn, *args) -> list:
+        # fn(shard, *args) on every shard in parallel, results in shard order
+        return list(self._fan_out.map(lambda shard: fn(shard, *args), self.shards))
+
+    def _partition(self, receipts) -> dict:
+        # shard index -> the (receipt_id, points, receipt) rows it owns
+        groups = {}
+        for row in receipts:
+            index = shard_of(row[0], len(self.shards))
+            if index is None:
+                return None
+            groups.setdefault(index, []).append(row)
+        return groups
+
+    def store_receipt(self, receipt_id: str, points: int, receipt):
+        shard = self._shard(receipt_id)
+        if shard is None:
+            logging.error("Not a receipt id: %s", receipt_id)
+            return None
+        return shard.store_receipt(receipt_id, points, receipt)
+
+    def store_receipts(self, receipts):
+        # one transaction per shard, written in parallel. A failed batch may be
+        # committed on some shards; storing it again is harmless.
+        groups = self._partition(receipts)
+        if groups is None:
+            logging.error("Batch contains an id that is not a receipt id")
+            return None
+        results = list(self._fan_out.map(lambda item: self.shards[item[0]].store_receipts(item[1]), groups.items()))
+        return True if all(results) else None
+
+    def get_receipt_points(self, receipt_id: str):
+        shard = self._shard(receipt_id)
+        return None if shard is None else shard.get_receipt_points(receipt_id)
+
+    def get_receipt(self, receipt_id: str):
+        shard = self._shard(receipt_id)
+        return None if shard is None else shard.get_receipt(receipt_id)
+
+    def iter_receipts(self, batch_size: int = 10000):
+        # every shard's receipts, each shard in id order. The next batch of
+        # every shard is read in parallel while the current ones are consumed.
+        readers = [shard.iter_receipts(batch_size) for shard in self.shards]
+        pending = {i: self._fan_out.submit(_take, reader, batch_size) for i, reader in enumerate(readers)}
+        try:
+            while pending:
+                for i in list(pending):
+                    batch = pending[i].result()
+                    if batch:
+                        pending[i] = self._fan_out.submit(_take, readers[i], batch_size)
+                    else:
+                        del pending[i]
+                    yield from batch
+        finally:
+            # a reader can't be closed while a thread is still running it
+            for future in pending.values():
+                future.result()
+            for reader in readers:
+                reader.close()
+
+    def iter_receipt_ids(self, batch_size: int = 10000):
+        for shard in self.shards:
+            yield from shard.iter_receipt_ids(batch_size)
+
+    def retailer_report(self, start=None, end=None) -> list:
+        sums = self._each(lambda shard: _query(shard, retailer_sums, start, end))
+        return retailer_rows(merge_sums(sums, 1))
+
+    def daily_report(self, start=None, end=None, retailer: str = None) -> list:
+        sums = self._each(lambda shard: _query(shard, daily_sums, start, end, retailer))
+        return daily_rows(merge_sums(sums, 2))
+
+    def hourly_report(self, start=None, end=None) -> list:
+        sums = self._each(lambda shard: _query(shard, hourly_sums, start, end))
+        return hourly_rows(merge_sums(sums, 1))
+
+    def create_secondary_indexes(self):
+        self._each(SqliteReceiptStore.create_secondary_indexes)
+
+    def drop_secondary_indexes(self):
+        self._each(SqliteReceiptStore.drop_secondary_indexes)
+
+    def warm_up(self):
+        self._each(SqliteReceiptStore.warm_up)
+
+    def rules_fingerprint(self):
+        # None unless every shard was scored with the same rules
+        fingerprints = {shard.rules_fingerprint() for shard in self.shards}
+        return fingerprints.pop() if len(fingerprints) == 1 else None
+
+    def stats(self) -> dict:
+        return {"backend": "sharded", "shards": len(self.shards)}
+
+    def close(self):
+        if getattr(self, "_fan_out", None) is not None:
+            self._fan_out.shutdown(wait=True)
+        for shard in self.shards:
+            shard.close()
+
+
+def _take(reader, count: int) -> list:
+    return list(itertools.islice(reader, count))
+
+
+def _rules_fingerprint_of(path: str):
+    store = SqliteReceiptStore(path, pool_size=1)
+    try:
+        return store.rules_fingerprint()
+    finally:
+        store.close()
+
+
+def _query(shard: SqliteReceiptStore, query, *args) -> list:
+    with shard.pool.connection() as conn:
+        return query(conn, *args)
+
+
+def open_store(path: str = DB_PATH, shards: int = DB_SHARDS, pool_size: int = DB_POOL_SIZE) -> ReceiptStore:
+    # the SQLite store at path, sharded when shards > 1
+    if shards > 1:
+        return ShardedReceiptStore(path, shards, pool_size)
+    return SqliteReceiptStore(path, pool_size)
+
+
+def rebalance(path: str = DB_PATH, old_shards: int = DB_SHARDS, new_shards: int = DB_SHARDS,
+              batch_size: int = 10000) -> dict:
+    # Move every receipt to the file that owns it under new_shards, then
+    # remove files that are no longer used. Rows are copied to their new
+    # shard before they are deleted from the old one, so an interrupted run
+    # loses nothing and can simply be run again. Stop the servers first.
+    # Returns {"scanned", "moved", "seconds"}.
+    start = time.perf_counter()
+    old_paths = shard_paths(path, old_shards)
+    new_paths = shard_paths(path, new_shards)
+    # the moved points keep the rules they were scored with, recorded in new
+    # files before any row is copied in case the run is interrupted
+    existing = [p for p in dict.fromkeys(old_paths + new_paths) if os.path.exists(p)]
+    fingerprints = {_rules_fingerprint_of(p) for p in existing}
+    fingerprint = fingerprints.pop() if len(fingerprints) == 1 else None
+    # two connections each, a store is read and written at the same time
+    targets = [SqliteReceiptStore(p, pool_size=2) for p in new_paths]
+    scanned = moved = 0
+    try:
+        if existing:
+            for target in targets:
+                with target.pool.connection() as conn, conn:
+                    set_rules_fingerprint(conn, fingerprint)
+        for old_path in old_paths:
+            source = targets[new_paths.index(old_path)] if old_path in new_paths else SqliteReceiptStore(old_path, 2)
+            try:
+                # closed before the store, it holds one of its connections
+                with closing(source.iter_receipts(batch_size)) as reader:
+                    while True:
+                        batch = _take(reader, batch_size)
+                        if not batch:
+                            break
+                        groups = {}
+                        for row in batch:
+                            target = targets[shard_of(row["id"], len(targets))]
+                            if target is not source:
+                                groups.setdefault(id(target), (target, []))[1].append(row)
+                        for target, rows in groups.values():
+                            target.store_decoded(rows)
+                            source.delete_receipts([row["id"] for row in rows])
+                            moved += len(rows)
+                        scanned += len(batch)
+            finally:
+                if source not in targets:
+                    source.close()
+            if old_path not in new_paths:
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(old_path + suffix):
+                        os.remove(old_path + suffix)
+            logging.info("Rebalanced %s (%d receipts scanned, %d moved so far)", old_path, scanned, moved)
+    finally:
+        for target in targets:
+            target.close()
+    return {"scanned": scanned, "moved": moved, "seconds": time.perf_counter() - start}
+
+
+def main(argv: Iterable[str] = None):
+    parser = argparse.ArgumentParser(description="Manage the sharded SQLite receipt store.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebalance_parser = commands.add_parser("rebalance", help="move receipts after the shard count changes")
+    rebalance_parser.add_argument("--db", default=DB_PATH, help="DB_PATH the shard files are named after")
+    rebalance_parser.add_argument("--from", dest="old_shards", type=int, required=True, help="current shard count")
+    rebalance_parser.add_argument("--to", dest="new_shards", type=int, required=True, help="new shard count")
+    rebalance_parser.add_argument("--batch-size", type=int, default=10000, help="receipts read per batch")
+
+    args = parser.parse_args(argv)
+
+    result = rebalance(args.db, args.old_shards, args.new_shards, args.batch_size)
+    logging.info("Moved %d of %d receipts in %.2fs", result["moved"], result["scanned"], result["seconds"])
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main(sys.argv[1:])
@@ -0,0 +1,133 @@
+import time
+import queue
+import logging
+import threading
+
+from .config import (WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_FLUSH_MS, WRITE_BEHIND_MAX_PENDING,
+                     WRITE_BEHIND_PUT_TIMEOUT_SECONDS)
+from .metrics import Counter, registry, sample_lines
+
+# Scored receipts wait in a bounded queue and a background thread writes them
+# with store_receipts, one transaction (and one fsync) per group instead of
+# per receipt. A group is flushed once it has batch_size receipts or the
+# oldest one has waited flush_ms. Receipts not yet written are served from
+# the pending map so reads stay consistent. A group that still fails after
+# the retries is handed to on_dropped, so the caller can forget those ids
+# and a resubmission is written instead of answered as a duplicate.
+
+_STOP = object()
+
+group_commits = registry.register(Counter(
+    "write_behind_group_commits_total", "Group commits written by the write-behind thread."))
+rejected_receipts = registry.register(Counter(
+    "write_behind_rejected_total", "Receipts refused because the write-behind queue was full."))
+dropped_receipts = registry.register(Counter(
+    "write_behind_dropped_total", "Accepted receipts that could not be written after every retry."))
+
+
+class WriteBehindQueue:
+
+    def __init__(self, store, batch_size: int = WRITE_BEHIND_BATCH_SIZE, flush_ms: float = WRITE_BEHIND_FLUSH_MS,
+                 max_pending: int = WRITE_BEHIND_MAX_PENDING, put_timeout: float = WRITE_BEHIND_PUT_TIMEOUT_SECONDS,
+                 retries: int = 3, on_dropped=None):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_seconds = flush_ms / 1000
+        self.put_timeout = put_timeout
+        self.retries = retries
+        # on_dropped(receipt_ids) for a group that could not be written
+        self.on_dropped = on_dropped
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="receipt-write-behind", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _add_pending(self, receipt_id: str, points: int):
+        with self._pending_lock:
+            self._pending[receipt_id] = points
+
+    def submit(self, receipt_id: str, points: int, receipt, block: bool = True):
+        # True once queued. None when the queue stays full (backpressure) so the
+        # caller can turn the receipt away instead of buffering without bound.
+        self._add_pending(receipt_id, points)
+        try:
+            self._queue.put((receipt_id, points, receipt), block=block, timeout=self.put_timeout if block else None)
+            return True
+        except queue.Full:
+            with self._pending_lock:
+                self._pending.pop(receipt_id, None)
+            if block:
+                rejected_receipts.inc()
+                logging.warning("Write-behind queue full, rejecting receipt %s", receipt_id)
+            return None
+
+    def get_pending(self, receipt_id: str):
+        return self._pending.get(receipt_id)
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def _next_group(self):
+        # block for the first receipt, then gather until the group is full or due
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        group = [first]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(group) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return group, True
+            group.append(item)
+        return group, False
+
+    def _write(self, group):
+        for attempt in range(self.retries):
+            if self.store.store_receipts(group):
+                group_commits.inc()
+                break
+            time.sleep(0.05 * (attempt + 1))
+        else:
+            logging.error("Write-behind dropped %s receipts after %s failed group commits", len(group), self.retries)
+            dropped_receipts.inc(amount=len(group))
+            if self.on_dropped is not None:
+                # before they leave the pending map, so no read sees them as stored
+                self.on_dropped([receipt_id for receipt_id, _, _ in group])
+        with self._pending_lock:
+            for receipt_id, _, _ in group:
+                self._pending.pop(receipt_id, None)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            group, stopping = self._next_group()
+            if group:
+                self._write(group)
+        # drain what is still queued behind the stop marker
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        for start in range(0, len(leftover), self.batch_size):
+            self._write(leftover[start:start + self.batch_size])
+
+    def stop(self):
+        # flush everything queued so far and wait for the writer to finish
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def metric_lines(self):
+        return sample_lines("write_behind_pending", "Receipts queued and not yet committed.", len(self._pending))
@@ -0,0 +1,90 @@
+import sys
+import logging
+import argparse
+
+from .generate import generate_receipts
+from .report import save_results, compare
+
+# python -m benchmarks run --output results.json
+# python -m benchmarks compare baseline.json results.json
+
+
+def run(args):
+    payloads = generate_receipts(args.receipts, seed=args.seed, max_items=args.max_items)
+    results = {}
+    if args.suite == "storage":
+        from .storage import run_storage
+        results.update({f"storage.{name}": r for name, r in run_storage(payloads).items()})
+    if args.suite == "shards":
+        from .shards import run_shards
+        results.update({f"sqlite.{name}": r for name, r in run_shards(payloads, args.concurrency, args.shards).items()})
+    if args.suite == "pool":
+        from .pool import mixed_payloads, run_pool
+        logging.getLogger().setLevel(logging.WARNING)
+        mixed = mixed_payloads(args.receipts, seed=args.seed, large_items=args.large_items)
+        results.update({f"mixed.{name}": r for name, r in run_pool(mixed, args.concurrency, args.pool_workers).items()})
+    if args.suite in ("micro", "all"):
+        from .micro import run_micro
+        results.update({f"micro.{name}": r for name, r in run_micro(payloads).items()})
+    if args.suite in ("http", "all"):
+        from .load import run_in_process, run_socket
+        # the app's and httpx's own INFO logs would only add noise to the timings
+        logging.getLogger().setLevel(logging.WARNING)
+        results.update({f"asgi.{name}": r for name, r in run_in_process(payloads, args.concurrency).items()})
+        results.update({f"socket.{name}": r for name, r in run_socket(payloads, args.concurrency).items()})
+
+    meta = {"receipts": args.receipts, "seed": args.seed, "max_items": args.max_items, "concurrency": args.concurrency}
+    if args.suite == "pool":
+        meta.update(large_items=args.large_items, pool_workers=args.pool_workers)
+    if args.suite == "shards":
+        meta.update(shards=args.shards)
+    save_results(results, args.output, meta)
+    for name, r in results.items():
+        if "size_bytes" in r:
+            print(f"{name:36} {r['ops_per_sec']:>10.1f} rows/s  {r['seconds']:>8.3f}s  {r['size_bytes'] / 1e6:>8.2f} MB")
+        else:
+            print(f"{name:36} {r['ops_per_sec']:>10.1f} ops/s  p50 {r['p50_us']:>10.1f}us  p99 {r['p99_us']:>10.1f}us")
+    print(f"Results written to {args.output}")
+
+
+def run_compare(args):
+    regressions = 0
+    for name, metric, old, new, change, regressed in compare(args.baseline, args.candidate, args.threshold):
+        flag = "REGRESSION" if regressed else ""
+        regressions += regressed
+        print(f"{name:36} {metric:12} {old:>12.1f} -> {new:>12.1f} {change:+8.1%} {flag}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Receipt processor benchmarks.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks and save the results as JSON")
+    run_parser.add_argument("suite", nargs="?", choices=("micro", "http", "all", "pool", "storage", "shards"),
+                            default="all",
+                            help="pool compares mixed-size traffic with and without the scoring process pool, "
+                                 "storage the database size and scan time of the legacy and compact formats, "
+                                 "shards concurrent writes into one SQLite file and into --shards files")
+    run_parser.add_argument("--receipts", type=int, default=2000)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--max-items", type=int, default=1000)
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument("--large-items", type=int, default=5000, help="items on the large receipts of the pool suite")
+    run_parser.add_argument("--pool-workers", type=int, default=2)
+    run_parser.add_argument("--shards", type=int, default=4, help="shard files for the shards suite")
+    run_parser.add_argument("--output", default="bench_results.json")
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        return run(args)
+    return run_compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
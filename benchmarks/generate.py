@@ -0,0 +1,44 @@
+import math
+import random
+from datetime import date, timedelta
+
+# Seeded generator of realistic receipt payloads, shaped like the JSON the
+# API receives (prices and totals as strings with two decimals).
+
+RETAILERS = ["Target", "Walgreens", "M&M Corner Market", "Costco", "Trader Joe's", "7-Eleven", "Whole Foods Market", "CVS"]
+
+PRODUCTS = [
+    ("Mountain Dew 12PK", 6.49), ("Emils Cheese Pizza", 12.25), ("Knorr Creamy Chicken", 1.26),
+    ("Doritos Nacho Cheese", 3.35), ("Klarbrunn 12-PK 12 FL OZ", 12.00), ("Gatorade", 2.25),
+    ("Pepsi - 12-oz", 1.25), ("Dasani", 1.40), ("Bananas", 0.79), ("Organic Whole Milk 1gal", 5.49),
+    ("Paper Towels 6 Roll", 11.99), ("Greek Yogurt", 1.19), ("Sourdough Loaf", 4.50), ("Eggs Large Dozen", 3.99),
+]
+
+
+def item_count(rng: random.Random, min_items: int = 1, max_items: int = 1000) -> int:
+    # log-uniform: most receipts are small, with a long tail of very large ones
+    return min(max_items, int(math.exp(rng.uniform(math.log(min_items), math.log(max_items + 1)))))
+
+
+def generate_receipt(rng: random.Random, min_items: int = 1, max_items: int = 1000) -> dict:
+    items = []
+    cents = 0
+    for _ in range(item_count(rng, min_items, max_items)):
+        description, price = rng.choice(PRODUCTS)
+        # jitter the price a little so totals vary
+        price_cents = max(1, int(round(price * 100)) + rng.choice([0, 0, 0, 1, -1, 25]))
+        cents += price_cents
+        items.append({"shortDescription": description, "price": f"{price_cents // 100}.{price_cents % 100:02d}"})
+    day = date(2022, 1, 1) + timedelta(days=rng.randint(0, 729))
+    return {
+        "retailer": rng.choice(RETAILERS),
+        "purchaseDate": day.isoformat(),
+        "purchaseTime": f"{rng.randint(7, 22):02d}:{rng.randint(0, 59):02d}",
+        "items": items,
+        "total": f"{cents // 100}.{cents % 100:02d}",
+    }
+
+
+def generate_receipts(n: int, seed: int = 0, min_items: int = 1, max_items: int = 1000):
+    rng = random.Random(seed)
+    return [generate_receipt(rng, min_items, max_items) for _ in range(n)]
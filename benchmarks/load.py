@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import tempfile
+import subprocess
+from contextlib import contextmanager
+
+import httpx
+
+from app import db
+from app.main import app
+
+from .report import summarize
+
+# Drives the real FastAPI app, either in-process through the ASGI interface or
+# over a local socket to a uvicorn server process, posting every receipt and
+# then polling its points.
+
+
+async def _drive(client: httpx.AsyncClient, payloads, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    perf_counter = time.perf_counter
+
+    async def timed(method, url, **kwargs):
+        async with semaphore:
+            start = perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latency = perf_counter() - start
+        response.raise_for_status()
+        return latency, response
+
+    start = perf_counter()
+    posted = await asyncio.gather(*(timed("POST", "/receipts/process", json=p) for p in payloads))
+    post_elapsed = perf_counter() - start
+
+    ids = [response.json()["id"] for _, response in posted]
+    start = perf_counter()
+    polled = await asyncio.gather(*(timed("GET", f"/receipts/{receipt_id}/points") for receipt_id in ids))
+    get_elapsed = perf_counter() - start
+
+    return {
+        "post": summarize([latency for latency, _ in posted], post_elapsed),
+        "get": summarize([latency for latency, _ in polled], get_elapsed),
+    }
+
+
+def _with_fresh_store(run):
+    # every run writes into its own throwaway database
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db.close_db()
+        db.init_db(db.SqliteReceiptStore(os.path.join(tmpdir, "bench.db")))
+        try:
+            return run()
+        finally:
+            db.close_db()
+
+
+def run_in_process(payloads, concurrency: int = 8) -> dict:
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await _drive(client, payloads, concurrency)
+
+    return _with_fresh_store(lambda: asyncio.run(run()))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def uvicorn_server(env: dict = None):
+    # uvicorn runs in its own process so the client doesn't compete with it for the GIL
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = dict(os.environ, DB_PATH=os.path.join(tmpdir, "bench.db"), LOG_LEVEL="WARNING", **(env or {}))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            env=env)
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    if httpx.get(f"{base_url}/ready").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn failed to start")
+                time.sleep(0.05)
+            yield base_url
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def run_socket(payloads, concurrency: int = 8, env: dict = None) -> dict:
+    with uvicorn_server(env) as base_url:
+        async def run():
+            limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+            async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+                return await _drive(client, payloads, concurrency)
+
+        return asyncio.run(run())
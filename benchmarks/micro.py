@@ -0,0 +1,75 @@
+import os
+import json
+import time
+import uuid
+import tempfile
+
+from app import db
+from app.memory_store import InMemoryReceiptStore
+from app.metrics import Histogram
+from app.receipt_processor import parse_receipt, generate_id, calculate_points, from_json_to_receipt
+
+from .report import summarize
+
+
+def _time_each(fn, args_list):
+    latencies = []
+    perf_counter = time.perf_counter
+    for args in args_list:
+        start = perf_counter()
+        fn(*args)
+        latencies.append(perf_counter() - start)
+    return latencies
+
+
+def _ingest_reparse(payload):
+    # the old ingest path: serialize the payload for the id, parse it again to score
+    payload_json = json.dumps(payload)
+    uuid.uuid3(uuid.NAMESPACE_DNS, payload_json)
+    calculate_points(from_json_to_receipt(payload_json))
+
+
+def _ingest_parse_once(payload):
+    # validate once, derive the id and points from the model
+    receipt = parse_receipt(payload)
+    generate_id(receipt)
+    calculate_points(receipt)
+
+
+# same timer as metrics.stage, in a histogram that isn't served on /metrics
+_stage_latency = Histogram("benchmark_stage_seconds", "Stage timer overhead.", ("stage",))
+
+
+def _timed_stage():
+    with _stage_latency.time("benchmark"):
+        pass
+
+
+def run_micro(payloads) -> dict:
+    # Time parse_receipt, calculate_points, generate_id and store_receipt on their own
+    receipts = [parse_receipt(p) for p in payloads]
+    ids = [str(generate_id(r)) for r in receipts]
+    rows = [(receipt_id, calculate_points(r), r) for receipt_id, r in zip(ids, receipts)]
+
+    results = {
+        "parse_receipt": summarize(_time_each(parse_receipt, [(p,) for p in payloads])),
+        "calculate_points": summarize(_time_each(calculate_points, [(r,) for r in receipts])),
+        "generate_id": summarize(_time_each(generate_id, [(r,) for r in receipts])),
+        "ingest.reparse": summarize(_time_each(_ingest_reparse, [(p,) for p in payloads])),
+        "ingest.parse_once": summarize(_time_each(_ingest_parse_once, [(p,) for p in payloads])),
+        # overhead every request pays per timed stage
+        "stage_timer": summarize(_time_each(_timed_stage, [()] * len(payloads))),
+    }
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = db.SqliteReceiptStore(os.path.join(tmpdir, "bench.db"))
+        try:
+            results["store_receipt.sqlite"] = summarize(_time_each(store.store_receipt, rows))
+            results["get_receipt_points.sqlite"] = summarize(_time_each(store.get_receipt_points, [(i,) for i in ids]))
+        finally:
+            store.close()
+
+    store = InMemoryReceiptStore()
+    results["store_receipt.memory"] = summarize(_time_each(store.store_receipt, rows))
+    results["get_receipt_points.memory"] = summarize(_time_each(store.get_receipt_points, [(i,) for i in ids]))
+    return results
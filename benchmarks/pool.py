@@ -0,0 +1,58 @@
+import time
+import random
+import asyncio
+
+import httpx
+
+from .generate import generate_receipt
+from .load import uvicorn_server
+from .report import summarize
+
+# Mixed-size traffic against a uvicorn server with and without the scoring
+# process pool. Most receipts are small and a few are very large; what the
+# pool should buy is a lower p99 for the small ones, which otherwise queue
+# behind a large receipt holding the event loop.
+
+
+def mixed_payloads(n: int, seed: int = 0, large_every: int = 20, large_items: int = 5000):
+    rng = random.Random(seed)
+    return [generate_receipt(rng, large_items, large_items) if i % large_every == 0 else generate_receipt(rng, 1, 20)
+            for i in range(n)]
+
+
+async def _drive_mixed(client: httpx.AsyncClient, payloads, concurrency: int, min_items: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    perf_counter = time.perf_counter
+
+    async def timed(payload):
+        async with semaphore:
+            start = perf_counter()
+            response = await client.post("/receipts/process", json=payload)
+            latency = perf_counter() - start
+        response.raise_for_status()
+        return len(payload["items"]) >= min_items, latency
+
+    start = perf_counter()
+    timings = await asyncio.gather(*(timed(p) for p in payloads))
+    elapsed = perf_counter() - start
+
+    return {
+        "all": summarize([latency for _, latency in timings], elapsed),
+        "small": summarize([latency for large, latency in timings if not large]),
+        "large": summarize([latency for large, latency in timings if large]),
+    }
+
+
+def run_pool(payloads, concurrency: int = 8, workers: int = 2, min_items: int = 1000) -> dict:
+    results = {}
+    for name, pool_workers in (("inline", 0), ("pool", workers)):
+        env = {"SCORING_POOL_WORKERS": str(pool_workers), "SCORING_POOL_MIN_ITEMS": str(min_items),
+               "DEDUP_ENABLED": "false"}
+        with uvicorn_server(env) as base_url:
+            async def run():
+                limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+                async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+                    return await _drive_mixed(client, payloads, concurrency, min_items)
+
+            results.update({f"{name}.{kind}": r for kind, r in asyncio.run(run()).items()})
+    return results
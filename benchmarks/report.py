@@ -0,0 +1,67 @@
+import json
+import math
+import time
+import platform
+import subprocess
+
+
+def percentile(sorted_values, q: float):
+    # nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies_s, elapsed_s: float = None) -> dict:
+    # latencies in seconds -> throughput and percentiles in microseconds
+    values = sorted(latencies_s)
+    elapsed_s = sum(values) if elapsed_s is None else elapsed_s
+    return {
+        "count": len(values),
+        "ops_per_sec": round(len(values) / elapsed_s, 1) if elapsed_s > 0 else 0.0,
+        "mean_us": round(sum(values) / len(values) * 1e6, 2) if values else 0.0,
+        "p50_us": round(percentile(values, 50) * 1e6, 2),
+        "p99_us": round(percentile(values, 99) * 1e6, 2),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(results: dict, path: str, meta: dict = None):
+    document = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "meta": meta or {},
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2)
+    return document
+
+
+def compare(baseline_path: str, candidate_path: str, threshold: float = 0.10):
+    # rows of (benchmark, metric, baseline, candidate, change), flagging regressions past threshold
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    with open(candidate_path) as f:
+        candidate = json.load(f)["results"]
+
+    rows = []
+    for name in sorted(set(baseline) & set(candidate)):
+        for metric in ("ops_per_sec", "p50_us", "p99_us"):
+            old, new = baseline[name].get(metric), candidate[name].get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            # throughput regresses when it drops, latency when it grows
+            regressed = change < -threshold if metric == "ops_per_sec" else change > threshold
+            rows.append((name, metric, old, new, change, regressed))
+    return rows
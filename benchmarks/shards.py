@@ -0,0 +1,38 @@
+import os
+import time
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from app.receipt_processor import parse_receipt, generate_id, calculate_points
+from app.sharded_store import open_store
+
+from .report import summarize
+
+# Concurrent single receipt writes into one SQLite file and into N shard
+# files. Every writer thread gets its own connection, so with one file they
+# queue on its write lock; with shards only writers to the same file do.
+
+
+def _timed_store(store, row) -> float:
+    start = time.perf_counter()
+    if not store.store_receipt(*row):
+        raise RuntimeError("store_receipt failed")
+    return time.perf_counter() - start
+
+
+def run_shards(payloads, concurrency: int, shards: int) -> dict:
+    receipts = [parse_receipt(p) for p in payloads]
+    rows = [(str(generate_id(r)), calculate_points(r), r) for r in receipts]
+    results = {}
+    for count in sorted({1, shards}):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = open_store(os.path.join(tmpdir, "bench.db"), count, pool_size=concurrency)
+            try:
+                with ThreadPoolExecutor(max_workers=concurrency) as writers:
+                    start = time.perf_counter()
+                    latencies = list(writers.map(lambda row: _timed_store(store, row), rows))
+                    elapsed = time.perf_counter() - start
+            finally:
+                store.close()
+        results[f"store_receipt.shards_{count}"] = summarize(latencies, elapsed)
+    return results
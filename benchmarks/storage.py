@@ -0,0 +1,82 @@
+import os
+import json
+import time
+import sqlite3
+import tempfile
+
+from app.codec import unpack_items
+from app.receipt_processor import parse_receipt, generate_id, calculate_points
+from app.rescore import rescore_db
+from app.migrate import migrate_db
+
+# Database size and full-scan time for the same receipts in the legacy
+# layout (JSON items, REAL total, ISO date/time text) and, after migrating
+# that database in place, in the compact one.
+
+LEGACY_SCHEMA = '''
+    CREATE TABLE retail_receipts (
+        id TEXT PRIMARY KEY,
+        retailer TEXT,
+        purchase_date DATE,
+        purchase_time TIME,
+        items TEXT,
+        total DOUBLE,
+        points INTEGER
+    )
+'''
+
+
+def write_legacy_db(path: str, receipts):
+    # a database as written before the compact format
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(LEGACY_SCHEMA)
+        conn.executemany("INSERT INTO retail_receipts VALUES (?, ?, ?, ?, ?, ?, ?)", [
+            (str(generate_id(r)), r.retailer, r.purchaseDate.isoformat(), r.purchaseTime,
+             json.dumps([item.model_dump() for item in r.items]), r.total / 100, calculate_points(r))
+            for r in receipts])
+    conn.close()
+
+
+def _size(path: str) -> int:
+    conn = sqlite3.connect(path)
+    conn.execute("VACUUM")
+    conn.close()
+    return os.path.getsize(path)
+
+
+def _scan(path: str, decode_items) -> float:
+    # read every row and decode its items, as a rescoring or analytics pass would
+    conn = sqlite3.connect(path)
+    try:
+        start = time.perf_counter()
+        for row in conn.execute("SELECT * FROM retail_receipts"):
+            decode_items(row[4])
+        return time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def _result(count: int, seconds: float, size: int) -> dict:
+    return {"count": count, "seconds": round(seconds, 4), "ops_per_sec": round(count / seconds, 1), "size_bytes": size}
+
+
+def run_storage(payloads) -> dict:
+    receipts = [parse_receipt(p) for p in payloads]
+    count = len(receipts)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "storage.db")
+        write_legacy_db(path, receipts)
+        results = {"legacy.scan": _result(count, _scan(path, json.loads), _size(path))}
+
+        start = time.perf_counter()
+        migrate_db(path)
+        migrate_seconds = time.perf_counter() - start
+        size = _size(path)
+        results["compact.migrate"] = _result(count, migrate_seconds, size)
+        results["compact.scan"] = _result(count, _scan(path, unpack_items), size)
+
+        start = time.perf_counter()
+        rescore_db(path)
+        results["compact.rescore"] = _result(count, time.perf_counter() - start, size)
+    return results
@@ -0,0 +1,83 @@
+import random
+from datetime import date, timedelta
+
+from app.models import Receipt, Item
+from app.receipt_processor import parse_receipt, generate_id, calculate_points
+
+# Receipt factories shared by the test modules
+
+WORDS = ["Mountain", "Dew", "12PK", "Emils", "Cheese", "Pizza", "Knorr", "Creamy", "Chicken", "Gatorade", " ", "-", "&"]
+
+
+def receipt_payload(n):
+    # a small receipt whose retailer, and so id, differs for every n
+    return {
+        "retailer": f"Store {n}",
+        "purchaseDate": "2022-01-01",
+        "purchaseTime": "13:01",
+        "items": [{"shortDescription": "Mountain Dew 12PK", "price": "6.49"}],
+        "total": "6.49"
+    }
+
+
+def make_receipt(n):
+    return parse_receipt(receipt_payload(n))
+
+
+def make_rows(n, offset=0):
+    # (receipt_id, points, receipt) rows as the stores take them
+    rows = []
+    for i in range(offset, offset + n):
+        receipt = make_receipt(i)
+        rows.append((str(generate_id(receipt)), calculate_points(receipt), receipt))
+    return rows
+
+
+def random_price(rng):
+    # mix of round, quarter and arbitrary cent amounts, including float trouble spots like 15.00
+    return rng.choice([
+        rng.randint(0, 100) * 1.0,
+        rng.randint(0, 400) * 0.25,
+        round(rng.uniform(0, 500), 2),
+        round(rng.randint(0, 10000) * 0.05, 2),
+    ])
+
+
+def random_receipt(rng):
+    items = [Item(shortDescription=" ".join(rng.choices(WORDS, k=rng.randint(1, 4))), price=random_price(rng))
+             for _ in range(rng.randint(0, 12))]
+    return Receipt(
+        retailer="".join(rng.choices(WORDS, k=rng.randint(1, 3))),
+        purchaseDate=date(2022, 1, 1) + timedelta(days=rng.randint(0, 365)),
+        purchaseTime=f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}",
+        items=items,
+        total=random_price(rng))
+
+
+def receipt_rows(n, seed=7):
+    # n random receipts as (receipt_id, points, receipt) rows
+    rng = random.Random(seed)
+    receipts = [random_receipt(rng) for _ in range(n)]
+    return [(str(generate_id(r)), calculate_points(r), r) for r in receipts]
+
+
+def expected_retailers(rows, start=date.min, end=date.max):
+    # the retailer report computed straight from the receipts
+    sums = {}
+    for _, points, receipt in rows:
+        if start <= receipt.purchaseDate <= end:
+            totals = sums.setdefault(receipt.retailer, [0, 0, 0])
+            totals[0] += 1
+            totals[1] += points
+            totals[2] += receipt.total
+    return [{"retailer": retailer, "receipts": receipts, "points": points, "total": cents / 100}
+            for retailer, (receipts, points, cents) in sorted(sums.items())]
+
+
+def expected_hours(rows):
+    sums = {}
+    for _, points, receipt in rows:
+        totals = sums.setdefault(int(receipt.purchaseTime[:2]), [0, 0])
+        totals[0] += 1
+        totals[1] += points
+    return [{"hour": hour, "receipts": receipts, "points": points} for hour, (receipts, points) in sorted(sums.items())]
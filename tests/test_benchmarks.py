@@ -0,0 +1,67 @@
+import os
+import json
+import tempfile
+import unittest
+
+from app.receipt_processor import parse_receipt
+from benchmarks.generate import generate_receipts
+from benchmarks.report import percentile, summarize, save_results, compare
+from benchmarks.micro import run_micro
+from benchmarks.load import run_in_process
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_generate_receipts_is_seeded(self):
+        self.assertEqual(generate_receipts(20, seed=3), generate_receipts(20, seed=3))
+        self.assertNotEqual(generate_receipts(20, seed=3), generate_receipts(20, seed=4))
+
+    def test_generated_receipts_are_valid(self):
+        payloads = generate_receipts(300, seed=1)
+        counts = [len(p["items"]) for p in payloads]
+
+        self.assertGreaterEqual(min(counts), 1)
+        self.assertLessEqual(max(counts), 1000)
+        self.assertGreater(max(counts), 100)
+        for payload in payloads[:50]:
+            receipt = parse_receipt(payload)
+            self.assertEqual(receipt.total, sum(item.price for item in receipt.items))
+
+    def test_summarize(self):
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2)
+        self.assertEqual(percentile(list(range(1, 101)), 99), 99)
+
+        summary = summarize([0.001] * 99 + [0.1], elapsed_s=1.0)
+        self.assertEqual(summary["count"], 100)
+        self.assertEqual(summary["ops_per_sec"], 100.0)
+        self.assertEqual(summary["p50_us"], 1000.0)
+        self.assertEqual(summary["p99_us"], 1000.0)
+
+    def test_compare_flags_regressions(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            baseline = os.path.join(tmpdir, "baseline.json")
+            candidate = os.path.join(tmpdir, "candidate.json")
+            save_results({"post": {"ops_per_sec": 1000.0, "p50_us": 100.0, "p99_us": 500.0}}, baseline)
+            save_results({"post": {"ops_per_sec": 800.0, "p50_us": 105.0, "p99_us": 400.0}}, candidate)
+
+            with open(candidate) as f:
+                self.assertIn("commit", json.load(f))
+            rows = {metric: regressed for _, metric, _, _, _, regressed in compare(baseline, candidate)}
+
+        self.assertEqual(rows, {"ops_per_sec": True, "p50_us": False, "p99_us": False})
+
+    def test_run_micro_and_in_process(self):
+        payloads = generate_receipts(10, seed=2, max_items=20)
+
+        micro = run_micro(payloads)
+        self.assertEqual(micro["calculate_points"]["count"], 10)
+        self.assertIn("store_receipt.sqlite", micro)
+        self.assertEqual(micro["ingest.parse_once"]["count"], 10)
+
+        http = run_in_process(payloads, concurrency=4)
+        self.assertEqual(http["post"]["count"], 10)
+        self.assertEqual(http["get"]["count"], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import json
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app import db
+from app.bulk import import_file, export_file, checkpoint_path, read_checkpoint, main
+from app.receipt_processor import parse_receipt, generate_id, calculate_points
+from tests.helpers import receipt_payload
+
+
+def stored_points(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return dict(conn.execute("SELECT id, points FROM retail_receipts").fetchall())
+
+
+class TestBulk(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "bulk.db")
+        self.file = os.path.join(self.tmpdir.name, "receipts.jsonl")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_file(self, lines):
+        with open(self.file, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def expected(self, n):
+        receipts = [parse_receipt(receipt_payload(i)) for i in range(n)]
+        return {str(generate_id(r)): calculate_points(r) for r in receipts}
+
+    def test_import_scores_and_stores_every_line(self):
+        self.write_file([json.dumps(receipt_payload(i)) for i in range(25)])
+
+        result = import_file(self.file, self.db_path, chunk_size=10)
+
+        self.assertEqual(result["rows"], 25)
+        self.assertEqual(result["invalid"], 0)
+        self.assertEqual(stored_points(self.db_path), self.expected(25))
+        self.assertFalse(os.path.exists(checkpoint_path(self.file)))
+
+    def test_invalid_and_blank_lines_are_skipped(self):
+        self.write_file([json.dumps(receipt_payload(0)), "", "not json", json.dumps({"retailer": "x"}), json.dumps(receipt_payload(1))])
+
+        result = import_file(self.file, self.db_path, chunk_size=2)
+
+        self.assertEqual(result["rows"], 2)
+        self.assertEqual(result["invalid"], 2)
+        self.assertEqual(stored_points(self.db_path), self.expected(2))
+
+    def test_resumes_from_checkpoint_after_a_failure(self):
+        self.write_file([json.dumps(receipt_payload(i)) for i in range(30)])
+        original = db.SqliteReceiptStore.store_receipts
+        calls = []
+
+        def fail_second_chunk(store, rows):
+            calls.append(len(rows))
+            return None if len(calls) == 2 else original(store, rows)
+
+        with patch.object(db.SqliteReceiptStore, "store_receipts", fail_second_chunk):
+            with self.assertRaises(RuntimeError):
+                import_file(self.file, self.db_path, chunk_size=10)
+
+        checkpoint = read_checkpoint(self.file)
+        self.assertEqual(checkpoint["rows"], 10)
+        self.assertEqual(len(stored_points(self.db_path)), 10)
+
+        result = import_file(self.file, self.db_path, chunk_size=10)
+
+        self.assertEqual(result["rows"], 30)
+        self.assertEqual(result["loaded"], 20)
+        self.assertEqual(stored_points(self.db_path), self.expected(30))
+
+    def test_restart_ignores_checkpoint(self):
+        self.write_file([json.dumps(receipt_payload(i)) for i in range(5)])
+        with open(checkpoint_path(self.file), "w") as f:
+            json.dump({"offset": os.path.getsize(self.file), "rows": 5, "invalid": 0}, f)
+
+        main(["import", self.file, "--db", self.db_path, "--restart"])
+
+        self.assertEqual(stored_points(self.db_path), self.expected(5))
+
+    def test_secondary_indexes_are_rebuilt_after_load(self):
+        self.write_file([json.dumps(receipt_payload(i)) for i in range(5)])
+        indexes = (("idx_test_retailer", "CREATE INDEX IF NOT EXISTS idx_test_retailer ON retail_receipts (retailer)"),)
+
+        with patch.object(db, "SECONDARY_INDEXES", indexes):
+            import_file(self.file, self.db_path)
+
+        with sqlite3.connect(self.db_path) as conn:
+            names = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")]
+        self.assertIn("idx_test_retailer", names)
+
+    def test_export_round_trips_through_import(self):
+        self.write_file([json.dumps(receipt_payload(i)) for i in range(12)])
+        import_file(self.file, self.db_path)
+        exported = os.path.join(self.tmpdir.name, "export.jsonl")
+
+        main(["export", exported, "--db", self.db_path, "--batch-size", "5"])
+
+        with open(exported) as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual({r["id"]: r["points"] for r in rows}, self.expected(12))
+
+        # ids are derived from the receipt itself, so reimporting the export changes nothing
+        other_db = os.path.join(self.tmpdir.name, "other.db")
+        import_file(exported, other_db)
+        self.assertEqual(stored_points(other_db), self.expected(12))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import time
+import unittest
+from unittest.mock import patch
+
+from app.cache import PointsCache, MISS
+
+
+class TestPointsCache(unittest.TestCase):
+
+    def test_hit_and_miss(self):
+        cache = PointsCache(max_entries=10)
+        self.assertIs(cache.get("a"), MISS)
+        cache.put("a", 28)
+        cache.put("zero", 0)
+
+        self.assertEqual(cache.get("a"), 28)
+        self.assertEqual(cache.get("zero"), 0)
+        self.assertEqual(cache.stats()["hits"], 2)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_size_eviction(self):
+        cache = PointsCache(max_entries=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIs(cache.get("b"), MISS)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_negative_entry_expires(self):
+        cache = PointsCache(max_entries=10, negative_ttl_seconds=5)
+        cache.put_missing("bad-id")
+
+        self.assertIsNone(cache.get("bad-id"))
+        self.assertEqual(cache.stats()["negative_hits"], 1)
+        with patch("app.cache.time.monotonic", return_value=time.monotonic() + 6):
+            self.assertIs(cache.get("bad-id"), MISS)
+
+    def test_put_replaces_negative_entry(self):
+        cache = PointsCache(max_entries=10)
+        cache.put_missing("a")
+        cache.put("a", 12)
+        # a stale lookup finishing after the write must not hide the receipt
+        cache.put_missing("a")
+
+        self.assertEqual(cache.get("a"), 12)
+        self.assertEqual(cache.stats()["negative_entries"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
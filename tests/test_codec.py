@@ -0,0 +1,174 @@
+import os
+import random
+import sqlite3
+import tempfile
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+from app import db, migrate
+from app.codec import ITEMS_HEADER, pack_items, unpack_items, encode_fields, decode_fields, ItemDictionary
+from app.money import to_cents
+from app.models import Receipt, Item
+from app.receipt_processor import generate_id, calculate_points
+from app.rescore import rescore_db
+from app.migrate import migrate_db
+from tests.helpers import random_receipt
+from benchmarks.storage import write_legacy_db
+
+
+class TestCodec(unittest.TestCase):
+
+    def test_items_round_trip(self):
+        cases = [
+            ([], []),
+            ([1, 2, 3], [6.49, 0.0, 12.25]),
+            ([70000, 5], [-1.5, 327.68]),
+            ([1], [25000000.01]),
+            # not whole cents, stored as doubles
+            ([1, 2], [1.234, 2.5]),
+            ([1], [float("inf")]),
+        ]
+        for codes, prices in cases:
+            with self.subTest(prices=prices):
+                self.assertEqual(unpack_items(pack_items(codes, prices)), (codes, prices))
+
+    def test_cents_are_packed_narrow(self):
+        self.assertEqual(len(pack_items([1, 2, 3], [6.49, 1.25, 300.0])), ITEMS_HEADER.size + 3 * 2 + 3 * 2)
+        self.assertEqual(len(pack_items([1], [1.234])), ITEMS_HEADER.size + 2 + 8)
+
+    def test_to_cents(self):
+        self.assertEqual(to_cents(6.49), 649)
+        self.assertEqual(to_cents(0.29), 29)
+        self.assertEqual(to_cents(-3.0), -300)
+        self.assertIsNone(to_cents(1.005))
+        self.assertIsNone(to_cents(float("nan")))
+
+    def test_fields_round_trip(self):
+        cases = [
+            (date(2022, 1, 1), "13:01", 35.35),
+            (date(1999, 12, 31), "00:00", 0.0),
+            (date(2022, 3, 20), "2:33pm", 9.0),
+            (date(2022, 3, 20), "1301", 10.125),
+        ]
+        for fields in cases:
+            with self.subTest(fields=fields):
+                encoded = encode_fields(*fields)
+                self.assertEqual(decode_fields(*encoded), fields)
+        self.assertEqual(encode_fields(date(2022, 1, 1), "13:01", 35.35), (20220101, 1301, 3535, None))
+
+    def test_dictionary_is_per_retailer_and_ignores_rolled_back_codes(self):
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE item_descriptions (code INTEGER PRIMARY KEY, retailer TEXT NOT NULL, "
+                     "description TEXT NOT NULL, UNIQUE (retailer, description))")
+        dictionary = ItemDictionary()
+
+        pending = {}
+        with conn:
+            codes = dictionary.encode(conn, "Target", ["Gatorade", "Milk", "Gatorade"], pending)
+            other = dictionary.encode(conn, "Costco", ["Gatorade"], pending)
+        dictionary.learn(pending)
+        self.assertEqual(codes[0], codes[2])
+        self.assertNotIn(other[0], codes)
+        self.assertEqual(dictionary.decode(conn, codes + other), ["Gatorade", "Milk", "Gatorade", "Gatorade"])
+
+        pending = {}
+        conn.execute("BEGIN")
+        dictionary.encode(conn, "Target", ["Bread"], pending)
+        conn.rollback()
+        self.assertEqual(len(dictionary), 3)
+        self.assertEqual(dictionary.encode(conn, "Target", ["Milk"], {}), [codes[1]])
+
+
+class TestCompactStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "receipts.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_receipts_round_trip_exactly(self):
+        rng = random.Random(11)
+        receipts = [random_receipt(rng) for _ in range(300)]
+        receipts.append(Receipt(retailer="Odd", purchaseDate=date(2022, 2, 3), purchaseTime="1301",
+                                items=[Item(shortDescription=" Pepsi ", price="1.05")], total="1e3"))
+        store = db.SqliteReceiptStore(self.path, pool_size=1)
+        rows = [(str(generate_id(r)), calculate_points(r), r) for r in receipts]
+        store.store_receipts(rows[:150])
+        for row in rows[150:]:
+            store.store_receipt(*row)
+        store.close()
+
+        # a fresh store has to read every description back from the table
+        store = db.SqliteReceiptStore(self.path, pool_size=1)
+        for receipt_id, points, receipt in rows:
+            stored = store.get_receipt(receipt_id)
+            self.assertEqual(stored, receipt)
+            self.assertEqual(str(generate_id(stored)), receipt_id)
+        self.assertEqual(rescore_db(self.path, batch_size=64), (len(rows), 0))
+        store.close()
+
+    def test_migrates_legacy_rows(self):
+        rng = random.Random(12)
+        receipts = [random_receipt(rng) for _ in range(120)]
+        write_legacy_db(self.path, receipts)
+
+        # the server never migrates on its own
+        with self.assertRaises(ValueError):
+            db.SqliteReceiptStore(self.path, pool_size=1)
+        self.assertEqual(migrate_db(self.path, batch_size=50), len(receipts))
+        self.assertEqual(migrate_db(self.path), 0)
+        store = db.SqliteReceiptStore(self.path, pool_size=2)
+
+        for receipt in receipts:
+            receipt_id = str(generate_id(receipt))
+            self.assertEqual(store.get_receipt_points(receipt_id), (calculate_points(receipt),))
+            self.assertEqual(store.get_receipt(receipt_id), receipt)
+        self.assertEqual(sum(r["receipts"] for r in store.retailer_report()), len(receipts))
+        store.close()
+        with sqlite3.connect(self.path) as conn:
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], db.SCHEMA_VERSION)
+            tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        conn.close()
+        self.assertEqual(tables, {"retail_receipts", "item_descriptions", "scoring_rules", "retailer_daily",
+                                  "receipts_hourly"})
+
+    def test_interrupted_migration_resumes(self):
+        rng = random.Random(13)
+        receipts = [random_receipt(rng) for _ in range(100)]
+        write_legacy_db(self.path, receipts)
+        original = migrate._migrate_batch
+        calls = []
+
+        def fail_third_batch(conn, dictionary, batch_size):
+            calls.append(batch_size)
+            if len(calls) == 3:
+                raise sqlite3.OperationalError("disk I/O error")
+            return original(conn, dictionary, batch_size)
+
+        with patch.object(migrate, "_migrate_batch", fail_third_batch):
+            with self.assertRaises(sqlite3.OperationalError):
+                migrate_db(self.path, batch_size=30)
+        # still refused half way through
+        with self.assertRaises(ValueError):
+            db.SqliteReceiptStore(self.path, pool_size=1)
+
+        self.assertEqual(migrate_db(self.path, batch_size=30), 40)
+        store = db.SqliteReceiptStore(self.path, pool_size=1)
+        for receipt in receipts:
+            self.assertEqual(store.get_receipt(str(generate_id(receipt))), receipt)
+        store.close()
+
+    def test_newer_schema_is_refused(self):
+        with sqlite3.connect(self.path) as conn:
+            conn.execute(f"PRAGMA user_version = {db.SCHEMA_VERSION + 1}")
+        conn.close()
+
+        with self.assertRaises(ValueError):
+            db.SqliteReceiptStore(self.path, pool_size=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
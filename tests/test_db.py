@@ -0,0 +1,115 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+
+from app import db
+from app.receipt_processor import generate_id, calculate_points
+from tests.helpers import make_receipt
+
+
+class TestDB(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        db.init_db(db.SqliteReceiptStore(os.path.join(self.tmpdir.name, "receipts.db"), pool_size=8))
+
+    def tearDown(self):
+        db.close_db()
+        self.tmpdir.cleanup()
+
+    def test_pragmas(self):
+        with db.get_store().pool.connection() as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+            self.assertEqual(conn.execute("PRAGMA busy_timeout").fetchone()[0], db.DB_BUSY_TIMEOUT_MS)
+
+    def test_warm_up_starts_executor_threads(self):
+        db.warm_up()
+        self.assertEqual(len(db.executor._threads), 8)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            db.create_store("postgres")
+
+    def test_store_and_get(self):
+        receipt = make_receipt(1)
+        receipt_id = str(generate_id(receipt))
+        points = calculate_points(receipt)
+
+        self.assertTrue(db.store_receipt(receipt_id, points, receipt))
+        # storing the same receipt again is not an error
+        self.assertTrue(db.store_receipt(receipt_id, points, receipt))
+        self.assertEqual(db.get_receipt_points(receipt_id), (points,))
+        self.assertIsNone(db.get_receipt_points("non-existent-receipt-id"))
+
+    def test_points_cache(self):
+        receipt = make_receipt(1)
+        receipt_id = str(generate_id(receipt))
+        points = calculate_points(receipt)
+        db.store_receipt(receipt_id, points, receipt)
+
+        with patch.object(db.get_store(), "get_receipt_points") as mock_get:
+            # written through on store, so the lookup never reaches sqlite
+            self.assertEqual(db.get_receipt_points(receipt_id), (points,))
+            mock_get.assert_not_called()
+
+            mock_get.return_value = None
+            self.assertIsNone(db.get_receipt_points("non-existent-receipt-id"))
+            self.assertIsNone(asyncio.run(db.get_receipt_points_async("non-existent-receipt-id")))
+            mock_get.assert_called_once_with("non-existent-receipt-id")
+
+        self.assertEqual(db.cache_stats()["hits"], 1)
+        self.assertEqual(db.cache_stats()["negative_hits"], 1)
+
+    def test_store_receipts_batch(self):
+        receipts = [make_receipt(n) for n in range(10)]
+        rows = [(str(generate_id(r)), calculate_points(r), r) for r in receipts]
+
+        self.assertTrue(db.store_receipts(rows + rows[:3]))
+        for receipt_id, points, _ in rows:
+            self.assertEqual(db.get_receipt_points(receipt_id), (points,))
+
+    def test_concurrent_threads(self):
+        # 64 parallel writers and readers sharing the pool from plain threads
+        receipts = [make_receipt(n) for n in range(64)]
+        rows = [(str(generate_id(r)), calculate_points(r), r) for r in receipts]
+        barrier = threading.Barrier(64)
+
+        def write_then_read(row):
+            barrier.wait()
+            receipt_id, points, receipt = row
+            self.assertTrue(db.store_receipt(receipt_id, points, receipt))
+            return db.get_receipt_points(receipt_id)
+
+        with ThreadPoolExecutor(max_workers=64) as workers:
+            results = list(workers.map(write_then_read, rows))
+
+        self.assertEqual(results, [(points,) for _, points, _ in rows])
+
+    def test_concurrent_async(self):
+        # 64 writers and 64 readers running on one event loop
+        receipts = [make_receipt(n) for n in range(64)]
+        rows = [(str(generate_id(r)), calculate_points(r), r) for r in receipts]
+
+        async def run():
+            writers = [db.store_receipt_async(*row) for row in rows]
+            readers = [db.get_receipt_points_async(row[0]) for row in rows]
+            results = await asyncio.gather(*writers, *readers)
+            return results[:64], results[64:]
+
+        stored, read = asyncio.run(run())
+
+        self.assertTrue(all(stored))
+        # a reader may run before its writer, but never sees a partial row
+        for result, (_, points, _) in zip(read, rows):
+            self.assertIn(result, (None, (points,)))
+        for receipt_id, points, _ in rows:
+            self.assertEqual(db.get_receipt_points(receipt_id), (points,))
+
+
+if __name__ == '__main__':
+    unittest.main()
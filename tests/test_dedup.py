@@ -0,0 +1,105 @@
+import os
+import uuid
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app import db
+from app.main import app
+from app.dedup import SeenReceipts, receipt_key
+from app.memory_store import InMemoryReceiptStore
+from app.receipt_processor import parse_receipt, generate_id, calculate_points
+
+RECEIPT = {
+    "retailer": "Target",
+    "purchaseDate": "2022-01-02",
+    "purchaseTime": "13:13",
+    "total": "1.25",
+    "items": [{"shortDescription": "Pepsi - 12-oz", "price": "1.25"}]
+}
+
+
+class TestSeenReceipts(unittest.TestCase):
+
+    def test_membership(self):
+        receipt_id = uuid.uuid3(uuid.NAMESPACE_DNS, "receipt")
+        seen = SeenReceipts([str(receipt_id)])
+
+        self.assertIn(receipt_id, seen)
+        self.assertIn(str(receipt_id), seen)
+        self.assertNotIn(uuid.uuid3(uuid.NAMESPACE_DNS, "other"), seen)
+        self.assertNotIn("not-a-uuid", seen)
+        self.assertIsNone(receipt_key(123))
+
+
+class TestDuplicateDetection(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "receipts.db")
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        db.close_db()
+        self.tmpdir.cleanup()
+
+    def test_loaded_from_table_at_startup(self):
+        receipt = parse_receipt(RECEIPT)
+        receipt_id = str(generate_id(receipt))
+        store = db.SqliteReceiptStore(self.path, pool_size=1)
+        store.store_receipt(receipt_id, calculate_points(receipt), receipt)
+        store.close()
+
+        db.init_db(db.SqliteReceiptStore(self.path, pool_size=2))
+
+        self.assertEqual(len(db.seen), 1)
+        self.assertTrue(db.is_known_receipt(receipt_id))
+        self.assertFalse(db.is_known_receipt(str(uuid.uuid4())))
+
+    def test_duplicate_skips_scoring_and_write(self):
+        db.init_db(db.SqliteReceiptStore(self.path, pool_size=2))
+        first = self.client.post("/receipts/process", json=RECEIPT)
+
+        with patch("app.main.calculate_points") as mock_calculate, \
+                patch("app.main.store_receipt_async") as mock_store:
+            second = self.client.post("/receipts/process", json=RECEIPT)
+            batch = self.client.post("/receipts/process/batch", json=[RECEIPT])
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(batch.json()["receipts"], [{"id": first.json()["id"], "points": 31}])
+        mock_calculate.assert_not_called()
+        mock_store.assert_not_called()
+
+    def test_disabled(self):
+        db.init_db(db.SqliteReceiptStore(self.path, pool_size=2), dedup_enabled=False)
+        receipt = parse_receipt(RECEIPT)
+        receipt_id = str(generate_id(receipt))
+        db.store_receipt(receipt_id, 31, receipt)
+
+        self.assertIsNone(db.seen)
+        self.assertFalse(db.is_known_receipt(receipt_id))
+
+    def test_memory_store_answers_membership(self):
+        db.init_db(InMemoryReceiptStore(shards=2))
+        receipt = parse_receipt(RECEIPT)
+        receipt_id = generate_id(receipt)
+        db.store_receipt(str(receipt_id), 31, receipt)
+
+        self.assertIsNone(db.seen)
+        self.assertTrue(db.is_known_receipt(receipt_id))
+        self.assertEqual(list(db.store.iter_receipt_ids()), [str(receipt_id)])
+
+    def test_memory_store_disabled(self):
+        db.init_db(InMemoryReceiptStore(shards=2), dedup_enabled=False)
+        receipt = parse_receipt(RECEIPT)
+        receipt_id = generate_id(receipt)
+        db.store_receipt(str(receipt_id), 31, receipt)
+
+        self.assertFalse(db.is_known_receipt(receipt_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import queue
+import logging
+import unittest
+from unittest.mock import patch
+from datetime import datetime
+
+from app import logging_config
+from app.models import Receipt, Item
+from app.receipt_processor import calculate_points
+
+
+def make_receipt():
+    return Receipt(retailer="Target", purchaseDate=datetime(2022, 1, 1), purchaseTime="13:01",
+                   items=[Item(shortDescription="Emils Cheese Pizza", price=12.25)], total=12.25)
+
+
+class TestLoggingConfig(unittest.TestCase):
+
+    def test_setup_logging_uses_queue(self):
+        listener = logging_config.setup_logging()
+
+        self.assertIs(logging_config.setup_logging(), listener)
+        self.assertTrue(any(isinstance(h, logging_config.DeferredQueueHandler) for h in logging.getLogger().handlers))
+
+    def test_records_formatted_by_listener(self):
+        log_queue = queue.SimpleQueue()
+        logger = logging.getLogger("test.deferred")
+        logger.propagate = False
+        logger.addHandler(logging_config.DeferredQueueHandler(log_queue))
+        try:
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                logger.exception("failed %s", "receipt-id")
+        finally:
+            logger.handlers.clear()
+            logger.propagate = True
+
+        record = log_queue.get_nowait()
+        # nothing was formatted on the logging thread
+        self.assertEqual((record.msg, record.args), ("failed %s", ("receipt-id",)))
+        self.assertIsNone(record.exc_text)
+        self.assertIsNotNone(record.exc_info)
+
+        formatted = logging.Formatter(logging_config.LOG_FORMAT).format(record)
+        self.assertIn("failed receipt-id", formatted)
+        self.assertIn("ValueError: boom", formatted)
+
+    @patch("app.logging_config.SCORING_LOG_SAMPLE_RATE", 3)
+    def test_breakdown_sampled_one_in_n(self):
+        receipt = make_receipt()
+        points = calculate_points(receipt)
+        logging_config.scoring_logger.setLevel(logging.DEBUG)
+        try:
+            with patch("app.logging_config._sample_counter", iter(range(9))), \
+                    self.assertLogs("app.scoring", level=logging.DEBUG) as logs:
+                for _ in range(9):
+                    logging_config.log_breakdown_sample("receipt-id", receipt, points)
+        finally:
+            logging_config.scoring_logger.setLevel(logging.NOTSET)
+
+        self.assertEqual(len(logs.records), 3)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["event"], "points_breakdown")
+        self.assertEqual(record["id"], "receipt-id")
+        self.assertEqual(sum(record["rules"].values()), points)
+
+    @patch("app.logging_config.SCORING_LOG_SAMPLE_RATE", 0)
+    @patch("app.receipt_processor.calculate_points_breakdown")
+    def test_breakdown_not_computed_when_disabled(self, mock_breakdown):
+        logging_config.log_breakdown_sample("receipt-id", make_receipt(), 0)
+
+        mock_breakdown.assert_not_called()
+
+    def test_rules_do_not_log(self):
+        with patch("logging.Logger._log") as mock_log:
+            calculate_points(make_receipt())
+
+        mock_log.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,13 @@ import unittest
 from unittest.mock import patch, MagicMock
 from fastapi.testclient import TestClient
 import json
+import os
+import tempfile
+from app import db
 from app.main import app  # Assuming your FastAPI app is in 'main.py'
+from app.models import Receipt
+from app.receipt_processor import warm_up, RULES_FINGERPRINT
+from app.config import POINTS_CACHE_CONTROL
 
 class TestFastAPIApp(unittest.TestCase):
     
@@ -11,7 +17,7 @@ class TestFastAPIApp(unittest.TestCase):
     
     @patch("app.main.generate_id")
     @patch("app.main.calculate_points")
-    @patch("app.main.store_receipt")
+    @patch("app.main.store_receipt_async")
     def test_submit_receipt_success(self, mock_store_receipt, mock_calculate_points, mock_generate_id):
         # Test data
         payload = {
@@ -37,11 +43,13 @@ class TestFastAPIApp(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), {"id": receipt_id})
         
-        mock_generate_id.assert_called_once_with(json.dumps(payload))
-        mock_calculate_points.assert_called_once_with(json.dumps(payload))
-        mock_store_receipt.assert_called_once_with(receipt_id, points, payload)
+        # the payload is validated once and the same Receipt is shared by every step
+        receipt = Receipt.model_validate(payload)
+        mock_generate_id.assert_called_once_with(receipt)
+        mock_calculate_points.assert_called_once_with(receipt)
+        mock_store_receipt.assert_called_once_with(receipt_id, points, receipt)
 
-    @patch("app.main.store_receipt")
+    @patch("app.main.store_receipt_async")
     def test_submit_receipt_failure_db_error(self, mock_store_receipt):
         # Test data
         payload = {
@@ -61,8 +69,9 @@ class TestFastAPIApp(unittest.TestCase):
         self.assertEqual(response.status_code, 503)
         self.assertEqual(response.json(), {"detail": "Error processing receipt."})
 
-    @patch("app.main.get_receipt_points")
-    def test_get_receipt_points_success(self, mock_get_receipt_points):
+    @patch("app.main.scored_with_running_rules", return_value=True)
+    @patch("app.main.get_receipt_points_async")
+    def test_get_receipt_points_success(self, mock_get_receipt_points, _):
         receipt_id = "a44f6c64-4d6a-3a9e-9c84-9193edc11dc8"
         points = 22
         
@@ -78,8 +87,65 @@ class TestFastAPIApp(unittest.TestCase):
         
         mock_get_receipt_points.assert_called_once_with(receipt_id)
 
-    @patch("app.main.get_receipt_points")
-    def test_get_receipt_points_not_found(self, mock_get_receipt_points):
+    @patch("app.main.scored_with_running_rules", return_value=True)
+    @patch("app.main.get_receipt_points_async")
+    def test_get_receipt_points_etag(self, mock_get_receipt_points, _):
+        receipt_id = "a44f6c64-4d6a-3a9e-9c84-9193edc11dc8"
+        mock_get_receipt_points.return_value = (22,)
+
+        response = self.client.get(f"/receipts/{receipt_id}/points")
+        etag = response.headers["etag"]
+
+        self.assertEqual(etag, f'"{receipt_id}.{RULES_FINGERPRINT}"')
+        self.assertEqual(response.headers["cache-control"], POINTS_CACHE_CONTROL)
+        self.assertNotIn("immutable", response.headers["cache-control"])
+        self.assertEqual(response.content, b'{"points":22}')
+
+        mock_get_receipt_points.reset_mock()
+        for header in (etag, f'"other", W/{etag}'):
+            with self.subTest(if_none_match=header):
+                response = self.client.get(f"/receipts/{receipt_id}/points", headers={"If-None-Match": header})
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.headers["etag"], etag)
+                self.assertEqual(response.content, b"")
+        # answered without looking the receipt up
+        mock_get_receipt_points.assert_not_called()
+
+        stale = f'"{receipt_id}.000000000000"'
+        response = self.client.get(f"/receipts/{receipt_id}/points", headers={"If-None-Match": stale})
+        self.assertEqual(response.status_code, 200)
+        mock_get_receipt_points.assert_called_once_with(receipt_id)
+
+    @patch("app.main.scored_with_running_rules", return_value=True)
+    @patch("app.main.get_receipt_points_async")
+    def test_get_receipt_points_if_none_match_any(self, mock_get_receipt_points, _):
+        receipt_id = "a44f6c64-4d6a-3a9e-9c84-9193edc11dc8"
+        mock_get_receipt_points.return_value = (22,)
+        response = self.client.get(f"/receipts/{receipt_id}/points", headers={"If-None-Match": "*"})
+        self.assertEqual(response.status_code, 304)
+
+        # * only matches a receipt that exists
+        mock_get_receipt_points.return_value = None
+        response = self.client.get(f"/receipts/{receipt_id}/points", headers={"If-None-Match": "*"})
+        self.assertEqual(response.status_code, 404)
+
+    @patch("app.main.scored_with_running_rules", return_value=False)
+    @patch("app.main.get_receipt_points_async")
+    def test_get_receipt_points_before_rescore(self, mock_get_receipt_points, _):
+        receipt_id = "a44f6c64-4d6a-3a9e-9c84-9193edc11dc8"
+        mock_get_receipt_points.return_value = (22,)
+
+        response = self.client.get(f"/receipts/{receipt_id}/points",
+                                   headers={"If-None-Match": f'"{receipt_id}.{RULES_FINGERPRINT}"'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("etag", response.headers)
+        self.assertEqual(response.headers["cache-control"], "no-cache")
+        self.assertEqual(response.content, b'{"points":22}')
+
+    @patch("app.main.scored_with_running_rules", return_value=True)
+    @patch("app.main.get_receipt_points_async")
+    def test_get_receipt_points_not_found(self, mock_get_receipt_points, _):
         receipt_id = "non-existent-receipt-id"
         
         # Mock get_receipt_points to return None (simulate not found)
@@ -95,22 +161,23 @@ class TestFastAPIApp(unittest.TestCase):
 
     @patch("app.main.generate_id")
     @patch("app.main.calculate_points")
-    @patch("app.main.store_receipt")
+    @patch("app.main.store_receipt_async")
     def test_submit_receipt_success(self, mock_store, mock_calculate, mock_generate):
         mock_generate.return_value = 123
         mock_calculate.return_value = 100
         mock_store.return_value = True
-        payload = {"retailer": "Store", "purchaseDate": "2023-01-01", "total": 10.25}
+        payload = {"retailer": "Store", "purchaseDate": "2023-01-01", "purchaseTime": "14:33", "items": [], "total": 10.25}
         
         response = self.client.post("/receipts/process", json=payload)
         
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), {"id": 123})
-        mock_generate.assert_called_once_with(json.dumps(payload))  # Ensure generate_id was called
-        mock_calculate.assert_called_once_with(json.dumps(payload))  # Ensure calculate_points was called
-        mock_store.assert_called_once_with(str(123), 100, payload)  # Ensure store_receipt was called
+        receipt = Receipt.model_validate(payload)
+        mock_generate.assert_called_once_with(receipt)  # Ensure generate_id was called
+        mock_calculate.assert_called_once_with(receipt)  # Ensure calculate_points was called
+        mock_store.assert_called_once_with(str(123), 100, receipt)  # Ensure store_receipt was called
 
-    @patch("app.main.store_receipt")
+    @patch("app.main.store_receipt_async")
     def test_submit_receipt_invalid_json(self, mock_store):
         payload = {"retailer": "Store", "purchaseDate": "2023-01-01", "total": "invalid"}  # Invalid total
         
@@ -122,38 +189,39 @@ class TestFastAPIApp(unittest.TestCase):
 
     @patch("app.main.generate_id")
     @patch("app.main.calculate_points")
-    @patch("app.main.store_receipt")
+    @patch("app.main.store_receipt_async")
     def test_submit_receipt_service_unavailable(self, mock_store, mock_calculate, mock_generate):
 
         mock_generate.return_value = 123
         mock_calculate.return_value = 100
         mock_store.return_value = False  # Simulating service being unavailable
-        payload = {"retailer": "Store", "purchaseDate": "2023-01-01", "total": 10.25}
+        payload = {"retailer": "Store", "purchaseDate": "2023-01-01", "purchaseTime": "14:33", "items": [], "total": 10.25}
         
         response = self.client.post("/receipts/process", json=payload)
         
         self.assertEqual(response.status_code, 503)
-        mock_generate.assert_called_once_with(json.dumps(payload))
-        mock_calculate.assert_called_once_with(json.dumps(payload))
-        mock_store.assert_called_once_with(str(123), 100, payload)
+        receipt = Receipt.model_validate(payload)
+        mock_generate.assert_called_once_with(receipt)
+        mock_calculate.assert_called_once_with(receipt)
+        mock_store.assert_called_once_with(str(123), 100, receipt)
 
     @patch("app.main.generate_id")
     @patch("app.main.calculate_points")
-    @patch("app.main.store_receipt")
+    @patch("app.main.store_receipt_async")
     def test_submit_receipt_unexpected_error(self, mock_store, mock_calculate, mock_generate):
 
         mock_generate.side_effect = Exception("Unexpected error")  # Force an unexpected error
-        payload = {"retailer": "Store", "purchaseDate": "2023-01-01", "total": 10.25}
+        payload = {"retailer": "Store", "purchaseDate": "2023-01-01", "purchaseTime": "14:33", "items": [], "total": 10.25}
         
         response = self.client.post("/receipts/process", json=payload)
         
         self.assertEqual(response.status_code, 500)
         self.assertEqual(response.json(), {"detail": "An unexpected error occurred."})
-        mock_generate.assert_called_once_with(json.dumps(payload))
+        mock_generate.assert_called_once_with(Receipt.model_validate(payload))
         mock_calculate.assert_not_called()
         mock_store.assert_not_called()
 
-    @patch("app.main.store_receipt")
+    @patch("app.main.store_receipt_async")
     def test_submit_receipt_json_decode_error(self, mock_store):
         # Simulate a JSONDecodeError
         payload = '{"total": "10.25"}'  # Missing required retailer field for rules
@@ -165,6 +233,164 @@ class TestFastAPIApp(unittest.TestCase):
         
         # Ensure the other functions weren't called
         mock_store.assert_not_called()
+    @patch("app.main.store_receipt_async")
+    def test_submit_receipt_huge_amount(self, mock_store):
+        for total in ["1e999999", "1e500000"]:
+            payload = {"retailer": "Store", "purchaseDate": "2023-01-01", "purchaseTime": "14:33", "items": [], "total": total}
+
+            response = self.client.post("/receipts/process", json=payload)
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {"detail": "The receipt is invalid."})
+        mock_store.assert_not_called()
+
+    @patch("app.main.store_receipts")
+    def test_submit_receipts_batch_huge_amount(self, mock_store_receipts):
+        valid = {"retailer": "Target", "purchaseDate": "2022-01-02", "purchaseTime": "13:13",
+                 "items": [{"shortDescription": "Pepsi - 12-oz", "price": "1.25"}], "total": "1.25"}
+        mock_store_receipts.return_value = True
+
+        response = self.client.post("/receipts/process/batch", json=[
+            dict(valid, total="1e999999"), valid, dict(valid, items=[{"shortDescription": "Pepsi", "price": "1e500000"}])])
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["receipts"]
+        self.assertEqual(results[0], {"error": "The receipt is invalid."})
+        self.assertEqual(results[1]["points"], 31)
+        self.assertEqual(results[2], {"error": "The receipt is invalid."})
+
+    @patch("app.main.store_receipts")
+    def test_submit_receipts_batch_partial_failure(self, mock_store_receipts):
+        valid = {
+            "retailer": "Target",
+            "purchaseDate": "2022-01-02",
+            "purchaseTime": "13:13",
+            "items": [{"shortDescription": "Pepsi - 12-oz", "price": "1.25"}],
+            "total": "1.25"
+        }
+        invalid = {"retailer": "Store", "purchaseDate": "2023-01-01", "total": "invalid"}
+        mock_store_receipts.return_value = True
+
+        response = self.client.post("/receipts/process/batch", json=[valid, invalid, valid])
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["receipts"]
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[1], {"error": "The receipt is invalid."})
+        self.assertEqual(results[0], results[2])
+        self.assertEqual(results[0]["points"], 31)
+        # only the valid receipts are written, in a single call
+        mock_store_receipts.assert_called_once()
+        rows = mock_store_receipts.call_args[0][0]
+        self.assertEqual([r[0] for r in rows], [results[0]["id"], results[2]["id"]])
+
+    @patch("app.main.calculate_points")
+    @patch("app.main.store_receipts")
+    def test_submit_receipts_batch_unexpected_error(self, mock_store_receipts, mock_calculate):
+        mock_store_receipts.return_value = True
+        mock_calculate.side_effect = [31, ArithmeticError("overflow"), 31]
+
+        response = self.client.post("/receipts/process/batch", json=[
+            {"retailer": f"Store {i}", "purchaseDate": "2022-01-02", "purchaseTime": "13:13", "items": [], "total": "1.25"}
+            for i in range(3)])
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["receipts"]
+        self.assertEqual(results[1], {"error": "An unexpected error occurred."})
+        self.assertEqual([results[0]["points"], results[2]["points"]], [31, 31])
+        rows = mock_store_receipts.call_args[0][0]
+        self.assertEqual([r[0] for r in rows], [results[0]["id"], results[2]["id"]])
+
+    @patch("app.main.store_receipts")
+    def test_submit_receipts_batch_ndjson(self, mock_store_receipts):
+        mock_store_receipts.return_value = True
+        with open("tests/simple-receipt.json") as f:
+            simple = json.load(f)
+        with open("tests/morning-receipt.json") as f:
+            morning = json.load(f)
+        body = json.dumps(simple) + "\n" + json.dumps(morning) + "\n"
+
+        response = self.client.post(
+            "/receipts/process/batch",
+            content=body,
+            headers={"Content-Type": "application/x-ndjson"})
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["receipts"]
+        self.assertEqual([r["points"] for r in results], [31, 15])
+
+    @patch("app.main.store_receipts")
+    def test_submit_receipts_batch_ndjson_bad_line(self, mock_store_receipts):
+        mock_store_receipts.return_value = True
+        with open("tests/simple-receipt.json") as f:
+            simple = json.load(f)
+        with open("tests/morning-receipt.json") as f:
+            morning = json.load(f)
+        body = json.dumps(simple) + "\n{bad json\n" + json.dumps(morning) + "\n"
+
+        response = self.client.post(
+            "/receipts/process/batch",
+            content=body,
+            headers={"Content-Type": "application/x-ndjson"})
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["receipts"]
+        self.assertEqual(results[1], {"error": "The receipt is invalid."})
+        self.assertEqual([results[0]["points"], results[2]["points"]], [31, 15])
+        self.assertEqual(len(mock_store_receipts.call_args[0][0]), 2)
+
+    @patch("app.main.BATCH_MAX_RECEIPTS", 2)
+    @patch("app.main.store_receipts")
+    def test_submit_receipts_batch_too_many_receipts(self, mock_store_receipts):
+        with open("tests/simple-receipt.json") as f:
+            simple = json.load(f)
+
+        response = self.client.post("/receipts/process/batch", json=[simple] * 3)
+
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json(), {"detail": "The batch is too large."})
+        mock_store_receipts.assert_not_called()
+
+    @patch("app.main.BATCH_MAX_BYTES", 1024)
+    @patch("app.main.store_receipts")
+    def test_submit_receipts_batch_too_large_body(self, mock_store_receipts):
+        with open("tests/simple-receipt.json") as f:
+            simple = json.load(f)
+        body = (json.dumps(simple) + "\n") * 10
+
+        response = self.client.post(
+            "/receipts/process/batch",
+            content=body,
+            headers={"Content-Type": "application/x-ndjson"})
+        self.assertEqual(response.status_code, 413)
+
+        # without a Content-Length the body is still cut off while it streams
+        response = self.client.post(
+            "/receipts/process/batch",
+            content=(line.encode() for line in [json.dumps(simple) + "\n"] * 10),
+            headers={"Content-Type": "application/x-ndjson"})
+        self.assertEqual(response.status_code, 413)
+        mock_store_receipts.assert_not_called()
+
+    @patch("app.main.store_receipts")
+    def test_submit_receipts_batch_not_a_list(self, mock_store_receipts):
+        response = self.client.post("/receipts/process/batch", json={"retailer": "Store"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"detail": "The batch is invalid."})
+        mock_store_receipts.assert_not_called()
+
+    @patch("app.main.store_receipts")
+    def test_submit_receipts_batch_db_error(self, mock_store_receipts):
+        mock_store_receipts.return_value = None
+        with open("tests/simple-receipt.json") as f:
+            simple = json.load(f)
+
+        response = self.client.post("/receipts/process/batch", json=[simple])
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {"detail": "Error processing receipts."})
+
     def test_health_check(self):
         # Make a GET request to the /health endpoint
         response = self.client.get("/health")
@@ -173,6 +399,21 @@ class TestFastAPIApp(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), {"status": "healthy"})
 
+    def test_ready_only_after_warm_up(self):
+        # the lifespan hasn't run for the shared client
+        self.assertEqual(self.client.get("/ready").status_code, 503)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db.init_db(db.SqliteReceiptStore(os.path.join(tmpdir, "ready.db"), pool_size=2))
+            with patch("app.main.warm_up_scoring", wraps=warm_up) as scoring:
+                with TestClient(app) as client:
+                    response = client.get("/ready")
+            self.assertEqual(self.client.get("/ready").status_code, 503)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "ready"})
+        scoring.assert_called_once()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,94 @@
+import time
+import uuid
+import asyncio
+import unittest
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+
+from app import db
+from app.memory_store import InMemoryReceiptStore
+
+
+def receipt_id(n):
+    return str(uuid.uuid3(uuid.NAMESPACE_DNS, f"receipt-{n}"))
+
+
+class TestInMemoryReceiptStore(unittest.TestCase):
+
+    def test_store_and_get(self):
+        store = InMemoryReceiptStore(shards=4)
+        self.assertTrue(store.store_receipt(receipt_id(1), 28, None))
+        self.assertTrue(store.store_receipt(receipt_id(1), 28, None))
+
+        self.assertEqual(store.get_receipt_points(receipt_id(1)), (28,))
+        self.assertIsNone(store.get_receipt_points(receipt_id(2)))
+        self.assertIsNone(store.get_receipt_points("non-existent-receipt-id"))
+        self.assertEqual(len(store), 1)
+
+    def test_store_receipts_batch(self):
+        store = InMemoryReceiptStore(shards=4)
+        rows = [(receipt_id(n), n, None) for n in range(100)]
+
+        self.assertTrue(store.store_receipts(rows))
+        for rid, points, _ in rows:
+            self.assertEqual(store.get_receipt_points(rid), (points,))
+
+    def test_lru_eviction(self):
+        store = InMemoryReceiptStore(shards=1, max_mb=1)
+        cap = store.max_receipts
+        for n in range(cap):
+            store.store_receipt(receipt_id(n), n, None)
+        # touching the oldest receipt makes the second oldest the eviction victim
+        store.get_receipt_points(receipt_id(0))
+        store.store_receipt(receipt_id(cap), cap, None)
+
+        self.assertEqual(len(store), cap)
+        self.assertEqual(store.get_receipt_points(receipt_id(0)), (0,))
+        self.assertIsNone(store.get_receipt_points(receipt_id(1)))
+        self.assertEqual(store.stats()["evictions"], 1)
+
+    def test_ttl_eviction(self):
+        store = InMemoryReceiptStore(shards=2, eviction="ttl", ttl_seconds=60)
+        store.store_receipt(receipt_id(1), 10, None)
+        self.assertEqual(store.get_receipt_points(receipt_id(1)), (10,))
+
+        with patch("app.memory_store.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertIsNone(store.get_receipt_points(receipt_id(1)))
+        self.assertEqual(len(store), 0)
+
+    def test_unknown_eviction_policy(self):
+        with self.assertRaises(ValueError):
+            InMemoryReceiptStore(eviction="fifo")
+
+    def test_concurrent_writers_and_readers(self):
+        store = InMemoryReceiptStore(shards=8)
+        rows = [(receipt_id(n), n, None) for n in range(2000)]
+
+        with ThreadPoolExecutor(max_workers=64) as workers:
+            list(workers.map(lambda row: store.store_receipt(*row), rows))
+            results = list(workers.map(lambda row: store.get_receipt_points(row[0]), rows))
+
+        self.assertEqual(results, [(points,) for _, points, _ in rows])
+
+    def test_memory_cost(self):
+        store = InMemoryReceiptStore()
+        rows = [(receipt_id(n), n, None) for n in range(10000)]
+        store.store_receipts(rows)
+
+        self.assertLess(store.stats()["bytes_per_receipt"], 256)
+
+    def test_async_variants_run_inline(self):
+        db.init_db(InMemoryReceiptStore(shards=2))
+        try:
+            async def run():
+                await db.store_receipt_async(receipt_id(1), 42, None)
+                return await db.get_receipt_points_async(receipt_id(1))
+
+            self.assertEqual(asyncio.run(run()), (42,))
+            self.assertIsNone(db.executor)
+        finally:
+            db.close_db()
+
+
+if __name__ == '__main__':
+    unittest.main()
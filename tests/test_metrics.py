@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app import db
+from app.main import app
+from app.metrics import Counter, Histogram, stage, duplicate_receipts, db_commit_latency, stage_latency, _NOOP
+from app.receipt_processor import parse_receipt, generate_id, calculate_points
+
+RECEIPT = {
+    "retailer": "Target",
+    "purchaseDate": "2022-01-02",
+    "purchaseTime": "13:13",
+    "total": "1.25",
+    "items": [{"shortDescription": "Pepsi - 12-oz", "price": "1.25"}]
+}
+
+
+class TestMetricTypes(unittest.TestCase):
+
+    def test_counter(self):
+        counter = Counter("things_total", "Things.", ("kind",))
+        counter.inc("a")
+        counter.inc("a", amount=2)
+
+        self.assertEqual(counter.value("a"), 3)
+        self.assertEqual(counter.render(), ["# HELP things_total Things.", "# TYPE things_total counter", 'things_total{kind="a"} 3'])
+
+    def test_histogram(self):
+        histogram = Histogram("work_seconds", "Work.", ("stage",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, "x")
+        histogram.observe(0.5, "x")
+        histogram.observe(5, "x")
+
+        lines = histogram.render()
+        self.assertIn('work_seconds_bucket{stage="x",le="0.1"} 1', lines)
+        self.assertIn('work_seconds_bucket{stage="x",le="1"} 2', lines)
+        self.assertIn('work_seconds_bucket{stage="x",le="+Inf"} 3', lines)
+        self.assertIn('work_seconds_count{stage="x"} 3', lines)
+        self.assertEqual(histogram.count("x"), 3)
+
+    def test_disabled(self):
+        with patch("app.metrics.METRICS_ENABLED", False):
+            self.assertIs(stage("parse"), _NOOP)
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        db.init_db(db.SqliteReceiptStore(os.path.join(self.tmpdir.name, "receipts.db"), pool_size=2))
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        db.close_db()
+        self.tmpdir.cleanup()
+
+    def test_metrics(self):
+        duplicates = duplicate_receipts.value()
+        commits = db_commit_latency.count("store_receipt")
+        parses = stage_latency.count("parse")
+
+        receipt_id = self.client.post("/receipts/process", json=RECEIPT).json()["id"]
+        self.client.post("/receipts/process", json=RECEIPT)
+        self.client.get(f"/receipts/{receipt_id}/points")
+        self.client.get("/receipts/non-existent-receipt-id/points")
+
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        body = response.text
+        self.assertIn('http_requests_total{method="POST",route="/receipts/process",status="200"}', body)
+        self.assertIn('http_requests_total{method="GET",route="/receipts/{receipt_id}/points",status="404"}', body)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="/receipts/{receipt_id}/points",le="+Inf"}', body)
+        for name in ("parse", "generate_id", "calculate_points", "store"):
+            self.assertIn(f'receipt_stage_duration_seconds_count{{stage="{name}"}}', body)
+        self.assertIn("receipt_points_cache_hits_total 1", body)
+        self.assertIn("receipt_points_cache_hit_ratio", body)
+
+        self.assertEqual(stage_latency.count("parse"), parses + 2)
+        self.assertEqual(db_commit_latency.count("store_receipt"), commits + 1)
+        self.assertEqual(duplicate_receipts.value(), duplicates + 1)
+
+    def test_batch_duplicates_counted(self):
+        duplicates = duplicate_receipts.value()
+        receipt = parse_receipt(RECEIPT)
+        row = (str(generate_id(receipt)), calculate_points(receipt), receipt)
+
+        db.store_receipts([row, row])
+        db.store_receipts([row])
+
+        self.assertEqual(duplicate_receipts.value(), duplicates + 2)
+
+    def test_metrics_disabled(self):
+        with patch("app.main.METRICS_ENABLED", False):
+            response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
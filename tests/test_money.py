@@ -0,0 +1,116 @@
+import json
+import math
+import random
+import unittest
+from datetime import date
+from decimal import Decimal
+
+from pydantic import ValidationError
+
+from app.money import parse_cents
+from app.models import Receipt, Item
+from app.receipt_processor import parse_receipt, generate_id, calculate_points_breakdown
+from app.rescore import score_receipts
+from app.rules import compile_rules, RULES
+
+
+# Reference scoring with Decimal dollars, written straight from the rule text
+def reference_points(payload) -> dict:
+    total = Decimal(payload["total"])
+    items = [(i["shortDescription"], Decimal(i["price"])) for i in payload["items"]]
+    return {
+        "retailer_name": sum(c.isalnum() for c in payload["retailer"]),
+        "receipt_total": (50 if total % 1 == 0 else 0) + (25 if total % Decimal("0.25") == 0 else 0),
+        "llm_total": 5 if total > 10 else 0,
+        "receipt_items": len(items) // 2 * 5 + sum(
+            math.ceil(price * Decimal("0.2")) for description, price in items if len(description.strip()) % 3 == 0),
+        "receipt_datetime": (6 if int(payload["purchaseDate"][8:10]) % 2 else 0)
+        + (10 if 1400 < int(payload["purchaseTime"].replace(":", "")) < 1600 else 0),
+    }
+
+
+def random_amount(rng) -> str:
+    # whole dollars, quarters, float trouble spots (0.1 + 0.2, 15.00) and arbitrary cents
+    cents = rng.choice([
+        rng.randint(0, 100) * 100,
+        rng.randint(0, 400) * 25,
+        rng.choice([30, 1500, 1005, 1000, 1001, 999, 500, 501, 0, 10, 20]),
+        rng.randint(0, 100000),
+    ])
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
+def random_payload(rng) -> dict:
+    return {
+        "retailer": rng.choice(["Target", "M&M Corner Market", "7-Eleven", "  "]),
+        "purchaseDate": f"2022-01-{rng.randint(1, 31):02d}",
+        "purchaseTime": f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}",
+        "items": [{"shortDescription": rng.choice(["Gatorade", "Pepsi - 12-oz", " Emils Cheese Pizza ", "abc"]),
+                   "price": random_amount(rng)} for _ in range(rng.randint(0, 8))],
+        "total": random_amount(rng),
+    }
+
+
+class TestParseCents(unittest.TestCase):
+
+    def test_valid_amounts(self):
+        cases = {"6.49": 649, "0.30": 30, "12": 1200, "12.5": 1250, "-1.25": -125, "6.490": 649, "1e2": 10000,
+                 ".49": 49, "+1.00": 100, 5: 500, 5.99: 599, 15.0: 1500}
+        for value, cents in cases.items():
+            with self.subTest(value=value):
+                self.assertEqual(parse_cents(value), cents)
+
+    def test_invalid_amounts(self):
+        for value in ["6.495", "1.2.49", "1_0.00", "abc", "", "nan", "inf", 0.1 + 0.2, 1.005, float("inf"), True, None,
+                      "9" * 20, "1e999999", "1e500000", "-1e13", "0.0100000000000000000000000000001"]:
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    parse_cents(value)
+
+    def test_huge_exponents_rejected_quickly(self):
+        # checked before any arithmetic, these used to overflow or build a million digit int
+        for value in ["1e999999", "1e500000", "-1e999990", "1" + "0" * 100000 + ".00"]:
+            with self.subTest(value=value[:12]):
+                with self.assertRaisesRegex(ValueError, "out of range"):
+                    parse_cents(value)
+
+    def test_model_rejects_sub_cent_amounts(self):
+        with self.assertRaises(ValidationError):
+            Item(shortDescription="Gatorade", price="2.255")
+
+    def test_serialized_as_dollars(self):
+        # the canonical form, and so every receipt id, is what it was with float amounts
+        with open("tests/simple-receipt.json") as f:
+            receipt = parse_receipt(json.load(f))
+        self.assertEqual(receipt.total, 125)
+        self.assertEqual(json.loads(receipt.model_dump_json())["total"], 1.25)
+        self.assertEqual(str(generate_id(receipt)), "18761c35-fa24-370f-ac1c-5eeb45015a89")
+
+
+class TestIntegerRules(unittest.TestCase):
+
+    def test_matches_decimal_reference(self):
+        rng = random.Random(2024)
+        payloads = [random_payload(rng) for _ in range(3000)]
+        receipts = [parse_receipt(p) for p in payloads]
+        every_rule = list(RULES)
+        evaluate = compile_rules(every_rule)
+
+        for payload, receipt in zip(payloads, receipts):
+            expected = reference_points(payload)
+            self.assertEqual(calculate_points_breakdown(receipt), {k: v for k, v in expected.items()
+                                                                   if k in calculate_points_breakdown(receipt)}, payload)
+            self.assertEqual(evaluate(receipt), sum(expected.values()), payload)
+        self.assertEqual(score_receipts(receipts, every_rule).tolist(),
+                         [sum(reference_points(p).values()) for p in payloads])
+
+    def test_float_trouble_spots(self):
+        # 15.00 * 0.2 is 3.0000000000000004 in floats, which used to round up to 4
+        receipt = Receipt(retailer="", purchaseDate=date(2022, 1, 2), purchaseTime="08:00",
+                          items=[Item(shortDescription="abc", price="15.00")], total="0.30")
+        self.assertEqual(calculate_points_breakdown(receipt)["receipt_items"], 3)
+        self.assertEqual(calculate_points_breakdown(receipt)["receipt_total"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,21 +3,31 @@ from unittest.mock import patch, MagicMock
 import uuid
 from datetime import datetime
 
-from app.receipt_processor import generate_id, from_json_to_receipt, calculate_points, count_rule_retailer_name, count_rule_receipt_total, count_rule_receipt_items, count_rule_receipt_datetime
+from app.receipt_processor import generate_id, canonical_form, parse_receipt, from_json_to_receipt, calculate_points, count_rule_retailer_name, count_rule_receipt_total, count_rule_llm_total, count_rule_receipt_items, count_rule_receipt_datetime
 from app.models import Receipt, Item
 
 class TestReceiptProcessor(unittest.TestCase):
 
     @patch("app.receipt_processor.uuid.uuid3")
     def test_generate_id(self, mock_uuid3):
-        # Test that the generate_id function generates the expected UUID based on the receipt string
-        receipt_string = "test_receipt_data"
+        # Test that the generate_id function generates the expected UUID based on the canonical receipt
+        receipt = Receipt(retailer="Store A", purchaseDate=datetime(2022, 4, 1), purchaseTime="14:33", items=[Item(shortDescription="item1", price=5.99)], total=5.99)
         expected_uuid = uuid.uuid4()  # Use a mock UUID for testing
         mock_uuid3.return_value = expected_uuid
         
-        result = generate_id(receipt_string)
+        result = generate_id(receipt)
         self.assertEqual(result, expected_uuid)
-        mock_uuid3.assert_called_once_with(uuid.NAMESPACE_DNS, receipt_string)
+        mock_uuid3.assert_called_once_with(uuid.NAMESPACE_DNS, canonical_form(receipt))
+
+    def test_generate_id_ignores_key_order(self):
+        # Identical receipts get the same id however the payload was written
+        payload = {"retailer": "Store A", "purchaseDate": "2022-04-01", "purchaseTime": "14:33", "items": [{"shortDescription": "item1", "price": "5.99"}], "total": "5.99"}
+        reordered = {"total": 5.99, "items": [{"price": 5.99, "shortDescription": "item1"}], "purchaseTime": "14:33", "purchaseDate": "2022-04-01", "retailer": "Store A"}
+        
+        self.assertEqual(generate_id(parse_receipt(payload)), generate_id(parse_receipt(reordered)))
+
+        payload["total"] = "6.00"
+        self.assertNotEqual(generate_id(parse_receipt(payload)), generate_id(parse_receipt(reordered)))
 
     def test_from_json_to_receipt_valid(self):
         # Test that from_json_to_receipt correctly parses a valid JSON string into a Receipt object
@@ -27,7 +37,7 @@ class TestReceiptProcessor(unittest.TestCase):
         
         self.assertIsInstance(receipt, Receipt)
         self.assertEqual(receipt.retailer, "Store A")
-        self.assertEqual(receipt.total, 5.99)
+        self.assertEqual(receipt.total, 599)  # integer cents
         self.assertEqual(len(receipt.items), 1)
 
     def test_from_json_to_receipt_invalid(self):
@@ -79,6 +89,13 @@ class TestReceiptProcessor(unittest.TestCase):
         
         self.assertEqual(points, 25)  # 25 for multiple of 0.25
 
+    def test_calculate_points_llm_total(self):
+        # The LLM bonus is its own rule, only active when the program is LLM generated
+        receipt = Receipt(retailer="Store C", purchaseDate=datetime(2022, 4, 1), purchaseTime="14:33", items=[Item(shortDescription="item1", price=5.99)], total=10.25)
+        
+        self.assertEqual(count_rule_llm_total(receipt), 5)
+        self.assertEqual(count_rule_receipt_total(receipt), 25)
+
     def test_calculate_points_items_count(self):
         # Test for item count (5 points for every two items)
         item1 = Item(shortDescription="item1", price=5.99)
@@ -0,0 +1,147 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import date
+
+from fastapi.testclient import TestClient
+
+from app import db
+from app.main import app
+from app.memory_store import InMemoryReceiptStore
+from app.reports import rebuild_db
+from tests.helpers import receipt_rows, expected_retailers, expected_hours
+
+
+class TestSqliteRollups(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "reports.db")
+        self.store = db.SqliteReceiptStore(self.path, pool_size=1)
+        self.rows = receipt_rows(400)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def store_all(self):
+        self.store.store_receipts(self.rows[:200])
+        for row in self.rows[200:]:
+            self.store.store_receipt(*row)
+
+    def test_rollups_follow_inserts(self):
+        self.store_all()
+        # duplicates are not counted twice
+        self.store.store_receipts(self.rows[:10])
+        self.store.store_receipt(*self.rows[-1])
+
+        self.assertEqual(self.store.retailer_report(), expected_retailers(self.rows))
+        start, end = date(2022, 3, 1), date(2022, 5, 31)
+        self.assertEqual(self.store.retailer_report(start, end), expected_retailers(self.rows, start, end))
+        self.assertEqual(self.store.hourly_report(), expected_hours(self.rows))
+
+        receipt_id, points, receipt = self.rows[0]
+        day = self.store.daily_report(receipt.purchaseDate, receipt.purchaseDate, receipt.retailer)
+        self.assertEqual(len(day), 1)
+        self.assertEqual(day[0]["date"], receipt.purchaseDate.isoformat())
+        self.assertGreaterEqual(day[0]["points"], points)
+
+    def test_rollups_follow_rescored_points(self):
+        self.store_all()
+        receipt_id, points, receipt = self.rows[0]
+        with self.store.pool.connection() as conn, conn:
+            conn.execute("UPDATE retail_receipts SET points = points + 100 WHERE id = ?", (receipt_id,))
+
+        self.assertEqual(sum(r["points"] for r in self.store.retailer_report()),
+                         sum(points for _, points, _ in self.rows) + 100)
+        self.assertEqual(sum(r["points"] for r in self.store.hourly_report()),
+                         sum(points for _, points, _ in self.rows) + 100)
+
+    def test_rebuild_repairs_drift(self):
+        self.store_all()
+        with self.store.pool.connection() as conn, conn:
+            conn.execute("UPDATE retailer_daily SET receipts = receipts + 5")
+            conn.execute("DELETE FROM receipts_hourly WHERE hour < 12")
+
+        rebuild_db(self.path)
+
+        self.assertEqual(self.store.retailer_report(), expected_retailers(self.rows))
+        self.assertEqual(self.store.hourly_report(), expected_hours(self.rows))
+
+    def test_version_1_database_gets_rollups(self):
+        self.store_all()
+        self.store.close()
+        with sqlite3.connect(self.path) as conn:
+            for trigger in ("retailer_daily_insert", "receipts_hourly_insert", "rollup_points_update"):
+                conn.execute(f"DROP TRIGGER {trigger}")
+            conn.execute("DROP TABLE retailer_daily")
+            conn.execute("DROP TABLE receipts_hourly")
+            conn.execute("PRAGMA user_version = 1")
+        conn.close()
+
+        self.store = db.SqliteReceiptStore(self.path, pool_size=1)
+
+        self.assertEqual(self.store.retailer_report(), expected_retailers(self.rows))
+        self.assertEqual(self.store.hourly_report(), expected_hours(self.rows))
+
+    def test_reports_never_scan_receipts(self):
+        with self.store.pool.connection() as conn:
+            plan = " ".join(row[3] for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT retailer, SUM(points) FROM retailer_daily "
+                "WHERE purchase_date BETWEEN 20220101 AND 20220131 GROUP BY retailer"))
+        self.assertIn("SEARCH retailer_daily USING PRIMARY KEY", plan)
+
+
+class TestMemoryRollups(unittest.TestCase):
+
+    def test_matches_receipts(self):
+        rows = receipt_rows(300)
+        store = InMemoryReceiptStore(shards=4)
+        store.store_receipts(rows + rows[:20])
+
+        self.assertEqual(store.retailer_report(), expected_retailers(rows))
+        start, end = date(2022, 6, 1), date(2022, 6, 30)
+        self.assertEqual(store.retailer_report(start, end), expected_retailers(rows, start, end))
+        self.assertEqual(store.hourly_report(), expected_hours(rows))
+        self.assertEqual(sum(d["receipts"] for d in store.daily_report()), len(rows))
+
+
+class TestReportEndpoints(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        db.init_db(db.SqliteReceiptStore(os.path.join(self.tmpdir.name, "reports.db"), pool_size=2))
+        self.client = TestClient(app)
+        self.rows = receipt_rows(50)
+        db.store_receipts(self.rows)
+
+    def tearDown(self):
+        db.close_db()
+        self.tmpdir.cleanup()
+
+    def test_retailers(self):
+        response = self.client.get("/reports/retailers", params={"from": "2022-02-01", "to": "2022-08-31"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            "from": "2022-02-01", "to": "2022-08-31",
+            "retailers": expected_retailers(self.rows, date(2022, 2, 1), date(2022, 8, 31))})
+
+    def test_daily_and_hourly(self):
+        receipt = self.rows[0][2]
+        daily = self.client.get("/reports/retailers/daily", params={"retailer": receipt.retailer}).json()
+        hourly = self.client.get("/reports/hourly").json()
+
+        self.assertIn(receipt.purchaseDate.isoformat(), [d["date"] for d in daily["days"]])
+        self.assertEqual({d["retailer"] for d in daily["days"]}, {receipt.retailer})
+        self.assertEqual(hourly["hours"], expected_hours(self.rows))
+
+    def test_bad_ranges(self):
+        self.assertEqual(self.client.get("/reports/retailers", params={"from": "yesterday"}).status_code, 422)
+        response = self.client.get("/reports/hourly", params={"from": "2022-02-01", "to": "2022-01-01"})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
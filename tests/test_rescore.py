@@ -0,0 +1,117 @@
+import os
+import random
+import sqlite3
+import tempfile
+import unittest
+
+from app import db
+from app.receipt_processor import calculate_points, generate_id, ACTIVE_RULES, RULES_FINGERPRINT
+from app.rescore import score_receipts, rescore_db, main, select_columns, VECTORIZED_RULES
+from app.rules import RULES, compile_rules, rules_fingerprint
+from tests.helpers import random_receipt
+
+class TestRescore(unittest.TestCase):
+
+    def test_matches_scalar_scoring(self):
+        rng = random.Random(1234)
+        receipts = [random_receipt(rng) for _ in range(3000)]
+
+        expected = [calculate_points(r) for r in receipts]
+
+        self.assertEqual(score_receipts(receipts).tolist(), expected)
+
+    def test_matches_scalar_scoring_all_rules(self):
+        rng = random.Random(99)
+        receipts = [random_receipt(rng) for _ in range(500)]
+
+        rules = ACTIVE_RULES + ["llm_total"]
+        evaluate = compile_rules(rules)
+        expected = [evaluate(r) for r in receipts]
+
+        self.assertEqual(score_receipts(receipts, rules).tolist(), expected)
+
+    def test_every_registered_rule_is_vectorized(self):
+        self.assertEqual(set(VECTORIZED_RULES), set(RULES))
+
+    def test_disabled_rules(self):
+        rng = random.Random(5)
+        receipts = [random_receipt(rng) for _ in range(200)]
+        rules = ["retailer_name", "receipt_items"]
+        evaluate = compile_rules(rules)
+
+        self.assertEqual(score_receipts(receipts, rules).tolist(), [evaluate(r) for r in receipts])
+
+    def test_empty_batch(self):
+        self.assertEqual(score_receipts([]).tolist(), [])
+
+    def test_rescore_db(self):
+        rng = random.Random(7)
+        receipts = [random_receipt(rng) for _ in range(250)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "receipts.db")
+            store = db.SqliteReceiptStore(path, pool_size=1)
+            # stale points for every other receipt
+            store.store_receipts([(str(generate_id(r)), calculate_points(r) + (i % 2), r) for i, r in enumerate(receipts)])
+            store.close()
+
+            scanned, updated = rescore_db(path, batch_size=64)
+            self.assertEqual((scanned, updated), (250, 125))
+            main(["--db", path, "--batch-size", "100"])
+
+            store = db.SqliteReceiptStore(path, pool_size=1)
+            for r in receipts:
+                self.assertEqual(store.get_receipt_points(str(generate_id(r))), (calculate_points(r),))
+            store.close()
+
+    def test_select_columns_from_rule_fields(self):
+        self.assertEqual(select_columns(["retailer_name"]), "retailer, 0, 0, NULL, 0, NULL")
+        self.assertEqual(select_columns(["receipt_datetime"]), "'', purchase_date, purchase_time, NULL, 0, extras")
+        self.assertEqual(select_columns(list(RULES)), "retailer, purchase_date, purchase_time, items, total_cents, extras")
+        with self.assertRaises(ValueError):
+            select_columns(["no_such_rule"])
+
+    def test_rescore_db_with_some_rules(self):
+        rng = random.Random(11)
+        receipts = [random_receipt(rng) for _ in range(200)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "receipts.db")
+            store = db.SqliteReceiptStore(path, pool_size=1)
+            store.store_receipts([(str(generate_id(r)), 0, r) for r in receipts])
+            store.close()
+
+            for rules in (["retailer_name"], ["receipt_datetime"], ["receipt_total", "receipt_items"]):
+                rescore_db(path, rules=rules)
+                evaluate = compile_rules(rules)
+                store = db.SqliteReceiptStore(path, pool_size=1)
+                for r in receipts:
+                    self.assertEqual(store.get_receipt_points(str(generate_id(r))), (evaluate(r),))
+                store.close()
+
+    def test_rescore_records_rules_fingerprint(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "receipts.db")
+            store = db.SqliteReceiptStore(path, pool_size=1)
+            # a new database is scored by the running rules
+            self.assertEqual(store.rules_fingerprint(), RULES_FINGERPRINT)
+            store.close()
+            # an upgraded one may hold points from any rules until it is rescored
+            with sqlite3.connect(path) as conn:
+                conn.execute("DROP TABLE scoring_rules")
+                conn.execute("PRAGMA user_version = 3")
+            conn.close()
+            store = db.SqliteReceiptStore(path, pool_size=1)
+            self.assertIsNone(store.rules_fingerprint())
+            store.close()
+
+            rescore_db(path, rules=["retailer_name"])
+            store = db.SqliteReceiptStore(path, pool_size=1)
+            self.assertEqual(store.rules_fingerprint(), rules_fingerprint(["retailer_name"]))
+            store.close()
+            rescore_db(path)
+            store = db.SqliteReceiptStore(path, pool_size=1)
+            self.assertEqual(store.rules_fingerprint(), RULES_FINGERPRINT)
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
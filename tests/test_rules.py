@@ -0,0 +1,85 @@
+import os
+import sys
+import subprocess
+import unittest
+from unittest.mock import patch
+from datetime import datetime
+
+from app.models import Receipt, Item
+from app.rules import RULES, register_rule, active_rules, compile_rules, compile_breakdown, rules_fingerprint
+from app.receipt_processor import calculate_points, calculate_points_breakdown, ACTIVE_RULES
+
+
+def make_receipt():
+    return Receipt(retailer="Target", purchaseDate=datetime(2022, 1, 1), purchaseTime="13:01",
+                   items=[Item(shortDescription="Mountain Dew 12PK", price=6.49),
+                          Item(shortDescription="Emils Cheese Pizza", price=12.25)],
+                   total=18.74)
+
+
+def flat_bonus(rec):
+    return 7
+
+
+class TestRules(unittest.TestCase):
+
+    def test_registered_rules(self):
+        self.assertEqual(list(RULES), ["retailer_name", "receipt_total", "llm_total", "receipt_items", "receipt_datetime"])
+        self.assertEqual(RULES["receipt_datetime"].fields, ("purchaseDate", "purchaseTime"))
+        for rule in RULES.values():
+            for field in rule.fields:
+                self.assertIn(field, Receipt.model_fields)
+
+    def test_active_rules(self):
+        # the LLM rule is only active when the program is LLM generated
+        self.assertEqual(ACTIVE_RULES, ["retailer_name", "receipt_total", "receipt_items", "receipt_datetime"])
+        self.assertEqual(active_rules(disabled=["receipt_total"]), ["retailer_name", "receipt_items", "receipt_datetime"])
+
+    def test_compile_rules(self):
+        receipt = make_receipt()
+        # 6 retailer + 5 for two items + 3 for "Emils Cheese Pizza" + 6 odd day
+        self.assertEqual(calculate_points(receipt), 20)
+        self.assertEqual(compile_rules(["retailer_name", "llm_total"])(receipt), 11)
+        self.assertEqual(compile_rules([])(receipt), 0)
+
+    def test_breakdown(self):
+        breakdown = calculate_points_breakdown(make_receipt())
+
+        self.assertEqual(breakdown, {"retailer_name": 6, "receipt_total": 0, "receipt_items": 8, "receipt_datetime": 6})
+        self.assertEqual(sum(breakdown.values()), calculate_points(make_receipt()))
+        self.assertEqual(compile_breakdown(["llm_total"])(make_receipt()), {"llm_total": 5})
+
+    def test_unknown_rule(self):
+        with self.assertRaises(ValueError):
+            compile_rules(["retailer_name", "no_such_rule"])
+
+    def test_rules_fingerprint(self):
+        # every replica has to agree on it, it is part of the points ETag
+        script = "from app.receipt_processor import RULES_FINGERPRINT; print(RULES_FINGERPRINT)"
+        other_process = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+        self.assertEqual(other_process.stdout.strip(), rules_fingerprint(ACTIVE_RULES))
+        # hashed from the source, so it doesn't depend on how the rules were compiled
+        optimized = subprocess.run([sys.executable, "-OO", "-c", script], capture_output=True, text=True, check=True,
+                                   env=dict(os.environ, PYTHONHASHSEED="1", PYTHONDONTWRITEBYTECODE="1"))
+        self.assertEqual(optimized.stdout.strip(), rules_fingerprint(ACTIVE_RULES))
+        self.assertNotEqual(rules_fingerprint(ACTIVE_RULES), rules_fingerprint(ACTIVE_RULES[1:]))
+
+    @patch.dict("app.rules.RULES", {}, clear=True)
+    def test_rules_fingerprint_is_pinned_to_source(self):
+        # a fixed value for fixed source, whatever interpreter computes it
+        register_rule("flat_bonus", fields=())(flat_bonus)
+        self.assertEqual(rules_fingerprint(["flat_bonus"]), "1fb28bfbc727")
+
+    @patch.dict("app.rules.RULES", {}, clear=True)
+    def test_register_rule(self):
+        @register_rule("flat_bonus", fields=())
+        def flat_bonus(rec):
+            return 7
+
+        self.assertEqual(compile_rules(active_rules())(make_receipt()), 7)
+        with self.assertRaises(ValueError):
+            register_rule("flat_bonus", fields=())(flat_bonus)
+
+
+if __name__ == '__main__':
+    unittest.main()
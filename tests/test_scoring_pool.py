@@ -0,0 +1,103 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app import db, scoring_pool
+from app.main import app
+from app.scoring_pool import parse_payload, from_compact, item_count, start_pool, shutdown_pool
+from app.receipt_processor import parse_receipt, generate_id, calculate_points
+
+
+def payload(n_items, retailer="Target"):
+    return {
+        "retailer": retailer,
+        "purchaseDate": "2022-01-01",
+        "purchaseTime": "14:33",
+        "items": [{"shortDescription": f"Item {i:03d}", "price": f"{i % 50}.{i % 100:02d}"} for i in range(n_items)],
+        "total": "35.35"
+    }
+
+
+class TestScorePayload(unittest.TestCase):
+
+    def test_matches_inline_scoring(self):
+        data = payload(40)
+        receipt = parse_receipt(data)
+
+        receipt_id, compact = parse_payload(data)
+        pooled = from_compact(compact)
+        points = calculate_points(receipt)
+
+        self.assertEqual(receipt_id, str(generate_id(receipt)))
+        self.assertEqual(calculate_points(pooled), points)
+        # the stores take it in place of the Receipt
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = db.SqliteReceiptStore(os.path.join(tmpdir, "pooled.db"), pool_size=1)
+            store.store_receipt(receipt_id, points, pooled)
+            self.assertEqual(store.get_receipt(receipt_id), receipt)
+            store.close()
+
+    def test_invalid_payload_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            parse_payload({"retailer": "Target"})
+
+    def test_item_count(self):
+        self.assertEqual(item_count(payload(7)), 7)
+        self.assertEqual(item_count([1, 2]), 0)
+        self.assertEqual(item_count({"items": "nope"}), 0)
+
+
+class TestPoolEndpoint(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        start_pool(1, threshold=20)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutdown_pool()
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        db.init_db(db.SqliteReceiptStore(os.path.join(self.tmpdir.name, "pool.db"), pool_size=2))
+
+    def tearDown(self):
+        db.close_db()
+        self.tmpdir.cleanup()
+
+    def test_large_receipts_are_scored_in_the_pool(self):
+        client = TestClient(app)
+        large = payload(50)
+        receipt = parse_receipt(large)
+
+        with patch("app.main.parse_in_pool", wraps=scoring_pool.parse_in_pool) as parsed, \
+                patch("app.main.score_in_pool", wraps=scoring_pool.score_in_pool) as pooled:
+            small_response = client.post("/receipts/process", json=payload(3, retailer="Walgreens"))
+            large_response = client.post("/receipts/process", json=large)
+            # a resubmission is recognised by its id and never scored
+            again = client.post("/receipts/process", json=large)
+
+        self.assertEqual(parsed.call_count, 2)
+        self.assertEqual(pooled.call_count, 1)
+        self.assertEqual(again.json(), large_response.json())
+        self.assertEqual(small_response.status_code, 200)
+        self.assertEqual(large_response.json()["id"], str(generate_id(receipt)))
+        points = client.get(f"/receipts/{large_response.json()['id']}/points")
+        self.assertEqual(points.json(), {"points": calculate_points(receipt)})
+
+    def test_invalid_large_receipt_is_rejected(self):
+        client = TestClient(app)
+        bad = payload(50)
+        bad["purchaseDate"] = "not a date"
+
+        response = client.post("/receipts/process", json=bad)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["detail"], "The receipt is invalid.")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import os
+import json
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app import db
+from app.bulk import import_file
+from app.sharded_store import ShardedReceiptStore, shard_paths, shard_of, rebalance
+from tests.helpers import receipt_rows, expected_retailers, expected_hours
+
+
+def count_rows(path):
+    with sqlite3.connect(path) as conn:
+        count = conn.execute("SELECT COUNT(*) FROM retail_receipts").fetchone()[0]
+    conn.close()
+    return count
+
+
+class TestShardedReceiptStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "receipts.db")
+        self.rows = receipt_rows(300)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_shard_paths(self):
+        self.assertEqual(shard_paths("data/r.db", 1), ["data/r.db"])
+        self.assertEqual(shard_paths("data/r.db", 3), ["data/r.0.db", "data/r.1.db", "data/r.2.db"])
+
+    def test_ids_spread_evenly(self):
+        counts = [0] * 4
+        for receipt_id, _, _ in receipt_rows(4000, seed=1):
+            counts[shard_of(receipt_id, 4)] += 1
+        self.assertLess(max(counts) - min(counts), 200)
+        self.assertIsNone(shard_of("non-existent-receipt-id", 4))
+
+    def test_receipts_live_on_their_shard(self):
+        store = ShardedReceiptStore(self.path, shards=3, pool_size=2)
+        try:
+            self.assertTrue(store.store_receipts(self.rows[:200]))
+            for row in self.rows[200:]:
+                self.assertTrue(store.store_receipt(*row))
+            # duplicates are still not an error
+            self.assertTrue(store.store_receipts(self.rows[:5]))
+
+            for receipt_id, points, receipt in self.rows:
+                self.assertEqual(store.get_receipt_points(receipt_id), (points,))
+                self.assertEqual(store.get_receipt(receipt_id), receipt)
+            self.assertIsNone(store.get_receipt_points("non-existent-receipt-id"))
+            self.assertEqual(sorted(store.iter_receipt_ids()), sorted(r[0] for r in self.rows))
+        finally:
+            store.close()
+
+        for i, path in enumerate(shard_paths(self.path, 3)):
+            self.assertEqual(count_rows(path), sum(shard_of(r[0], 3) == i for r in self.rows))
+
+    def test_reports_and_exports_fan_out(self):
+        store = ShardedReceiptStore(self.path, shards=4, pool_size=1)
+        try:
+            store.store_receipts(self.rows)
+
+            self.assertEqual(store.retailer_report(), expected_retailers(self.rows))
+            self.assertEqual(store.hourly_report(), expected_hours(self.rows))
+            self.assertEqual(sum(d["receipts"] for d in store.daily_report()), len(self.rows))
+
+            exported = list(store.iter_receipts(batch_size=16))
+            self.assertEqual(sorted(r["id"] for r in exported), sorted(r[0] for r in self.rows))
+            # abandoning an export returns every connection
+            reader = store.iter_receipts(batch_size=16)
+            next(reader)
+            reader.close()
+            self.assertEqual(sum(1 for _ in store.iter_receipts()), len(self.rows))
+        finally:
+            store.close()
+
+    def test_bulk_import_into_shards(self):
+        file = os.path.join(self.tmpdir.name, "receipts.jsonl")
+        with open(file, "w") as f:
+            for _, _, receipt in self.rows[:50]:
+                f.write(receipt.model_dump_json() + "\n")
+
+        result = import_file(file, self.path, chunk_size=20, shards=2)
+
+        self.assertEqual(result["rows"], 50)
+        self.assertEqual(sum(count_rows(p) for p in shard_paths(self.path, 2)), 50)
+
+
+class TestRebalance(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "receipts.db")
+        self.rows = receipt_rows(200)
+        store = db.SqliteReceiptStore(self.path, pool_size=1)
+        store.store_receipts(self.rows)
+        # a legacy row whose total isn't whole cents has to move exactly as well
+        row = next(store.iter_receipts())
+        store.delete_receipts([row["id"]])
+        self.legacy = dict(row, total=10.125)
+        store.store_decoded([self.legacy])
+        store.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def assert_intact(self, shards):
+        store = ShardedReceiptStore(self.path, shards=shards, pool_size=1)
+        try:
+            for receipt_id, points, _ in self.rows:
+                self.assertEqual(store.get_receipt_points(receipt_id), (points,))
+            exported = {r["id"]: r for r in store.iter_receipts()}
+            self.assertEqual(len(exported), len(self.rows))
+            self.assertEqual(exported[self.legacy["id"]], self.legacy)
+            self.assertEqual(sum(r["receipts"] for r in store.retailer_report()), len(self.rows))
+        finally:
+            store.close()
+        for i, path in enumerate(shard_paths(self.path, shards)):
+            self.assertEqual(count_rows(path), sum(shard_of(r[0], shards) == i for r in self.rows))
+
+    def test_split_and_merge(self):
+        result = rebalance(self.path, 1, 3, batch_size=32)
+        self.assertEqual(result["scanned"], len(self.rows))
+        self.assertEqual(result["moved"], len(self.rows))
+        self.assertFalse(os.path.exists(self.path))
+        self.assert_intact(3)
+
+        rebalance(self.path, 3, 2, batch_size=32)
+        self.assertFalse(os.path.exists(shard_paths(self.path, 3)[2]))
+        self.assert_intact(2)
+
+        rebalance(self.path, 2, 1)
+        self.assert_intact(1)
+
+    def test_moved_points_keep_their_rules_fingerprint(self):
+        with sqlite3.connect(self.path) as conn:
+            db.set_rules_fingerprint(conn, "0123456789ab")
+        conn.close()
+
+        rebalance(self.path, 1, 3)
+
+        store = ShardedReceiptStore(self.path, shards=3, pool_size=1)
+        self.assertEqual(store.rules_fingerprint(), "0123456789ab")
+        store.close()
+
+    def test_interrupted_rebalance_can_be_rerun(self):
+        original = db.SqliteReceiptStore.delete_receipts
+        calls = []
+
+        def fail_third_delete(store, receipt_ids):
+            calls.append(len(receipt_ids))
+            if len(calls) == 3:
+                raise sqlite3.OperationalError("disk I/O error")
+            return original(store, receipt_ids)
+
+        with patch.object(db.SqliteReceiptStore, "delete_receipts", fail_third_delete):
+            with self.assertRaises(sqlite3.OperationalError):
+                rebalance(self.path, 1, 4, batch_size=32)
+
+        rebalance(self.path, 1, 4, batch_size=32)
+        self.assert_intact(4)
+
+
+if __name__ == '__main__':
+    unittest.main()
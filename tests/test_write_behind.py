@@ -0,0 +1,148 @@
+import os
+import time
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app import db
+from app.main import app
+from app.write_behind import WriteBehindQueue
+from tests.helpers import make_rows
+
+
+class TestWriteBehindQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "receipts.db")
+        self.store = db.SqliteReceiptStore(self.path, pool_size=2)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_group_commit_by_size(self):
+        writer = WriteBehindQueue(self.store, batch_size=10, flush_ms=10000)
+        with patch.object(self.store, "store_receipts", wraps=self.store.store_receipts) as spy:
+            writer.start()
+            rows = make_rows(25)
+            for row in rows:
+                self.assertTrue(writer.submit(*row))
+            writer.stop()
+
+        self.assertEqual([len(call.args[0]) for call in spy.call_args_list], [10, 10, 5])
+        for receipt_id, points, _ in rows:
+            self.assertEqual(self.store.get_receipt_points(receipt_id), (points,))
+
+    def test_group_commit_by_time(self):
+        writer = WriteBehindQueue(self.store, batch_size=1000, flush_ms=20).start()
+        rows = make_rows(3)
+        for row in rows:
+            writer.submit(*row)
+
+        deadline = time.monotonic() + 5
+        while self.store.get_receipt_points(rows[-1][0]) is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.store.get_receipt_points(rows[-1][0]), (rows[-1][1],))
+        writer.stop()
+
+    def test_pending_reads_and_backpressure(self):
+        release = threading.Event()
+        original = self.store.store_receipts
+
+        def slow_store_receipts(receipts):
+            release.wait()
+            return original(receipts)
+
+        writer = WriteBehindQueue(self.store, batch_size=1, flush_ms=0, max_pending=2, put_timeout=0.05)
+        with patch.object(self.store, "store_receipts", side_effect=slow_store_receipts):
+            writer.start()
+            rows = make_rows(5)
+            results = [writer.submit(*row) for row in rows]
+            # one receipt is held by the stuck writer and two fill the queue
+            self.assertEqual(results.count(True), 3)
+            self.assertIsNone(results[-1])
+
+            receipt_id, points, _ = rows[0]
+            self.assertEqual(writer.get_pending(receipt_id), points)
+            self.assertIsNone(self.store.get_receipt_points(receipt_id))
+
+            release.set()
+            writer.stop()
+
+        self.assertIsNone(writer.get_pending(receipt_id))
+        self.assertEqual(self.store.get_receipt_points(receipt_id), (points,))
+
+
+class TestWriteBehindDB(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "receipts.db")
+
+    def tearDown(self):
+        db.close_db()
+        self.tmpdir.cleanup()
+
+    @patch("app.db.POINTS_CACHE_SIZE", 0)
+    def test_reads_see_pending_receipts(self):
+        db.init_db(db.SqliteReceiptStore(self.path, pool_size=2), write_behind_enabled=True)
+        release = threading.Event()
+        original = db.store.store_receipts
+
+        def slow_store_receipts(receipts):
+            release.wait()
+            return original(receipts)
+
+        with patch.object(db.store, "store_receipts", side_effect=slow_store_receipts):
+            receipt_id, points, receipt = make_rows(1)[0]
+            self.assertTrue(db.store_receipt(receipt_id, points, receipt))
+            self.assertEqual(db.get_receipt_points(receipt_id), (points,))
+            release.set()
+            db.close_db()
+
+        store = db.SqliteReceiptStore(self.path, pool_size=1)
+        self.assertEqual(store.get_receipt_points(receipt_id), (points,))
+        store.close()
+
+    def test_dropped_receipts_are_forgotten(self):
+        db.init_db(db.SqliteReceiptStore(self.path, pool_size=2), write_behind_enabled=True, dedup_enabled=True)
+        receipt_id, points, receipt = make_rows(1)[0]
+        with patch.object(db.store, "store_receipts", return_value=None):
+            self.assertTrue(db.store_receipt(receipt_id, points, receipt))
+            deadline = time.monotonic() + 5
+            while db.write_behind.get_pending(receipt_id) is not None and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        # not answered from the cache, and a resubmission is not a duplicate
+        self.assertIsNone(db.get_receipt_points(receipt_id))
+        self.assertFalse(db.is_known_receipt(receipt_id))
+        self.assertTrue(db.store_receipt(receipt_id, points, receipt))
+        db.close_db()
+
+        store = db.SqliteReceiptStore(self.path, pool_size=1)
+        self.assertEqual(store.get_receipt_points(receipt_id), (points,))
+        store.close()
+
+    def test_lifespan_drains_on_shutdown(self):
+        db.init_db(db.SqliteReceiptStore(self.path, pool_size=2), write_behind_enabled=True)
+        with TestClient(app) as client:
+            ids = []
+            for i in range(20):
+                response = client.post("/receipts/process", json={
+                    "retailer": f"Store {i}", "purchaseDate": "2022-01-01", "purchaseTime": "13:01",
+                    "items": [{"shortDescription": "Gatorade", "price": "2.25"}], "total": "2.25"})
+                ids.append(response.json()["id"])
+        self.assertIsNone(db.write_behind)
+
+        store = db.SqliteReceiptStore(self.path, pool_size=1)
+        for receipt_id in ids:
+            self.assertIsNotNone(store.get_receipt_points(receipt_id))
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()